@@ -57,6 +57,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "medlink.middleware.ProfilingMiddleware",
+    "medlink.middleware.RequestTimingMiddleware",
+    "medlink.middleware.CompressionMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -90,13 +93,79 @@ WSGI_APPLICATION = "medicare_connect.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connection settings of the SQLite database, selected by DATABASE_PROFILE:
+# - "development" keeps Django's defaults: rollback journal, a new connection
+#   per request.
+# - "production" switches to WAL so readers never block the writer, makes
+#   transactions take the write lock when they begin, so concurrent writers
+#   wait on busy_timeout instead of failing with "database is locked", and
+#   keeps connections open for DATABASE_CONN_MAX_AGE seconds.
+# The PRAGMAs run on every new connection through the init_command option.
+SQLITE_PRAGMAS = {
+    "journal_mode": env.str("SQLITE_JOURNAL_MODE", default="wal"),
+    "synchronous": env.str("SQLITE_SYNCHRONOUS", default="normal"),
+    "mmap_size": env.int("SQLITE_MMAP_SIZE", default=256 * 1024 * 1024),
+    # Negative sizes are in KiB.
+    "cache_size": env.int("SQLITE_CACHE_SIZE", default=-64 * 1024),
+    "busy_timeout": env.int("SQLITE_BUSY_TIMEOUT", default=5000),
+}
+DATABASE_PROFILES = {
+    "development": {},
+    "production": {
+        "CONN_MAX_AGE": env.int("DATABASE_CONN_MAX_AGE", default=600),
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "init_command": ";".join(
+                f"PRAGMA {name} = {value}" for name, value in SQLITE_PRAGMAS.items()
+            ),
+            "transaction_mode": "IMMEDIATE",
+        },
+    },
+}
+DATABASE_PROFILE = env.str("DATABASE_PROFILE", default="development")
+
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+        "NAME": env.str("DATABASE_NAME", default=str(BASE_DIR / "db.sqlite3")),
+        **DATABASE_PROFILES[DATABASE_PROFILE],
     }
 }
 
+# Optional read replica, a copy of the database refreshed by
+# "manage.py sync_replica". When set, the patient list and the prescription
+# list and detail endpoints read from it until they write.
+DATABASE_REPLICA_NAME = env.str("DATABASE_REPLICA_NAME", default="")
+if DATABASE_REPLICA_NAME:
+    DATABASES["replica"] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": DATABASE_REPLICA_NAME,
+        **DATABASE_PROFILES[DATABASE_PROFILE],
+    }
+
+DATABASE_ROUTERS = ["medlink.routers.PrimaryReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+# The local-memory backend is private to each process. Use the file-based
+# backend (django.core.cache.backends.filebased.FileBasedCache with a directory
+# as CACHE_LOCATION) when several worker processes serve the API.
+
+CACHES = {
+    "default": {
+        "BACKEND": env.str(
+            "CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": env.str("CACHE_LOCATION", default="medicare-connect"),
+        "TIMEOUT": env.int("CACHE_TIMEOUT", default=300),
+        "OPTIONS": {"MAX_ENTRIES": env.int("CACHE_MAX_ENTRIES", default=10000)},
+    }
+}
+
+# Lifetime in seconds of cached prescription list and detail responses
+PRESCRIPTION_CACHE_TIMEOUT = env.int("PRESCRIPTION_CACHE_TIMEOUT", default=300)
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -138,8 +207,123 @@ STATIC_URL = "static/"
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
+# How JWT authentication resolves request.user:
+# - "database" loads the user row, joined with its role, on every request.
+# - "cached" resolves users through an in-process LRU cache, see AUTH_USER_CACHE_*.
+# - "stateless" builds the user from the token claims. Tokens stay valid for
+#   deactivated users until they expire.
+JWT_AUTHENTICATION_CLASSES = {
+    "database": "medlink.authentication.RoleJWTAuthentication",
+    "cached": "medlink.authentication.CachedJWTAuthentication",
+    "stateless": "rest_framework_simplejwt.authentication.JWTStatelessUserAuthentication",
+}
+JWT_AUTHENTICATION_MODE = env.str("JWT_AUTHENTICATION_MODE", default="database")
+
+# Encode JSON responses with orjson, when installed, which is several times
+# faster. Its output differs from DRF's for floats with an exponent, written
+# 1e16 rather than 1e+16, and for NaN and infinite floats, written as null
+# rather than rejected.
+ORJSON_RENDERING = env.bool("ORJSON_RENDERING", default=False)
+
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        JWT_AUTHENTICATION_CLASSES[JWT_AUTHENTICATION_MODE],
+    ),
+    # Same output as DRF's JSONRenderer, or encoded with orjson when
+    # ORJSON_RENDERING is on, see below.
+    "DEFAULT_RENDERER_CLASSES": (
+        "medlink.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
     ),
 }
+
+# In-process cache of authenticated users used by the "cached" mode
+AUTH_USER_CACHE_SIZE = env.int("AUTH_USER_CACHE_SIZE", default=5000)
+AUTH_USER_CACHE_TTL = env.int("AUTH_USER_CACHE_TTL", default=60)
+
+SIMPLE_JWT = {
+    "TOKEN_OBTAIN_SERIALIZER": "medlink.serializers.RoleTokenObtainPairSerializer",
+}
+
+# Pagination of the patient list endpoint
+PATIENT_LIST_PAGE_SIZE = env.int("PATIENT_LIST_PAGE_SIZE", default=50)
+PATIENT_LIST_MAX_PAGE_SIZE = env.int("PATIENT_LIST_MAX_PAGE_SIZE", default=500)
+
+# Pagination of the medical history endpoint
+MEDICAL_HISTORY_PAGE_SIZE = env.int("MEDICAL_HISTORY_PAGE_SIZE", default=20)
+MEDICAL_HISTORY_MAX_PAGE_SIZE = env.int("MEDICAL_HISTORY_MAX_PAGE_SIZE", default=100)
+
+# Largest batch accepted by the bulk prescription endpoint
+PRESCRIPTION_BULK_MAX_ITEMS = env.int("PRESCRIPTION_BULK_MAX_ITEMS", default=100)
+
+# Processes used to hash passwords of bulk registrations
+PASSWORD_HASHING_WORKERS = env.int("PASSWORD_HASHING_WORKERS", default=os.cpu_count())
+
+# Largest batch accepted by the bulk user registration endpoint
+USER_BULK_MAX_ITEMS = env.int("USER_BULK_MAX_ITEMS", default=100)
+
+# Bulk registrations accepted per user or client address, as "<count>/<period>"
+# with period second, minute, hour or day
+USER_BULK_THROTTLE_RATE = env.str("USER_BULK_THROTTLE_RATE", default="10/hour")
+
+# Rows fetched per database round trip by the prescription export
+EXPORT_CHUNK_SIZE = env.int("EXPORT_CHUNK_SIZE", default=2000)
+
+# Pagination of the prescription search endpoint
+SEARCH_PAGE_SIZE = env.int("SEARCH_PAGE_SIZE", default=20)
+SEARCH_MAX_PAGE_SIZE = env.int("SEARCH_MAX_PAGE_SIZE", default=100)
+
+# Number of suggestions of the medication autocomplete endpoint
+AUTOCOMPLETE_LIMIT = env.int("AUTOCOMPLETE_LIMIT", default=10)
+AUTOCOMPLETE_MAX_LIMIT = env.int("AUTOCOMPLETE_MAX_LIMIT", default=50)
+
+# Seconds after which the medication autocomplete index is reloaded, to pick up
+# the prescriptions made by other processes
+AUTOCOMPLETE_INDEX_TTL = env.int("AUTOCOMPLETE_INDEX_TTL", default=60)
+
+# Queries slower than this many milliseconds are logged with their SQL by
+# medlink.middleware.RequestTimingMiddleware. Views may override it with a
+# slow_query_threshold_ms attribute.
+SLOW_QUERY_THRESHOLD_MS = env.int("SLOW_QUERY_THRESHOLD_MS", default=100)
+
+# Sampled request profiling by medlink.middleware.ProfilingMiddleware, off
+# unless one of the first two is set:
+# - PROFILING_SAMPLE_RATE profiles one request in that many.
+# - PROFILING_TOKEN profiles the requests sending it in an X-Profile header.
+# Profiles are kept in PROFILING_DIRECTORY, at most PROFILING_MAX_FILES per view.
+PROFILING_SAMPLE_RATE = env.int("PROFILING_SAMPLE_RATE", default=0)
+PROFILING_TOKEN = env.str("PROFILING_TOKEN", default="")
+PROFILING_DIRECTORY = env.str("PROFILING_DIRECTORY", default=str(BASE_DIR / "profiles"))
+PROFILING_MAX_FILES = env.int("PROFILING_MAX_FILES", default=20)
+
+# Directory where each worker process writes its metrics, summed by the
+# /metrics endpoint. Empty it when the server starts. Without it, /metrics
+# reports the metrics of the process serving it only.
+METRICS_DIRECTORY = env.str("METRICS_DIRECTORY", default="")
+
+# Bearer token that scrapers must send to read /metrics, which is closed while
+# it is empty. Metrics show the traffic, errors and latency of every view.
+METRICS_TOKEN = env.str("METRICS_TOKEN", default="")
+
+# Responses of at least COMPRESSION_MIN_SIZE bytes, and streaming responses,
+# are compressed by medlink.middleware.CompressionMiddleware at
+# COMPRESSION_LEVEL, from 1 (fastest) to 9 (smallest).
+COMPRESSION_MIN_SIZE = env.int("COMPRESSION_MIN_SIZE", default=1024)
+COMPRESSION_LEVEL = env.int("COMPRESSION_LEVEL", default=6)
+
+# Level of the medlink loggers, written to the console. The per-request timing
+# lines ("medlink.requests") are DEBUG, so only logged with
+# MEDLINK_LOG_LEVEL=DEBUG. The slow query lines ("medlink.queries") are WARNING.
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "medlink": {
+            "handlers": ["console"],
+            "level": env.str("MEDLINK_LOG_LEVEL", default="INFO"),
+        },
+    },
+}
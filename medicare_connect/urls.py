@@ -19,8 +19,11 @@ from django.urls import include, path
 
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from medlink.views import MetricsView
+
 urlpatterns = [
     path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
     path("medlink/", include("medlink.urls")),
+    path("metrics", MetricsView.as_view(), name="metrics"),
 ]
@@ -0,0 +1,205 @@
+from django.http import HttpResponseNotModified, JsonResponse
+from django.views import View
+
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated, NotFound
+
+from .authentication import aauthenticate, get_user_role
+from .cache import (
+    aget_cached_prescription_detail,
+    aget_cached_prescription_list,
+    aget_prescription_version,
+    aprescription_list_cache_key,
+    aset_cached_prescription_detail,
+    aset_cached_prescription_list,
+    etag_matches,
+    prescription_etag,
+)
+from .middleware import serializing
+from .models import Patient, Prescription
+from .pagination import PatientCursorPagination
+from .serializers import (
+    PatientListValuesSerializer,
+    PrescriptionInfoSerializer,
+    PrescriptionListRequestSerializer,
+    PrescriptionValuesSerializer,
+)
+from .views import prescription_list_params, prescription_list_queryset
+
+
+def not_modified(etag):
+    response = HttpResponseNotModified()
+    response["ETag"] = etag
+    return response
+
+
+class AsyncAPIView(View):
+    """
+    Base class of the ASGI-native read endpoints.
+
+    Requests are authenticated from their JWT with the async ORM before being
+    dispatched, so that only authenticated users reach the handlers, like with
+    ``IsAuthenticated`` on the sync views. Cached responses are read and
+    stored with the async cache API.
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            authenticated = await aauthenticate(request)
+        except AuthenticationFailed as exc:
+            return self.unauthorized(exc.detail)
+        if authenticated is None:
+            return self.unauthorized(NotAuthenticated.default_detail)
+        request.user, request.auth = authenticated
+        return await super().dispatch(request, *args, **kwargs)
+
+    def unauthorized(self, detail):
+        response = JsonResponse(
+            detail if isinstance(detail, dict) else {"detail": detail},
+            status=status.HTTP_401_UNAUTHORIZED,
+        )
+        response["WWW-Authenticate"] = 'Bearer realm="api"'
+        return response
+
+
+class AsyncListPatientsView(AsyncAPIView):
+    """
+    This class contains business logic to fetch the list of patients, one cursor
+    page at a time, with the async ORM.
+    """
+
+    async def get(self, request):
+        try:
+            # Check if the user is a doctor
+            if get_user_role(request) != "doctor":
+                return JsonResponse(
+                    {"error": "Only doctors can see patients"},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+
+            paginator = PatientCursorPagination()
+            page = await paginator.apaginate_queryset(
+                PatientListValuesSerializer.values(Patient.objects.all()), request
+            )
+            return JsonResponse(
+                paginator.get_paginated_data(
+                    PatientListValuesSerializer.serialize(page)
+                )
+            )
+        except NotFound as exc:
+            return JsonResponse(
+                {"detail": exc.detail}, status=status.HTTP_404_NOT_FOUND
+            )
+        except Exception:
+            return JsonResponse(
+                {"message": "Something Went Wrong"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncListPrescriptionsView(AsyncAPIView):
+    """
+    This class contains business logic to fetch the list of prescriptions for
+    individual patient with the async ORM.
+    """
+
+    async def get(self, request):
+        try:
+            username = request.GET.get("patient_username")
+
+            role = get_user_role(request)
+            if role is None:
+                return JsonResponse(
+                    {"error": "User has no role"}, status=status.HTTP_403_FORBIDDEN
+                )
+            # Check if the user is a patient, he can see own prescription only.
+            if role == "patient":
+                username = request.user.username
+            serializer = PrescriptionListRequestSerializer(
+                data=prescription_list_params(request, username)
+            )
+            if not serializer.is_valid():
+                return JsonResponse(
+                    serializer.errors, status=status.HTTP_400_BAD_REQUEST
+                )
+            cache_key = await aprescription_list_cache_key(
+                username, serializer.validated_data
+            )
+            entry = await aget_cached_prescription_list(cache_key)
+            if entry is None:
+                data = PrescriptionValuesSerializer.serialize(
+                    [
+                        row
+                        async for row in PrescriptionValuesSerializer.values(
+                            prescription_list_queryset(
+                                username, serializer.validated_data
+                            )
+                        )
+                    ]
+                )
+                if (
+                    not data
+                    and not await Patient.objects.filter(
+                        user__username=username
+                    ).aexists()
+                ):
+                    return JsonResponse(
+                        {"error": f"Patient does not exist with username {username}"},
+                        status=status.HTTP_404_NOT_FOUND,
+                    )
+                entry = await aset_cached_prescription_list(cache_key, data)
+            etag = prescription_etag(entry)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            response = JsonResponse(entry["data"], safe=False)
+            response["ETag"] = etag
+            return response
+        except Exception:
+            return JsonResponse(
+                {"message": "Something Went Wrong"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class AsyncPrescriptionsDetailView(AsyncAPIView):
+    """
+    This class contains business logic to fetch detailed information of
+    prescription with the async ORM.
+    """
+
+    async def get(self, request, prescription_id):
+        try:
+            entry = await aget_cached_prescription_detail(prescription_id)
+            if entry is None:
+                # Read the version before the row, so that a write committing
+                # in between leaves the entry outdated rather than current.
+                username = await (
+                    Prescription.objects.filter(id=prescription_id)
+                    .values_list("patient__user__username", flat=True)
+                    .aget()
+                )
+                version = await aget_prescription_version(username)
+                prescription = await Prescription.objects.select_related(
+                    "patient__user", "doctor", "medication"
+                ).aget(id=prescription_id)
+                with serializing():
+                    data = PrescriptionInfoSerializer(prescription).data
+                entry = await aset_cached_prescription_detail(
+                    prescription_id, username, version, data
+                )
+            etag = prescription_etag(entry)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            response = JsonResponse(entry["data"])
+            response["ETag"] = etag
+            return response
+        except Prescription.DoesNotExist:
+            return JsonResponse(
+                {"error": f"Prescription does not exist with id {prescription_id}"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        except Exception:
+            return JsonResponse(
+                {"message": "Something Went Wrong"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
@@ -0,0 +1,152 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ObjectDoesNotExist
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import Token
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import LRUCache
+
+ROLE_CLAIM = "role"
+
+# Users resolved by CachedJWTAuthentication, keyed by user id. Entries are
+# evicted by the signal handlers in medlink.signals when the user or its role
+# changes; the TTL bounds staleness in other worker processes.
+user_cache = LRUCache(
+    maxsize=settings.AUTH_USER_CACHE_SIZE,
+    ttl=settings.AUTH_USER_CACHE_TTL,
+    name="user",
+)
+
+
+def get_user_role(request):
+    """
+    Return the role of the authenticated user, or ``None`` if it is unknown.
+
+    A user loaded from the database, in the "database" and "cached"
+    authentication modes, is authorized by its ``Role`` row, which a role
+    change updates before the tokens issued earlier expire. Only users built
+    from the token claims, in the "stateless" mode, are authorized by the role
+    claim set by ``RoleTokenObtainPairSerializer``.
+    """
+    if isinstance(request.user, get_user_model()):
+        try:
+            return request.user.role.role
+        except ObjectDoesNotExist:
+            return None
+    if isinstance(request.auth, Token):
+        return request.auth.get(ROLE_CLAIM)
+    return None
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that loads users together with their role, so
+    ``get_user_role`` authorizes them without another query.
+    """
+
+    def get_user(self, validated_token):
+        user = self.load_user(self.get_user_id(validated_token))
+        self.check_user(user, validated_token)
+        return user
+
+    def load_user(self, user_id):
+        try:
+            return self.user_model.objects.select_related("role").get(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    async def aget_user(self, validated_token):
+        """
+        Async counterpart of ``get_user`` that loads the user with the async
+        ORM.
+        """
+        user = await self.aload_user(self.get_user_id(validated_token))
+        self.check_user(user, validated_token)
+        return user
+
+    async def aload_user(self, user_id):
+        try:
+            return await self.user_model.objects.select_related("role").aget(
+                **{api_settings.USER_ID_FIELD: user_id}
+            )
+        except self.user_model.DoesNotExist:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+    def get_user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
+
+
+class CachedJWTAuthentication(RoleJWTAuthentication):
+    """
+    JWT authentication that resolves users, together with their role, through
+    the in-process ``user_cache`` instead of loading them on every request.
+    """
+
+    def get_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            user = self.load_user(user_id)
+            user_cache.set(user_id, user)
+        self.check_user(user, validated_token)
+        return user
+
+    async def aget_user(self, validated_token):
+        """
+        Async counterpart of ``get_user`` that loads missing users with the
+        async ORM.
+        """
+        user_id = self.get_user_id(validated_token)
+        user = user_cache.get(user_id)
+        if user is None:
+            user = await self.aload_user(user_id)
+            user_cache.set(user_id, user)
+        self.check_user(user, validated_token)
+        return user
+
+
+async def aauthenticate(request):
+    """
+    Authenticate a plain Django request from its JWT for the async views.
+
+    Returns ``(user, validated_token)``, or ``None`` when no token was sent.
+    Users are resolved like by the sync views in ``JWT_AUTHENTICATION_MODE``:
+    loaded with their role, through ``user_cache`` in the "cached" mode, or
+    built from the token claims in the "stateless" mode.
+    """
+    if settings.JWT_AUTHENTICATION_MODE == "cached":
+        authentication = CachedJWTAuthentication()
+    else:
+        authentication = RoleJWTAuthentication()
+    header = authentication.get_header(request)
+    if header is None:
+        return None
+    raw_token = authentication.get_raw_token(header)
+    if raw_token is None:
+        return None
+    validated_token = authentication.get_validated_token(raw_token)
+    if settings.JWT_AUTHENTICATION_MODE == "stateless":
+        return api_settings.TOKEN_USER_CLASS(validated_token), validated_token
+    return await authentication.aget_user(validated_token), validated_token
@@ -0,0 +1,197 @@
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Count
+
+from .models import Medication, normalize_medication
+
+logger = logging.getLogger("medlink.autocomplete")
+
+
+def medication_counts():
+    """
+    Yield ``(medication, number of prescriptions)`` for every prescribed
+    medication.
+    """
+    return (
+        Medication.objects.annotate(count=Count("prescription"))
+        .filter(count__gt=0)
+        .values_list("name", "count")
+        .iterator()
+    )
+
+
+class PrefixIndex:
+    """
+    In-process index of names for as-you-type suggestions.
+
+    Normalized names are kept in a sorted list, so the names starting with a
+    prefix are the contiguous run found with two bisections, and are ranked by
+    how often they were added. The index is loaded from ``loader`` on first use
+    and kept current with ``add`` and ``remove``; lookups never touch the
+    database once it is loaded.
+
+    Names added by other processes, such as other workers or import_patients,
+    only reach the index when it is reloaded, ``ttl`` seconds after it was
+    loaded. The lookup finding it expired starts the reload in a background
+    thread and answers at once. Lookups keep using the current index until the
+    reload is done, and the ``add`` and ``remove`` calls made meanwhile are
+    replayed onto the reloaded index. A change whose commit the reload also
+    read is then counted twice, until the next reload.
+    """
+
+    def __init__(self, loader, ttl):
+        self._loader = loader
+        self._ttl = ttl
+        self._keys = []
+        self._names = {}
+        self._counts = Counter()
+        self._loaded = False
+        self._expires_at = 0.0
+        self._reloader = None
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def _load(self):
+        for name, count in self._loader():
+            self._count(name, count)
+        self._keys = sorted(self._names)
+        self._loaded = True
+        self._expires_at = time.monotonic() + self._ttl
+
+    def _start_reload(self):
+        self._pending = []
+        self._reloader = threading.Thread(
+            target=self._reload, name="autocomplete-reload", daemon=True
+        )
+        self._reloader.start()
+
+    def _reload(self):
+        """
+        Load a new index without holding the lock, then replay the changes
+        made meanwhile onto it and swap it in. If loading fails, the current
+        index is kept for another ``ttl`` seconds.
+        """
+        fresh = PrefixIndex(self._loader, self._ttl)
+        try:
+            fresh._load()
+        except Exception:
+            logger.exception("Reloading the autocomplete index failed")
+            fresh = None
+        finally:
+            # The thread's own connections would otherwise stay open.
+            connections.close_all()
+        with self._lock:
+            if self._reloader is not threading.current_thread():
+                # The index was reset meanwhile.
+                return
+            pending, self._pending = self._pending, []
+            self._reloader = None
+            if fresh is None:
+                self._expires_at = time.monotonic() + self._ttl
+                return
+            for change, names in pending:
+                change(fresh, *names)
+            self._keys = fresh._keys
+            self._names = fresh._names
+            self._counts = fresh._counts
+            self._expires_at = fresh._expires_at
+
+    def _count(self, name, count):
+        """
+        Count ``name`` and return its key if it was not known before.
+        """
+        key = normalize_medication(name)
+        if not key:
+            return None
+        new = key not in self._names
+        if new:
+            self._names[key] = " ".join(name.split())
+        self._counts[key] += count
+        return key if new else None
+
+    def add(self, *names):
+        """
+        Count one more use of each name. Ignored until the index is loaded, as
+        loading reads the committed names anyway.
+        """
+        with self._lock:
+            if self._reloader:
+                self._pending.append((PrefixIndex._add, names))
+            self._add(*names)
+
+    def _add(self, *names):
+        if self._loaded:
+            for name in names:
+                key = self._count(name, 1)
+                if key is not None:
+                    insort(self._keys, key)
+
+    def remove(self, *names):
+        """
+        Count one use less of each name, dropping names no longer used.
+        """
+        with self._lock:
+            if self._reloader:
+                self._pending.append((PrefixIndex._remove, names))
+            self._remove(*names)
+
+    def _remove(self, *names):
+        if not self._loaded:
+            return
+        for name in names:
+            key = normalize_medication(name)
+            if key not in self._names:
+                continue
+            self._counts[key] -= 1
+            if self._counts[key] <= 0:
+                del self._counts[key]
+                del self._names[key]
+                del self._keys[bisect_left(self._keys, key)]
+
+    def suggest(self, prefix, limit):
+        """
+        Return up to ``limit`` names starting with ``prefix``, most used first.
+        """
+        prefix = normalize_medication(prefix)
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            if not self._reloader and self._expires_at <= time.monotonic():
+                self._start_reload()
+            start = bisect_left(self._keys, prefix)
+            # No key starting with the prefix sorts after prefix + U+10FFFF.
+            end = bisect_left(self._keys, prefix + "\U0010ffff", start)
+            keys = heapq.nsmallest(
+                limit,
+                self._keys[start:end],
+                key=lambda key: (-self._counts[key], key),
+            )
+            return [self._names[key] for key in keys]
+
+    def reset(self):
+        """
+        Forget every name, so the index is loaded again on next use.
+        """
+        with self._lock:
+            self._keys.clear()
+            self._names.clear()
+            self._counts.clear()
+            self._loaded = False
+            self._reloader = None
+            self._pending = []
+
+    def __len__(self):
+        return len(self._keys)
+
+
+# Prescribed medications, kept current by the signal handlers in
+# medlink.signals and by the bulk creation endpoint, and reloaded every
+# AUTOCOMPLETE_INDEX_TTL seconds for the changes made by other processes.
+medication_index = PrefixIndex(medication_counts, settings.AUTOCOMPLETE_INDEX_TTL)
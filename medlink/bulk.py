@@ -0,0 +1,65 @@
+import csv
+import json
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from .hashing import hash_passwords
+from .models import Role
+
+
+def hash_accounts(accounts, parallel=True):
+    """
+    Return ``(email, password, role)`` account tuples with each password
+    replaced by its hash, ready for ``create_users``.
+
+    Call it before opening the transaction of ``create_users``: hashing takes
+    far longer than the INSERTs, and SQLite would hold its write lock, blocking
+    every other writer, for the whole time.
+    """
+    hashes = hash_passwords([password for _, password, _ in accounts], parallel)
+    return [
+        (email, password_hash, role)
+        for (email, _, role), password_hash in zip(accounts, hashes)
+    ]
+
+
+def create_users(accounts):
+    """
+    Create users and their ``Role`` rows with one bulk INSERT per table.
+
+    ``accounts`` is a list of ``(email, password hash, role)`` tuples returned
+    by ``hash_accounts``, whose emails are not registered yet; the email
+    doubles as the username, like in ``RegisterUserView``. Returns a dict
+    mapping each username to its user id.
+    """
+    User = get_user_model()
+    users = User.objects.bulk_create(
+        User(username=email, email=email, password=password_hash)
+        for email, password_hash, _ in accounts
+    )
+    if connection.features.can_return_rows_from_bulk_insert:
+        user_ids = {user.username: user.id for user in users}
+    else:
+        user_ids = dict(
+            User.objects.filter(
+                username__in=[email for email, _, _ in accounts]
+            ).values_list("username", "id")
+        )
+    Role.objects.bulk_create(
+        Role(user_id=user_ids[email], role=role) for email, _, role in accounts
+    )
+    return user_ids
+
+
+def read_records(handle, file_format):
+    """
+    Yield one dict per record of a CSV file with a header row or of a JSONL
+    file, reading ``handle`` lazily.
+    """
+    if file_format == "jsonl":
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+    else:
+        yield from csv.DictReader(handle)
@@ -0,0 +1,287 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.http import parse_etags, quote_etag
+
+from .metrics import record_cache_lookup
+
+
+class LRUCache:
+    """
+    Bounded, thread-safe in-process cache.
+
+    Entries are evicted least recently used first once ``maxsize`` is reached,
+    and expire ``ttl`` seconds after they were stored. Hits and misses are
+    counted so the cache's effectiveness can be monitored, and also in
+    ``medlink.metrics`` under ``name`` if given.
+    """
+
+    def __init__(self, maxsize, ttl, name=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._get(key)
+        if self.name is not None:
+            record_cache_lookup(self.name, value is not None)
+        return value
+
+    def _get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, expires_at = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+            }
+
+
+def prescription_version_key(username):
+    return f"prescriptions:version:{username}"
+
+
+def get_prescription_version(username):
+    """
+    Return the current version of a patient's prescriptions.
+
+    A missing counter is seeded from the clock rather than from 1, so a counter
+    that was culled from the cache never reuses a version that older entries
+    were stored under.
+    """
+    key = prescription_version_key(username)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key, time.time_ns())
+    return version
+
+
+async def aget_prescription_version(username):
+    """
+    Async counterpart of ``get_prescription_version``.
+    """
+    key = prescription_version_key(username)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, time.time_ns(), timeout=None)
+        version = await cache.aget(key, time.time_ns())
+    return version
+
+
+def bump_prescription_version(username):
+    """
+    Invalidate every cached response built from a patient's prescriptions.
+    """
+    key = prescription_version_key(username)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def prescription_list_cache_key(username, filters, generation=None):
+    """
+    Return the cache key of a prescription list, for lists read from the
+    replica copy ``generation`` if not None.
+    """
+    return list_cache_key(
+        username, get_prescription_version(username), filters, generation
+    )
+
+
+async def aprescription_list_cache_key(username, filters, generation=None):
+    """
+    Async counterpart of ``prescription_list_cache_key``.
+    """
+    return list_cache_key(
+        username, await aget_prescription_version(username), filters, generation
+    )
+
+
+def list_cache_key(username, version, filters, generation):
+    params = ":".join(
+        str(filters.get(name) or "") for name in ("from", "to", "ordering")
+    )
+    key = f"prescriptions:list:{username}:{version}:{params}"
+    return key if generation is None else f"{key}:replica{generation}"
+
+
+def prescription_detail_cache_key(prescription_id, generation=None):
+    key = f"prescriptions:detail:{prescription_id}"
+    return key if generation is None else f"{key}:replica{generation}"
+
+
+def data_digest(data):
+    """
+    Return a hash of the payload of a response, from which its entity tag is
+    built.
+
+    The version counters only invalidate the cache of the worker that bumped
+    them, and are not bumped by writes made outside the views, so an entity
+    tag derived from them alone could outlive the data it stands for.
+    """
+    return hashlib.md5(
+        json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+    ).hexdigest()
+
+
+def get_cached_prescription_list(cache_key):
+    """
+    Return the cached entry of a prescription list, a dict holding the
+    ``data`` payload and its ``digest``.
+    """
+    entry = cache.get(cache_key)
+    record_cache_lookup("prescription_list", entry is not None)
+    return entry
+
+
+async def aget_cached_prescription_list(cache_key):
+    """
+    Async counterpart of ``get_cached_prescription_list``.
+    """
+    entry = await cache.aget(cache_key)
+    record_cache_lookup("prescription_list", entry is not None)
+    return entry
+
+
+def set_cached_prescription_list(cache_key, data):
+    entry = {"data": data, "digest": data_digest(data)}
+    cache.set(cache_key, entry, settings.PRESCRIPTION_CACHE_TIMEOUT)
+    return entry
+
+
+async def aset_cached_prescription_list(cache_key, data):
+    entry = {"data": data, "digest": data_digest(data)}
+    await cache.aset(cache_key, entry, settings.PRESCRIPTION_CACHE_TIMEOUT)
+    return entry
+
+
+def get_cached_prescription_detail(prescription_id, generation=None):
+    """
+    Return the cached detail entry of a prescription, a dict holding the
+    ``username`` of the patient, the prescription ``version``, the ``data``
+    payload and its ``digest``, unless the patient's prescriptions changed
+    since it was stored. ``generation`` is the replica copy it is read from,
+    as for ``prescription_list_cache_key``.
+    """
+    entry = cache.get(prescription_detail_cache_key(prescription_id, generation))
+    if entry is not None and entry["version"] != get_prescription_version(
+        entry["username"]
+    ):
+        entry = None
+    record_cache_lookup("prescription_detail", entry is not None)
+    return entry
+
+
+async def aget_cached_prescription_detail(prescription_id, generation=None):
+    """
+    Async counterpart of ``get_cached_prescription_detail``.
+    """
+    entry = await cache.aget(prescription_detail_cache_key(prescription_id, generation))
+    if entry is not None and entry["version"] != await aget_prescription_version(
+        entry["username"]
+    ):
+        entry = None
+    record_cache_lookup("prescription_detail", entry is not None)
+    return entry
+
+
+def prescription_detail_entry(username, version, data):
+    return {
+        "username": username,
+        "version": version,
+        "data": data,
+        "digest": data_digest(data),
+    }
+
+
+def set_cached_prescription_detail(
+    prescription_id, username, version, data, generation=None
+):
+    entry = prescription_detail_entry(username, version, data)
+    cache.set(
+        prescription_detail_cache_key(prescription_id, generation),
+        entry,
+        settings.PRESCRIPTION_CACHE_TIMEOUT,
+    )
+    return entry
+
+
+async def aset_cached_prescription_detail(
+    prescription_id, username, version, data, generation=None
+):
+    entry = prescription_detail_entry(username, version, data)
+    await cache.aset(
+        prescription_detail_cache_key(prescription_id, generation),
+        entry,
+        settings.PRESCRIPTION_CACHE_TIMEOUT,
+    )
+    return entry
+
+
+def prescription_etag(entry, format="json"):
+    """
+    Return the entity tag of a cached prescription list or detail ``entry``,
+    derived from the digest of its data and from the renderer ``format`` of
+    representations other than JSON.
+    """
+    if format != "json":
+        return quote_etag(f"{entry['digest']}-{format}")
+    return quote_etag(entry["digest"])
+
+
+def etag_matches(request, etag):
+    """
+    Check ``If-None-Match`` against ``etag`` using the weak comparison of
+    RFC 9110, which ignores the ``W/`` prefix added by compressing proxies.
+    """
+    header = request.headers.get("If-None-Match")
+    if not header:
+        return False
+    etags = parse_etags(header)
+    if "*" in etags:
+        return True
+    return etag.removeprefix("W/") in {tag.removeprefix("W/") for tag in etags}
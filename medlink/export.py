@@ -0,0 +1,101 @@
+import csv
+import json
+from itertools import islice
+
+from asgiref.sync import sync_to_async
+
+from .models import Prescription
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+EXPORT_FIELDS = [
+    ("id", "id"),
+    ("patient_username", "patient__user__username"),
+    ("doctor_username", "doctor__username"),
+    ("medication", "medication__name"),
+    ("dosage", "dosage"),
+    ("instructions", "instructions"),
+    ("date_prescribed", "date_prescribed"),
+]
+
+
+class Echo:
+    """
+    File-like object whose ``write`` returns the written value, which lets
+    ``csv.writer`` format one row at a time.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_queryset():
+    return Prescription.objects.order_by("id").values_list(
+        *(lookup for _, lookup in EXPORT_FIELDS)
+    )
+
+
+def export_rows(chunk_size):
+    """
+    Yield every prescription as a tuple of ``EXPORT_FIELDS`` values.
+
+    Rows are read ``chunk_size`` at a time with ``iterator()`` and as plain
+    tuples, so memory use does not depend on the number of prescriptions.
+    """
+    return export_queryset().iterator(chunk_size=chunk_size)
+
+
+def line_encoder(export_format):
+    """
+    Return the encoded header line of ``export_format``, or None, and a
+    function encoding a row of ``export_rows`` as a line.
+    """
+    names = [name for name, _ in EXPORT_FIELDS]
+    if export_format == "csv":
+        writer = csv.writer(Echo())
+
+        def encode(row):
+            *values, date_prescribed = row
+            return writer.writerow([*values, date_prescribed.isoformat()]).encode()
+
+        return writer.writerow(names).encode(), encode
+
+    def encode(row):
+        *values, date_prescribed = row
+        record = dict(zip(names, [*values, date_prescribed.isoformat()]))
+        return (json.dumps(record, ensure_ascii=False) + "\n").encode()
+
+    return None, encode
+
+
+def export_lines(export_format, chunk_size):
+    """
+    Yield the export as encoded lines of CSV with a header row, or of JSONL.
+    """
+    header, encode = line_encoder(export_format)
+    if header is not None:
+        yield header
+    for row in export_rows(chunk_size):
+        yield encode(row)
+
+
+def encode_lines(rows, encode, count):
+    return b"".join(encode(row) for row in islice(rows, count))
+
+
+async def aexport_lines(export_format, chunk_size):
+    """
+    Async version of ``export_lines`` for ASGI servers, yielding the lines of
+    ``chunk_size`` rows at a time. The rows are read and encoded in the
+    request's sync thread, as ``aiterator()`` runs the query of a
+    ``values_list()`` in the event loop.
+    """
+    header, encode = line_encoder(export_format)
+    if header is not None:
+        yield header
+    rows = export_rows(chunk_size)
+    while lines := await sync_to_async(encode_lines)(rows, encode, chunk_size):
+        yield lines
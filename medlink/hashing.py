@@ -0,0 +1,62 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+
+# This module is imported by the spawned hashing workers before Django is set
+# up, so it must not import any model.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _setup_worker(settings_module):
+    # Spawned workers start from a fresh interpreter and need Django set up to
+    # read PASSWORD_HASHERS.
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", settings_module)
+    django.setup()
+
+
+def get_hashing_executor():
+    """
+    Return the process pool used to hash passwords, starting it on first use.
+
+    Workers are spawned rather than forked, as forking a multi-threaded server
+    process is unsafe.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASHING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_setup_worker,
+                initargs=(os.environ["DJANGO_SETTINGS_MODULE"],),
+            )
+        return _executor
+
+
+def hash_passwords(passwords, parallel=True):
+    """
+    Hash ``passwords`` with ``make_password``, spreading the work over the
+    hashing process pool. ``None`` entries become unusable passwords.
+    """
+    hashes = [None if password else make_password(None) for password in passwords]
+    indexes = [index for index, password in enumerate(passwords) if password]
+    if not indexes:
+        return hashes
+
+    to_hash = [passwords[index] for index in indexes]
+    workers = settings.PASSWORD_HASHING_WORKERS
+    if parallel and workers > 1 and len(to_hash) > 1:
+        chunksize = max(1, len(to_hash) // (workers * 4))
+        hashed = get_hashing_executor().map(make_password, to_hash, chunksize=chunksize)
+    else:
+        hashed = map(make_password, to_hash)
+    for index, password_hash in zip(indexes, hashed):
+        hashes[index] = password_hash
+    return hashes
@@ -0,0 +1,101 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from medlink.columnar import MEDIA_TYPE as COLUMNAR_MEDIA_TYPE
+from medlink.middleware import compress_chunks
+
+from .benchmark_endpoints import Command as EndpointBenchmark
+
+LEVELS = [1, 3, 6, 9]
+
+
+class Command(BaseCommand):
+    help = (
+        "Report the size and compression time of the list and export responses "
+        "at several gzip levels, on the data seeded by benchmark_endpoints. The "
+        "data is created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=1000)
+        parser.add_argument("--prescriptions-per-patient", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--level",
+            type=int,
+            action="append",
+            choices=range(1, 10),
+            help="Compression level to measure, can be repeated (default: 1 3 6 9).",
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seeded = EndpointBenchmark().seed({**options, "requests": 0, "warmup": 0})
+            payloads = self.payloads(seeded)
+            transaction.set_rollback(True)
+
+        levels = options["level"] or LEVELS
+        for name, chunks in payloads.items():
+            body = b"".join(chunks)
+            self.stdout.write(f"{name}: {len(body)} bytes in {len(chunks)} chunks")
+            for level in levels:
+                size, seconds = self.measure(chunks, level, options["repeat"])
+                self.stdout.write(
+                    f"  level {level}  {size:10d} bytes  "
+                    f"ratio {len(body) / size:6.1f}  "
+                    f"{seconds * 1000:8.2f} ms  "
+                    f"{len(body) / seconds / 1e6:7.1f} MB/s"
+                )
+
+    def payloads(self, seeded):
+        """
+        Return the uncompressed bodies of the list and export responses, as
+        the lists of chunks they are sent in.
+        """
+        client = APIClient()
+        client.force_authenticate(user=User.objects.get(username=seeded["doctor"]))
+        page_size = settings.PATIENT_LIST_MAX_PAGE_SIZE
+        list_patients = f"{reverse('list_patients')}?page_size={page_size}"
+        list_prescriptions = (
+            f"{reverse('list_prescriptions')}?patient_username={seeded['patients'][0]}"
+        )
+        export = reverse("export_prescriptions")
+        requests = {
+            "patient list page": (list_patients, {}),
+            "patient list page, columnar": (
+                list_patients,
+                {"HTTP_ACCEPT": COLUMNAR_MEDIA_TYPE},
+            ),
+            "prescription list": (list_prescriptions, {}),
+            "export csv": (f"{export}?export_format=csv", {}),
+            "export jsonl": (f"{export}?export_format=jsonl", {}),
+        }
+        payloads = {}
+        for name, (url, headers) in requests.items():
+            response = client.get(url, **headers)
+            if response.streaming:
+                payloads[name] = list(response.streaming_content)
+            else:
+                payloads[name] = [response.content]
+        return payloads
+
+    def measure(self, chunks, level, repeat):
+        """
+        Compress ``chunks`` like ``CompressionMiddleware`` does at ``level``, and
+        return the compressed size and the best time of ``repeat`` runs.
+        """
+        best = float("inf")
+        with override_settings(COMPRESSION_LEVEL=level):
+            for _ in range(repeat):
+                started = time.perf_counter()
+                size = sum(map(len, compress_chunks(chunks, "gzip")))
+                best = min(best, time.perf_counter() - started)
+        return size, best
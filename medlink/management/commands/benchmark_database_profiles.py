@@ -0,0 +1,116 @@
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+from medlink.models import Medication, Patient, Prescription
+
+MEDICATIONS = ["Paracetamol", "Ibuprofen", "Amoxicillin", "Metformin", "Cetirizine"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run concurrent prescription writers against a scratch SQLite database "
+        "with each of the DATABASE_PROFILES and report writes/second and the "
+        'number of "database is locked" errors.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profile",
+            action="append",
+            choices=sorted(settings.DATABASE_PROFILES),
+            help="Profile to benchmark, can be repeated (default: all).",
+        )
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--writes", type=int, default=100, help="Per thread.")
+
+    def handle(self, *args, **options):
+        for profile in options["profile"] or sorted(settings.DATABASE_PROFILES):
+            with tempfile.TemporaryDirectory() as directory:
+                alias = f"benchmark_{profile}"
+                connections.settings[alias] = connections.configure_settings(
+                    {
+                        **settings.DATABASES,
+                        alias: {
+                            "ENGINE": "django.db.backends.sqlite3",
+                            "NAME": str(Path(directory) / "db.sqlite3"),
+                            **settings.DATABASE_PROFILES[profile],
+                        },
+                    }
+                )[alias]
+                try:
+                    call_command("migrate", database=alias, verbosity=0)
+                    written, locked, elapsed = self.run_writers(alias, options)
+                finally:
+                    connections[alias].close()
+                    del connections[alias]
+                    del connections.settings[alias]
+            self.stdout.write(
+                f"{profile:12} {written / elapsed:8.1f} writes/s  "
+                f"{locked} locked errors  ({written} written in {elapsed:.2f}s)"
+            )
+
+    def run_writers(self, alias, options):
+        """
+        Create prescriptions from ``--threads`` threads at once, each with its
+        own connection, like concurrent requests of the bulk creation endpoint:
+        reads then writes in one transaction.
+        """
+        doctor = User.objects.db_manager(alias).create_user(username="doctor")
+        patient_user = User.objects.db_manager(alias).create_user(username="patient")
+        Patient.objects.using(alias).create(user=patient_user)
+
+        lock = threading.Lock()
+        written = 0
+        locked = 0
+
+        def write(seed):
+            nonlocal written, locked
+            rng = random.Random(seed)
+            try:
+                for _ in range(options["writes"]):
+                    try:
+                        with transaction.atomic(using=alias):
+                            patient = (
+                                Patient.objects.using(alias)
+                                .select_related("user")
+                                .get(user__username="patient")
+                            )
+                            Prescription.objects.using(alias).create(
+                                patient=patient,
+                                doctor_id=doctor.id,
+                                medication=Medication.objects.db_manager(
+                                    alias
+                                ).get_for_name(rng.choice(MEDICATIONS)),
+                                dosage="500mg",
+                                instructions="Take twice a day",
+                            )
+                    except OperationalError as exc:
+                        if "locked" not in str(exc):
+                            raise
+                        with lock:
+                            locked += 1
+                    else:
+                        with lock:
+                            written += 1
+            finally:
+                connections[alias].close()
+
+        threads = [
+            threading.Thread(target=write, args=(seed,))
+            for seed in range(options["threads"])
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return written, locked, time.perf_counter() - started
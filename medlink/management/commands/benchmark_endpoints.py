@@ -0,0 +1,495 @@
+import itertools
+import json
+import math
+import platform
+import random
+import tempfile
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from medlink.authentication import user_cache
+from medlink.autocomplete import medication_index
+from medlink.models import MedicalHistoryEntry, Medication, Patient, Prescription, Role
+
+PASSWORD = "benchmark-secret"
+
+MEDICATIONS = [
+    "Paracetamol",
+    "Ibuprofen",
+    "Amoxicillin",
+    "Metformin",
+    "Atorvastatin",
+    "Omeprazole",
+    "Cetirizine",
+    "Azithromycin",
+    "Lisinopril",
+    "Salbutamol",
+]
+
+INSTRUCTIONS = [
+    "Take after meals",
+    "Take before breakfast with water",
+    "Apply twice a day on the affected area",
+    "Take at bedtime",
+]
+
+HISTORY = [
+    "No known allergies",
+    "Seasonal asthma since childhood",
+    "Appendectomy in 2015",
+]
+
+PERCENTILES = [50, 95, 99]
+
+
+def percentile(values, rank):
+    """
+    Return the nearest-rank ``rank`` percentile of the sorted ``values``.
+    """
+    return values[max(0, math.ceil(rank / 100 * len(values)) - 1)]
+
+
+class Scenario:
+    """
+    One route driven by the benchmark: ``build(index)`` returns the path and
+    the payload of the ``index``-th request, sent with the ``token`` access
+    token if given.
+    """
+
+    def __init__(self, name, method, build, token=None):
+        self.name = name
+        self.method = method
+        self.build = build
+        self.token = token
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a scratch SQLite database, send concurrent requests to every "
+        "medlink route and the token endpoints in-process, and report the "
+        "p50/p95/p99 latency, requests/second and queries per request of each "
+        "route as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--patients", type=int, default=1000)
+        parser.add_argument("--prescriptions-per-patient", type=int, default=10)
+        parser.add_argument("--requests", type=int, default=200, help="Per route.")
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument(
+            "--warmup", type=int, default=5, help="Untimed requests per route."
+        )
+        parser.add_argument(
+            "--bulk-size", type=int, default=10, help="Items per bulk request."
+        )
+        parser.add_argument(
+            "--route",
+            action="append",
+            help="Route to benchmark, by URL name, can be repeated (default: all).",
+        )
+        parser.add_argument(
+            "--output", help="File to write the JSON report to (default: stdout)."
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != "sqlite":
+            raise CommandError("The endpoint benchmark runs on SQLite only.")
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Every alias, the replica included, points at the scratch database,
+            # like a replica that is always in sync.
+            names = {
+                alias: connections.settings[alias]["NAME"] for alias in connections
+            }
+            connections.close_all()
+            for alias in names:
+                connections.settings[alias]["NAME"] = str(
+                    Path(directory) / "db.sqlite3"
+                )
+            try:
+                call_command("migrate", verbosity=0)
+                # Every bulk registration request is timed, none throttled.
+                with override_settings(USER_BULK_THROTTLE_RATE=None):
+                    report = self.run_benchmark(options)
+            finally:
+                connections.close_all()
+                for alias, name in names.items():
+                    connections.settings[alias]["NAME"] = name
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            Path(options["output"]).write_text(output + "\n")
+            for name, route in report["routes"].items():
+                self.stdout.write(
+                    f"{name:28} p50 {route['p50_ms']:8.2f}ms  "
+                    f"p95 {route['p95_ms']:8.2f}ms  p99 {route['p99_ms']:8.2f}ms  "
+                    f"{route['requests_per_second']:8.1f} req/s  "
+                    f"{route['queries_per_request']:6.2f} queries/req"
+                )
+        else:
+            self.stdout.write(output)
+
+    def run_benchmark(self, options):
+        seeded = self.seed(options)
+        scenarios = self.scenarios(seeded, self.tokens(seeded["doctor"]), options)
+        if options["route"]:
+            unknown = set(options["route"]) - {scenario.name for scenario in scenarios}
+            if unknown:
+                raise CommandError(f"Unknown route: {', '.join(sorted(unknown))}")
+            scenarios = [
+                scenario for scenario in scenarios if scenario.name in options["route"]
+            ]
+
+        routes = {}
+        for scenario in scenarios:
+            routes[scenario.name] = self.run_scenario(scenario, options)
+        return {
+            "meta": {
+                "created": timezone.now().isoformat(),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database_profile": settings.DATABASE_PROFILE,
+                "patients": options["patients"],
+                "prescriptions_per_patient": options["prescriptions_per_patient"],
+                "requests": options["requests"],
+                "concurrency": options["concurrency"],
+                "warmup": options["warmup"],
+                "bulk_size": options["bulk_size"],
+            },
+            "routes": routes,
+        }
+
+    def seed(self, options):
+        """
+        Create a doctor, ``--patients`` patients with their medical history and
+        prescriptions, and the registered users that the patient creation
+        requests turn into patients. All users share one password hash, so
+        seeding does not hash a password per user.
+        """
+        password = make_password(PASSWORD)
+        count = options["patients"]
+        spare = options["requests"] + options["warmup"]
+
+        doctor = User.objects.create(
+            username="doctor@example.com", email="doctor@example.com", password=password
+        )
+        Role.objects.create(user=doctor, role="doctor")
+        emails = [f"patient{index}@example.com" for index in range(count)]
+        spare_emails = [f"unassigned{index}@example.com" for index in range(spare)]
+        users = User.objects.bulk_create(
+            User(username=email, email=email, password=password)
+            for email in emails + spare_emails
+        )
+        Role.objects.bulk_create(Role(user=user, role="patient") for user in users)
+        patients = Patient.objects.bulk_create(
+            Patient(user=user) for user in users[:count]
+        )
+
+        MedicalHistoryEntry.objects.bulk_create(
+            MedicalHistoryEntry(patient=patient, text=text)
+            for patient in patients
+            for text in HISTORY
+        )
+
+        rng = random.Random(0)
+        medications = list(Medication.objects.intern(MEDICATIONS).values())
+        per_patient = options["prescriptions_per_patient"]
+        for offset in range(0, count, 100):
+            Prescription.objects.bulk_create(
+                Prescription(
+                    patient=patient,
+                    doctor=doctor,
+                    medication=rng.choice(medications),
+                    dosage="500mg",
+                    instructions=rng.choice(INSTRUCTIONS),
+                )
+                for patient in patients[offset : offset + 100]
+                for _ in range(per_patient)
+            )
+
+        cache.clear()
+        user_cache.clear()
+        medication_index.reset()
+        return {
+            "doctor": doctor.username,
+            "patients": emails,
+            "spare": spare_emails,
+            "prescription_ids": list(
+                Prescription.objects.order_by("id").values_list("id", flat=True)
+            ),
+        }
+
+    def tokens(self, username):
+        """
+        Obtain a token pair for ``username`` from the token endpoint.
+        """
+        response = APIClient().post(
+            reverse("token_obtain_pair"),
+            {"username": username, "password": PASSWORD},
+            format="json",
+        )
+        if response.status_code != 200:
+            raise CommandError(f"Could not obtain a token for {username}")
+        return response.data
+
+    def scenarios(self, seeded, tokens, options):
+        doctor = seeded["doctor"]
+        access = tokens["access"]
+        patients = seeded["patients"] or [doctor]
+        ids = seeded["prescription_ids"] or [0]
+        bulk_size = options["bulk_size"]
+        # Unique suffixes for the users created by the registration routes.
+        serial = itertools.count()
+
+        def pick(values, index):
+            return values[index * 7919 % len(values)]
+
+        def account(role="doctor"):
+            return {
+                "email": f"new{next(serial)}@example.com",
+                "password": PASSWORD,
+                "role": role,
+            }
+
+        def prescription(index):
+            return {
+                "patient_username": pick(patients, index),
+                "medication": pick(MEDICATIONS, index),
+                "dosage": "250mg",
+                "instruction": pick(INSTRUCTIONS, index),
+            }
+
+        def get(name, query="", **kwargs):
+            return lambda index: (f"{reverse(name, kwargs=kwargs)}{query}", None)
+
+        def detail(name):
+            return lambda index: (
+                reverse(name, kwargs={"prescription_id": pick(ids, index)}),
+                None,
+            )
+
+        def list_prescriptions(name):
+            return lambda index: (
+                f"{reverse(name)}?patient_username={pick(patients, index)}",
+                None,
+            )
+
+        return [
+            Scenario(
+                "token_obtain_pair",
+                "post",
+                lambda index: (
+                    reverse("token_obtain_pair"),
+                    {"username": doctor, "password": PASSWORD},
+                ),
+            ),
+            Scenario(
+                "token_refresh",
+                "post",
+                lambda index: (
+                    reverse("token_refresh"),
+                    {"refresh": tokens["refresh"]},
+                ),
+            ),
+            Scenario(
+                "register_user",
+                "post",
+                lambda index: (reverse("register_user"), account()),
+            ),
+            Scenario(
+                "bulk_register_users",
+                "post",
+                lambda index: (
+                    reverse("bulk_register_users"),
+                    [account() for _ in range(bulk_size)],
+                ),
+            ),
+            Scenario(
+                "create_patient",
+                "post",
+                lambda index: (
+                    reverse("create_patient"),
+                    {"patient": seeded["spare"][index]},
+                ),
+                access,
+            ),
+            Scenario("list_patients", "get", get("list_patients"), access),
+            Scenario(
+                "medical_history",
+                "get",
+                lambda index: (
+                    f"{reverse('medical_history')}"
+                    f"?patient_username={pick(patients, index)}",
+                    None,
+                ),
+                access,
+            ),
+            Scenario(
+                "create_prescription",
+                "post",
+                lambda index: (reverse("create_prescription"), prescription(index)),
+                access,
+            ),
+            Scenario(
+                "bulk_create_prescriptions",
+                "post",
+                lambda index: (
+                    reverse("bulk_create_prescriptions"),
+                    [
+                        prescription(index * bulk_size + item)
+                        for item in range(bulk_size)
+                    ],
+                ),
+                access,
+            ),
+            Scenario(
+                "list_prescriptions",
+                "get",
+                list_prescriptions("list_prescriptions"),
+                access,
+            ),
+            Scenario(
+                "export_prescriptions",
+                "get",
+                get("export_prescriptions", "?export_format=jsonl"),
+                access,
+            ),
+            Scenario(
+                "medication_autocomplete",
+                "get",
+                lambda index: (
+                    f"{reverse('medication_autocomplete')}"
+                    f"?q={pick(MEDICATIONS, index)[:3]}",
+                    None,
+                ),
+                access,
+            ),
+            Scenario(
+                "search_prescriptions",
+                "get",
+                lambda index: (
+                    f"{reverse('search_prescriptions')}"
+                    f"?q={pick(MEDICATIONS, index)[:4]}",
+                    None,
+                ),
+                access,
+            ),
+            Scenario(
+                "prescription_detail", "get", detail("prescription_detail"), access
+            ),
+            Scenario("async_list_patients", "get", get("async_list_patients"), access),
+            Scenario(
+                "async_list_prescriptions",
+                "get",
+                list_prescriptions("async_list_prescriptions"),
+                access,
+            ),
+            Scenario(
+                "async_prescription_detail",
+                "get",
+                detail("async_prescription_detail"),
+                access,
+            ),
+        ]
+
+    def run_scenario(self, scenario, options):
+        """
+        Send ``--warmup`` untimed requests, then ``--requests`` requests from
+        ``--concurrency`` threads, each with its own client and connection, and
+        summarize their latencies, statuses and queries.
+        """
+        indexes = iter(range(options["warmup"] + options["requests"]))
+        lock = threading.Lock()
+        latencies = []
+        queries = []
+        statuses = Counter()
+
+        def next_index():
+            with lock:
+                return next(indexes, None)
+
+        def count_queries(counter):
+            def wrapper(execute, sql, params, many, context):
+                counter[0] += 1
+                return execute(sql, params, many, context)
+
+            return wrapper
+
+        def send(client, index):
+            path, data = scenario.build(index)
+            counter = [0]
+            with connection.execute_wrapper(count_queries(counter)):
+                started = time.perf_counter()
+                response = getattr(client, scenario.method)(path, data, format="json")
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            return response.status_code, elapsed, counter[0]
+
+        def client_for():
+            client = APIClient()
+            if scenario.token is not None:
+                client.credentials(HTTP_AUTHORIZATION=f"Bearer {scenario.token}")
+            return client
+
+        client = client_for()
+        for _ in range(options["warmup"]):
+            send(client, next_index())
+
+        def run():
+            client = client_for()
+            try:
+                while (index := next_index()) is not None:
+                    status, elapsed, count = send(client, index)
+                    with lock:
+                        statuses[status] += 1
+                        latencies.append(elapsed * 1000)
+                        queries.append(count)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run) for _ in range(options["concurrency"])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        result = {
+            "method": scenario.method.upper(),
+            "requests": len(latencies),
+            "errors": sum(count for status, count in statuses.items() if status >= 400),
+            "statuses": {
+                str(status): count for status, count in sorted(statuses.items())
+            },
+        }
+        for rank in PERCENTILES:
+            result[f"p{rank}_ms"] = (
+                round(percentile(latencies, rank), 3) if latencies else None
+            )
+        result["mean_ms"] = (
+            round(sum(latencies) / len(latencies), 3) if latencies else None
+        )
+        result["requests_per_second"] = round(len(latencies) / elapsed, 2)
+        result["queries_per_request"] = (
+            round(sum(queries) / len(queries), 2) if queries else None
+        )
+        return result
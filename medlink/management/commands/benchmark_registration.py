@@ -0,0 +1,65 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import override_settings
+
+from rest_framework.test import APIClient
+
+from medlink.hashing import hash_passwords
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare users/second of the single user registration endpoint with the "
+        "bulk registration endpoint. Everything runs inside a transaction that is "
+        "rolled back, so no user is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=32)
+
+    def handle(self, *args, **options):
+        count = options["users"]
+        client = APIClient()
+        accounts = [
+            {
+                "email": f"user{index}@example.com",
+                "password": "secret",
+                "role": "doctor",
+            }
+            for index in range(count)
+        ]
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            for account in accounts:
+                response = client.post(
+                    "/medlink/user-registration/", account, format="json"
+                )
+                assert response.status_code == 201, response.data
+            single = count / (time.perf_counter() - started)
+            transaction.set_rollback(True)
+
+        # Start the hashing workers before timing the bulk endpoint.
+        hash_passwords(["warm-up"] * settings.PASSWORD_HASHING_WORKERS)
+
+        with transaction.atomic(), override_settings(USER_BULK_THROTTLE_RATE=None):
+            batch_size = settings.USER_BULK_MAX_ITEMS
+            started = time.perf_counter()
+            for offset in range(0, count, batch_size):
+                response = client.post(
+                    "/medlink/user-registration/bulk/",
+                    accounts[offset : offset + batch_size],
+                    format="json",
+                )
+                assert response.status_code == 201, response.data
+            bulk = count / (time.perf_counter() - started)
+            transaction.set_rollback(True)
+
+        self.stdout.write(f"user-registration/:      {single:8.1f} users/s")
+        self.stdout.write(
+            f"user-registration/bulk/: {bulk:8.1f} users/s "
+            f"({settings.PASSWORD_HASHING_WORKERS} hashing workers)"
+        )
@@ -0,0 +1,130 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from medlink.models import Medication, Patient, Prescription
+from medlink.search import like_search_prescription_ids, search_prescription_ids
+
+MEDICATIONS = [
+    "Paracetamol",
+    "Ibuprofen",
+    "Amoxicillin",
+    "Metformin",
+    "Atorvastatin",
+    "Omeprazole",
+    "Cetirizine",
+    "Azithromycin",
+    "Lisinopril",
+    "Salbutamol",
+]
+
+INSTRUCTIONS = [
+    "Take after meals",
+    "Take before breakfast with water",
+    "Apply twice a day on the affected area",
+    "Inhale when short of breath",
+    "Avoid alcohol during the course",
+    "Take at bedtime",
+    "Finish the full course even if symptoms improve",
+    "Dissolve in warm water before drinking",
+]
+
+# Given to one prescription in RARE_EVERY, so that some queries are selective.
+RARE_MEDICATIONS = ["Hydroxychloroquine", "Levothyroxine", "Clopidogrel"]
+RARE_EVERY = 2000
+
+QUERIES = [
+    "paracetamol",
+    "amox",
+    "take water",
+    "hydroxychloroquine",
+    "levothyr",
+    "clopidogrel bedtime",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the FTS5 prescription search with a LIKE scan over a synthetic "
+        "dataset. Everything runs inside a transaction that is rolled back, so "
+        "no prescription is kept."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--limit", type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        batch_size = options["batch_size"]
+        rng = random.Random(0)
+
+        with transaction.atomic():
+            doctor = User.objects.create_user(username="benchmark-doctor")
+            patient = Patient.objects.create(
+                user=User.objects.create_user(username="benchmark-patient")
+            )
+            medication_ids = {
+                name: medication.id
+                for name, medication in Medication.objects.intern(
+                    MEDICATIONS + RARE_MEDICATIONS
+                ).items()
+            }
+            table = Prescription._meta.db_table
+            now = timezone.now()
+
+            started = time.perf_counter()
+            with connection.cursor() as cursor:
+                for offset in range(0, rows, batch_size):
+                    cursor.executemany(
+                        f"INSERT INTO {table} (patient_id, doctor_id, medication_id, "
+                        "dosage, instructions, date_prescribed) "
+                        "VALUES (%s, %s, %s, %s, %s, %s)",
+                        [
+                            (
+                                patient.id,
+                                doctor.id,
+                                medication_ids[self.medication(rng)],
+                                "1 tablet",
+                                " ".join(rng.sample(INSTRUCTIONS, 2)),
+                                now,
+                            )
+                            for _ in range(min(batch_size, rows - offset))
+                        ],
+                    )
+            self.stdout.write(
+                f"Seeded {rows} prescriptions in "
+                f"{time.perf_counter() - started:.1f}s"
+            )
+
+            for query in QUERIES:
+                terms = query.split()
+                fts = self.time(search_prescription_ids, terms, options)
+                like = self.time(like_search_prescription_ids, terms, options)
+                self.stdout.write(
+                    f"{query!r:22} fts: {fts * 1000:9.2f} ms  "
+                    f"like: {like * 1000:9.2f} ms  ({like / fts:6.1f}x)"
+                )
+            transaction.set_rollback(True)
+
+    def medication(self, rng):
+        if rng.randrange(RARE_EVERY) == 0:
+            return rng.choice(RARE_MEDICATIONS)
+        return rng.choice(MEDICATIONS)
+
+    def time(self, search, terms, options):
+        """
+        Return the best wall time, in seconds, of fetching the first page.
+        """
+        timings = []
+        for _ in range(options["repeat"]):
+            started = time.perf_counter()
+            search(terms, limit=options["limit"])
+            timings.append(time.perf_counter() - started)
+        return min(timings)
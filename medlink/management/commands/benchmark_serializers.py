@@ -0,0 +1,156 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test.utils import override_settings
+
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from medlink import columnar
+from medlink.models import Medication, Patient, Prescription
+from medlink.renderers import ColumnarRenderer, FastJSONRenderer
+from medlink.serializers import (
+    PatientListResponseSerializer,
+    PatientListValuesSerializer,
+    PrescriptionInfoSerializer,
+    PrescriptionInfoValuesSerializer,
+    PrescriptionSerializer,
+    PrescriptionValuesSerializer,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/second of the DRF serializers and JSONRenderer with the "
+        ".values() fast path and FastJSONRenderer on long lists, and check that "
+        "both produce the same bytes, with ORJSON_RENDERING on, then compare the "
+        "size and decode time of the JSON and columnar renderings. Everything "
+        "runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        rows = options["rows"]
+        with transaction.atomic(), override_settings(ORJSON_RENDERING=True):
+            doctor = User.objects.create(username="benchmark-doctor")
+            users = User.objects.bulk_create(
+                User(username=f"patient{index}@example.com", email=f"p{index}@x.com")
+                for index in range(rows)
+            )
+            patients = Patient.objects.bulk_create(Patient(user=user) for user in users)
+            medication = Medication.objects.get_for_name("Paracetamol")
+            Prescription.objects.bulk_create(
+                Prescription(
+                    patient=patients[0],
+                    doctor=doctor,
+                    medication=medication,
+                    dosage="500mg",
+                    instructions="Take twice a day – after meals",
+                )
+                for _ in range(rows)
+            )
+            prescriptions = Prescription.objects.filter(patient=patients[0]).order_by(
+                "id"
+            )
+
+            self.compare(
+                "patient list",
+                lambda: PatientListResponseSerializer(
+                    Patient.objects.select_related("user").order_by("id"), many=True
+                ).data,
+                lambda: PatientListValuesSerializer.serialize(
+                    PatientListValuesSerializer.values(Patient.objects.order_by("id"))
+                ),
+                options,
+            )
+            self.compare(
+                "prescription list",
+                lambda: PrescriptionSerializer(
+                    prescriptions.select_related("patient__user", "doctor"), many=True
+                ).data,
+                lambda: PrescriptionValuesSerializer.serialize(
+                    PrescriptionValuesSerializer.values(prescriptions)
+                ),
+                options,
+            )
+            self.compare(
+                "prescription info",
+                lambda: PrescriptionInfoSerializer(
+                    prescriptions.select_related(
+                        "patient__user", "doctor", "medication"
+                    ),
+                    many=True,
+                ).data,
+                lambda: PrescriptionInfoValuesSerializer.serialize(
+                    PrescriptionInfoValuesSerializer.values(prescriptions)
+                ),
+                options,
+            )
+            transaction.set_rollback(True)
+
+    def compare(self, label, drf_data, fast_data, options):
+        """
+        Time fetching and serializing the rows, then rendering them, best of
+        ``--repeat`` runs, with DRF and with the fast path.
+        """
+        results = {}
+        for name, serialize, renderer in (
+            ("drf", drf_data, JSONRenderer()),
+            ("fast", fast_data, FastJSONRenderer()),
+        ):
+            serialize_time = render_time = float("inf")
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                data = serialize()
+                serialized = time.perf_counter()
+                body = renderer.render(data)
+                rendered = time.perf_counter()
+                serialize_time = min(serialize_time, serialized - started)
+                render_time = min(render_time, rendered - serialized)
+            results[name] = (len(data), serialize_time, render_time, body)
+
+        if results["drf"][3] != results["fast"][3]:
+            raise CommandError(f"{label}: the fast path renders different bytes")
+        for name, (count, serialize_time, render_time, _) in results.items():
+            self.stdout.write(
+                f"{label + ' ' + name:28} "
+                f"serialize {count / serialize_time:10.0f} rows/s  "
+                f"render {count / render_time:10.0f} rows/s  "
+                f"total {count / (serialize_time + render_time):10.0f} rows/s"
+            )
+        self.compare_formats(label, data, options)
+
+    def compare_formats(self, label, data, options):
+        """
+        Print the size of the JSON and columnar renderings of ``data`` and the
+        time their clients take to decode them, best of ``--repeat`` runs.
+        """
+        json_body = FastJSONRenderer().render(data)
+        columnar_body = ColumnarRenderer().render(data)
+        decoders = [("json", json.loads, json_body)]
+        if orjson is not None:
+            decoders.append(("orjson", orjson.loads, json_body))
+        decoders.append(("columnar", columnar.loads, columnar_body))
+        for name, loads, body in decoders:
+            decode_time = float("inf")
+            for _ in range(options["repeat"]):
+                started = time.perf_counter()
+                decoded = loads(body)
+                decode_time = min(decode_time, time.perf_counter() - started)
+            if decoded != data:
+                raise CommandError(f"{label}: {name} does not decode to the data")
+            self.stdout.write(
+                f"{label + ' ' + name:28} "
+                f"size {len(body):10d} bytes  "
+                f"decode {decode_time * 1000:8.1f} ms"
+            )
@@ -0,0 +1,43 @@
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from medlink.export import EXPORT_FORMATS, export_lines
+
+
+class Command(BaseCommand):
+    help = (
+        "Export every prescription as CSV or JSONL, streaming rows from the "
+        "database in chunks so memory use stays constant."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(EXPORT_FORMATS), default="csv")
+        parser.add_argument(
+            "--output", help="File to write to, the standard output by default."
+        )
+        parser.add_argument(
+            "--chunk-size", type=int, default=settings.EXPORT_CHUNK_SIZE
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        lines = 0
+        output = (
+            open(options["output"], "wb") if options["output"] else sys.stdout.buffer
+        )
+        try:
+            for line in export_lines(options["format"], options["chunk_size"]):
+                output.write(line)
+                lines += 1
+        finally:
+            if options["output"]:
+                output.close()
+        if options["output"]:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Exported {lines} lines in {time.monotonic() - started:.1f}s"
+                )
+            )
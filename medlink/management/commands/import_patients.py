@@ -0,0 +1,140 @@
+import os
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.utils import timezone
+
+from medlink.bulk import create_users, hash_accounts, read_records
+from medlink.models import MedicalHistoryEntry, Patient, history_chunks
+
+
+class Command(BaseCommand):
+    help = (
+        "Import patients from a CSV or JSONL file with email, and optional "
+        "password and medical_history columns. The file is streamed in chunks, "
+        "each committed in its own transaction, and progress is checkpointed so "
+        "an interrupted import can be resumed with --resume. Rows without a "
+        "password get an unusable one; passwords are hashed in a process pool of "
+        "PASSWORD_HASHING_WORKERS processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path)
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="File format, guessed from the file extension by default.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--checkpoint",
+            type=Path,
+            help="Checkpoint file, <path>.checkpoint by default.",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip the rows committed by a previous run.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not path.exists():
+            raise CommandError(f"File {path} does not exist")
+        file_format = options["format"] or (
+            "jsonl" if path.suffix in (".jsonl", ".ndjson") else "csv"
+        )
+        chunk_size = options["chunk_size"]
+        checkpoint = options["checkpoint"] or path.with_name(f"{path.name}.checkpoint")
+
+        skip = 0
+        if options["resume"] and checkpoint.exists():
+            skip = int(checkpoint.read_text())
+            self.stdout.write(f"Resuming after row {skip}")
+
+        totals = {"rows": skip, "created": 0, "skipped": 0, "invalid": 0}
+        started = time.monotonic()
+        with path.open(newline="", encoding="utf-8") as handle:
+            rows = islice(read_records(handle, file_format), skip, None)
+            while chunk := list(islice(rows, chunk_size)):
+                counts = self.import_chunk(chunk)
+                for key, value in counts.items():
+                    totals[key] += value
+                totals["rows"] += len(chunk)
+                self.write_checkpoint(checkpoint, totals["rows"])
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    "{rows} rows read, {created} created, {skipped} skipped, "
+                    "{invalid} invalid ({rate:.0f} rows/s)".format(
+                        rate=(totals["rows"] - skip) / elapsed if elapsed else 0,
+                        **totals,
+                    )
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {totals['created']} patients in "
+                f"{time.monotonic() - started:.1f}s"
+            )
+        )
+
+    def import_chunk(self, chunk):
+        """
+        Create the patients of the new, valid rows of ``chunk`` in one
+        transaction, after hashing their passwords outside of it.
+        """
+        counts = {"created": 0, "skipped": 0, "invalid": 0}
+        entries = {}
+        for row in chunk:
+            email = (row.get("email") or "").strip()
+            try:
+                validate_email(email)
+            except ValidationError:
+                counts["invalid"] += 1
+                continue
+            if email in entries:
+                counts["skipped"] += 1
+                continue
+            entries[email] = row
+
+        existing = set(
+            get_user_model()
+            .objects.filter(username__in=entries)
+            .values_list("username", flat=True)
+        )
+        counts["skipped"] += len(existing)
+        accounts = [
+            (email, row.get("password") or None, "patient")
+            for email, row in entries.items()
+            if email not in existing
+        ]
+        if not accounts:
+            return counts
+
+        accounts = hash_accounts(accounts)
+        with transaction.atomic():
+            user_ids = create_users(accounts)
+            patients = Patient.objects.bulk_create(
+                Patient(user_id=user_ids[email]) for email, _, _ in accounts
+            )
+            created = timezone.now()
+            MedicalHistoryEntry.objects.bulk_create(
+                MedicalHistoryEntry(patient=patient, text=text, created=created)
+                for patient, (email, _, _) in zip(patients, accounts)
+                for text in history_chunks(entries[email].get("medical_history") or "")
+            )
+        counts["created"] += len(accounts)
+        return counts
+
+    def write_checkpoint(self, checkpoint, rows):
+        # Replace the file atomically so a crash never leaves it half written.
+        temporary = checkpoint.with_name(f"{checkpoint.name}.tmp")
+        temporary.write_text(str(rows))
+        os.replace(temporary, checkpoint)
@@ -0,0 +1,43 @@
+import pstats
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+SORT_KEYS = ["tottime", "cumulative", "ncalls"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Aggregate the request profiles written by ProfilingMiddleware and print "
+        "the functions taking the most time across them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--directory",
+            default=settings.PROFILING_DIRECTORY,
+            help="Profiles directory, PROFILING_DIRECTORY by default.",
+        )
+        parser.add_argument(
+            "--view",
+            action="append",
+            help="View whose profiles to aggregate, can be repeated (default: all).",
+        )
+        parser.add_argument("--sort", choices=SORT_KEYS, default="tottime")
+        parser.add_argument("--limit", type=int, default=30)
+
+    def handle(self, *args, **options):
+        directory = Path(options["directory"])
+        views = options["view"] or sorted(
+            path.name for path in directory.glob("*") if path.is_dir()
+        )
+        profiles = {view: sorted((directory / view).glob("*.prof")) for view in views}
+        files = [path for paths in profiles.values() for path in paths]
+        if not files:
+            raise CommandError(f"No profiles found in {directory}")
+
+        for view, paths in profiles.items():
+            self.stdout.write(f"{view}: {len(paths)} profiles")
+        stats = pstats.Stats(*map(str, files), stream=self.stdout)
+        stats.sort_stats(options["sort"]).print_stats(options["limit"])
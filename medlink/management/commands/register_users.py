@@ -0,0 +1,89 @@
+import time
+from itertools import islice
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from medlink.bulk import create_users, hash_accounts, read_records
+from medlink.serializers import UserRegistrationSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Register users from a CSV or JSONL file with email, password and role "
+        "columns. Passwords are hashed in a process pool of "
+        "PASSWORD_HASHING_WORKERS processes and users are inserted in bulk, one "
+        "transaction per chunk."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path)
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="File format, guessed from the file extension by default.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--serial",
+            action="store_true",
+            help="Hash passwords in this process instead of the process pool.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not path.exists():
+            raise CommandError(f"File {path} does not exist")
+        file_format = options["format"] or (
+            "jsonl" if path.suffix in (".jsonl", ".ndjson") else "csv"
+        )
+
+        created = skipped = invalid = 0
+        started = time.monotonic()
+        with path.open(newline="", encoding="utf-8") as handle:
+            records = read_records(handle, file_format)
+            while chunk := list(islice(records, options["chunk_size"])):
+                accounts = {}
+                valid = 0
+                for record in chunk:
+                    serializer = UserRegistrationSerializer(data=record)
+                    if not serializer.is_valid():
+                        invalid += 1
+                        continue
+                    valid += 1
+                    data = serializer.validated_data
+                    accounts.setdefault(
+                        data["email"], (data["email"], data["password"], data["role"])
+                    )
+                existing = set(
+                    get_user_model()
+                    .objects.filter(username__in=accounts)
+                    .values_list("username", flat=True)
+                )
+                new_accounts = [
+                    account
+                    for email, account in accounts.items()
+                    if email not in existing
+                ]
+                skipped += valid - len(new_accounts)
+                if new_accounts:
+                    new_accounts = hash_accounts(
+                        new_accounts, parallel=not options["serial"]
+                    )
+                    with transaction.atomic():
+                        create_users(new_accounts)
+                created += len(new_accounts)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"{created} created, {skipped} skipped, {invalid} invalid "
+                    f"({created / elapsed:.1f} users/s)"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Registered {created} users in {time.monotonic() - started:.1f}s"
+            )
+        )
@@ -0,0 +1,60 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from medlink.routers import REPLICA_DATABASE
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database to the read replica with the online "
+        "backup API, once or every --interval seconds. Readers of the replica "
+        "see the previous copy until a copy completes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=0,
+            help="Seconds between copies; copy once if 0.",
+        )
+        parser.add_argument(
+            "--pages",
+            type=int,
+            default=-1,
+            help="Pages copied per step, letting writers in between steps "
+            "(default: all at once).",
+        )
+
+    def handle(self, *args, **options):
+        if REPLICA_DATABASE not in connections:
+            raise CommandError(
+                "No replica database is configured, set DATABASE_REPLICA_NAME."
+            )
+        primary = connections[DEFAULT_DB_ALIAS]
+        replica = connections[REPLICA_DATABASE]
+        while True:
+            primary.ensure_connection()
+            replica.ensure_connection()
+            started = time.perf_counter()
+            generation = self.generation(replica)
+            primary.connection.backup(replica.connection, pages=options["pages"])
+            # The copy overwrote the number of the previous one. The API keys
+            # the responses it caches from the replica by this number.
+            with replica.cursor() as cursor:
+                cursor.execute(f"PRAGMA user_version = {(generation + 1) % 2**31}")
+            self.stdout.write(
+                f"Copied {primary.settings_dict['NAME']} to "
+                f"{replica.settings_dict['NAME']} in "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms"
+            )
+            if not options["interval"]:
+                return
+            time.sleep(options["interval"])
+
+    def generation(self, replica):
+        with replica.cursor() as cursor:
+            cursor.execute("PRAGMA user_version")
+            return cursor.fetchone()[0]
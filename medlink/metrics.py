@@ -0,0 +1,314 @@
+import json
+import math
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+
+# A values file starts with the number of bytes in use, followed by entries of
+# a key length, the UTF-8 key padded to 8 bytes, and a float value.
+USED = struct.Struct("<Q")
+KEY_LENGTH = struct.Struct("<I")
+VALUE = struct.Struct("<d")
+INITIAL_SIZE = 64 * 1024
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def value_offsets(data):
+    """
+    Yield the key and value offset of the entries of the bytes of a values
+    file.
+    """
+    used = USED.unpack_from(data, 0)[0] if len(data) >= USED.size else 0
+    offset = USED.size
+    while offset < used:
+        length = KEY_LENGTH.unpack_from(data, offset)[0]
+        key_end = offset + KEY_LENGTH.size + length
+        value_offset = key_end + (-key_end % 8)
+        yield data[offset + KEY_LENGTH.size : key_end].decode(), value_offset
+        offset = value_offset + VALUE.size
+
+
+def read_values(data):
+    """
+    Yield the ``(key, value)`` entries of the bytes of a values file.
+    """
+    for key, offset in value_offsets(data):
+        yield key, VALUE.unpack_from(data, offset)[0]
+
+
+class Values:
+    """
+    Metric values of the current process, in a memory map of the file
+    ``<pid>.db`` of ``directory`` or, without a directory, of anonymous memory.
+
+    Threads update values under a lock, as adding to a value reads and writes
+    it. The lock is held for one struct update and is rarely contended.
+    Per-thread slots would avoid it, but their number would grow with every
+    thread a server starts. An entry is written before the count of bytes in
+    use is increased, so readers of the file never see a partial entry. A file left by an earlier process with the same pid is reused, so
+    that its counts are kept.
+    """
+
+    def __init__(self, directory=""):
+        self.directory = directory
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.offsets = {}
+        self.size = INITIAL_SIZE
+        self.file = None
+        if directory:
+            Path(directory).mkdir(parents=True, exist_ok=True)
+            path = Path(directory) / f"{self.pid}.db"
+            self.file = open(os.open(path, os.O_RDWR | os.O_CREAT), "r+b")
+            existing = os.fstat(self.file.fileno()).st_size
+            while self.size < existing:
+                self.size *= 2
+            self.file.truncate(self.size)
+            self.map = mmap.mmap(self.file.fileno(), self.size)
+            self.offsets = dict(value_offsets(self.map))
+        else:
+            self.map = mmap.mmap(-1, self.size)
+        self.used = max(USED.size, USED.unpack_from(self.map, 0)[0])
+        USED.pack_into(self.map, 0, self.used)
+
+    def add(self, key, amount):
+        with self.lock:
+            offset = self.offsets.get(key)
+            if offset is None:
+                offset = self.allocate(key)
+            VALUE.pack_into(
+                self.map, offset, VALUE.unpack_from(self.map, offset)[0] + amount
+            )
+
+    def allocate(self, key):
+        encoded = key.encode()
+        key_end = self.used + KEY_LENGTH.size + len(encoded)
+        offset = key_end + (-key_end % 8)
+        if offset + VALUE.size > self.size:
+            self.grow(offset + VALUE.size)
+        KEY_LENGTH.pack_into(self.map, self.used, len(encoded))
+        self.map[self.used + KEY_LENGTH.size : key_end] = encoded
+        VALUE.pack_into(self.map, offset, 0.0)
+        self.used = offset + VALUE.size
+        USED.pack_into(self.map, 0, self.used)
+        self.offsets[key] = offset
+        return offset
+
+    def grow(self, needed):
+        while self.size < needed:
+            self.size *= 2
+        if self.file is not None:
+            self.file.truncate(self.size)
+            new_map = mmap.mmap(self.file.fileno(), self.size)
+        else:
+            new_map = mmap.mmap(-1, self.size)
+            new_map[: self.used] = self.map[: self.used]
+        self.map.close()
+        self.map = new_map
+
+    def items(self):
+        with self.lock:
+            return list(read_values(self.map[: self.used]))
+
+    def close(self):
+        with self.lock:
+            self.map.close()
+            if self.file is not None:
+                self.file.close()
+
+
+class Registry:
+    """
+    Counters and histograms of the process, written to one ``Values`` shared
+    by its threads.
+
+    With ``METRICS_DIRECTORY`` set, each process writes its values to its own
+    file there, and ``collect`` sums the files of all the processes sharing
+    the directory, such as the workers of one gunicorn server. The directory
+    must be emptied when the server starts. Otherwise values are kept in
+    memory and only the current process is collected.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.values = None
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def is_current(self, values):
+        # A forked worker must not write to the values of its parent, nor the
+        # process to a directory that is no longer configured.
+        return (
+            values is not None
+            and values.pid == os.getpid()
+            and values.directory == settings.METRICS_DIRECTORY
+        )
+
+    def process_values(self):
+        values = self.values
+        if not self.is_current(values):
+            with self.lock:
+                values = self.values
+                if not self.is_current(values):
+                    if values is not None and values.pid == os.getpid():
+                        values.close()
+                    values = self.values = Values(settings.METRICS_DIRECTORY)
+        return values
+
+    def add(self, key, amount):
+        self.process_values().add(key, amount)
+
+    def collect(self):
+        """
+        Return the sum of every value, keyed by ``(name, labels)``.
+        """
+        totals = defaultdict(float)
+        directory = settings.METRICS_DIRECTORY
+        if directory:
+            entries = (
+                read_values(path.read_bytes()) for path in Path(directory).glob("*.db")
+            )
+        else:
+            entries = [self.process_values().items()]
+        for items in entries:
+            for key, value in items:
+                name, labels = json.loads(key)
+                totals[name, tuple(map(tuple, labels))] += value
+        return totals
+
+    def render(self):
+        """
+        Return every metric in the Prometheus text exposition format.
+        """
+        totals = self.collect()
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render(totals))
+        return "\n".join(lines) + "\n"
+
+
+def series_key(name, labels):
+    return json.dumps([name, sorted(labels.items())], separators=(",", ":"))
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n"))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value):
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, registry, name, documentation):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        registry.register(self)
+
+    def inc(self, amount=1, **labels):
+        self.registry.add(series_key(self.name, labels), amount)
+
+    def render(self, totals):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for (name, labels), value in sorted(totals.items()):
+            if name == self.name:
+                yield f"{name}{format_labels(labels)} {format_value(value)}"
+
+
+class Histogram:
+    """
+    Histogram with fixed bucket upper bounds. Each observation is counted in
+    the one bucket it falls in; the counts are made cumulative when rendered.
+    """
+
+    def __init__(self, registry, name, documentation, buckets):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets) + (math.inf,)
+        registry.register(self)
+
+    def observe(self, value, **labels):
+        bucket = self.buckets[bisect_left(self.buckets, value)]
+        add = self.registry.add
+        add(series_key(f"{self.name}_bucket", {**labels, "le": bucket}), 1)
+        add(series_key(f"{self.name}_sum", labels), value)
+        add(series_key(f"{self.name}_count", labels), 1)
+
+    def render(self, totals):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        series = defaultdict(dict)
+        for (name, labels), value in totals.items():
+            if name == f"{self.name}_bucket":
+                labels = dict(labels)
+                bucket = labels.pop("le")
+                series[tuple(sorted(labels.items()))][bucket] = value
+        for labels, counts in sorted(series.items()):
+            cumulative = 0
+            for bucket in self.buckets:
+                cumulative += counts.get(bucket, 0)
+                bucket_labels = (*labels, ("le", format_value(bucket)))
+                yield (
+                    f"{self.name}_bucket{format_labels(bucket_labels)} "
+                    f"{format_value(cumulative)}"
+                )
+            for suffix in ("sum", "count"):
+                value = totals.get((f"{self.name}_{suffix}", labels), 0)
+                yield f"{self.name}_{suffix}{format_labels(labels)} {format_value(value)}"
+
+
+registry = Registry()
+
+requests_total = Counter(
+    registry, "medlink_requests_total", "Requests served, by view, method and status."
+)
+request_errors_total = Counter(
+    registry,
+    "medlink_request_errors_total",
+    "Requests answered with a 5xx status, by view.",
+)
+request_duration_seconds = Histogram(
+    registry,
+    "medlink_request_duration_seconds",
+    "Time to build the response, by view.",
+    REQUEST_DURATION_BUCKETS,
+)
+request_queries = Histogram(
+    registry,
+    "medlink_request_queries",
+    "Database queries made per request, by view.",
+    QUERY_COUNT_BUCKETS,
+)
+cache_requests_total = Counter(
+    registry,
+    "medlink_cache_requests_total",
+    "Cache lookups, by cache and result (hit or miss).",
+)
+
+
+def record_cache_lookup(cache, hit):
+    cache_requests_total.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,431 @@
+import cProfile
+import hmac
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+
+logger = logging.getLogger("medlink.requests")
+slow_query_logger = logging.getLogger("medlink.queries")
+
+# Window bits of the zlib compressors of each supported content coding, in
+# order of preference.
+CONTENT_CODINGS = {
+    "gzip": 16 + zlib.MAX_WBITS,
+    "deflate": zlib.MAX_WBITS,
+}
+# Uncompressed bytes of a streaming response after which the compressed data
+# is flushed to the client.
+STREAM_FLUSH_SIZE = 64 * 1024
+
+# Timing of the request being served, propagated by asgiref to the threads
+# running its sync code and queries.
+current_timing = ContextVar("current_timing", default=None)
+
+
+class RequestTiming:
+    """
+    Time spent by one request: in total, in the database, in serializers and
+    rendering the response, with the number of queries made.
+    """
+
+    def __init__(self, request):
+        self.started = time.perf_counter()
+        self.request = request
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        self.total = 0.0
+
+    @property
+    def view_class(self):
+        match = self.request.resolver_match
+        if match is None:
+            return None
+        return getattr(match.func, "view_class", match.func)
+
+    @property
+    def view(self):
+        view_class = self.view_class
+        return None if view_class is None else view_class.__name__
+
+    def time_query(self, execute, sql, params, many, context):
+        """
+        Time a query and log it, without its parameters, which hold patient
+        data, when it is slower than the view's threshold.
+        """
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.queries += 1
+            self.db += elapsed
+            threshold = getattr(
+                self.view_class,
+                "slow_query_threshold_ms",
+                settings.SLOW_QUERY_THRESHOLD_MS,
+            )
+            if threshold is not None and elapsed * 1000 >= threshold:
+                slow_query_logger.warning(
+                    "Slow query in %s on %s (%.1fms): %s",
+                    self.view,
+                    context["connection"].alias,
+                    elapsed * 1000,
+                    sql,
+                )
+
+    def server_timing(self):
+        """
+        Return the ``Server-Timing`` header value; "app" is the time spent
+        outside the database, serializers and rendering, in authentication,
+        permission checks and view code.
+        """
+        app = max(0.0, self.total - self.db - self.serialize - self.render)
+        return ", ".join(
+            [
+                f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"',
+                f"serialize;dur={self.serialize * 1000:.2f}",
+                f"render;dur={self.render * 1000:.2f}",
+                f"app;dur={app * 1000:.2f}",
+                f"total;dur={self.total * 1000:.2f}",
+            ]
+        )
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    Execute wrapper of every database connection, timing the queries of the
+    request being served, if any.
+
+    It is installed once per connection rather than around each request, as
+    the queries of async views run in other threads, with their own
+    connections, which see the request through ``current_timing``.
+    """
+    timing = current_timing.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    return timing.time_query(execute, sql, params, many, context)
+
+
+@contextmanager
+def serializing():
+    """
+    Count the time spent in the block, less the queries it makes, as
+    serializer time of the request being served, if any.
+    """
+    timing = current_timing.get()
+    if timing is None:
+        yield
+        return
+    started = time.perf_counter()
+    db = timing.db
+    try:
+        yield
+    finally:
+        timing.serialize += time.perf_counter() - started - (timing.db - db)
+
+
+def install_query_timer(connection):
+    if time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(time_query)
+
+
+class RequestTimingMiddleware:
+    """
+    Measure the wall time, database time and query count, serializer time and
+    response rendering time of every request. Views count their serializer
+    calls with ``serializing()``.
+
+    They are sent back in a ``Server-Timing`` header, logged as one JSON line
+    at DEBUG level to the "medlink.requests" logger and counted in
+    ``medlink.metrics``.
+    Queries slower than ``SLOW_QUERY_THRESHOLD_MS``, or the
+    ``slow_query_threshold_ms`` attribute of the view class, are logged with
+    their SQL to "medlink.queries"; a view sets it to ``None`` to log none of
+    its queries. The middleware runs natively in both sync and async chains.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        for alias in connections:
+            install_query_timer(connections[alias])
+        timing = RequestTiming(request)
+        token = current_timing.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.finish(request, timing, response)
+
+    async def __acall__(self, request):
+        # Connections of other threads got the wrapper when they were opened.
+        timing = RequestTiming(request)
+        token = current_timing.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_timing.reset(token)
+        return self.finish(request, timing, response)
+
+    def finish(self, request, timing, response):
+        timing.total = time.perf_counter() - timing.started
+        response["Server-Timing"] = timing.server_timing()
+        view = timing.view or "unresolved"
+        metrics.requests_total.inc(
+            view=view, method=request.method, status=response.status_code
+        )
+        if response.status_code >= 500:
+            metrics.request_errors_total.inc(view=view)
+        metrics.request_duration_seconds.observe(timing.total, view=view)
+        metrics.request_queries.observe(timing.queries, view=view)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                json.dumps(
+                    {
+                        "method": request.method,
+                        "path": request.path,
+                        "view": timing.view,
+                        "status": response.status_code,
+                        "total_ms": round(timing.total * 1000, 2),
+                        "db_ms": round(timing.db * 1000, 2),
+                        "queries": timing.queries,
+                        "serialize_ms": round(timing.serialize * 1000, 2),
+                        "render_ms": round(timing.render * 1000, 2),
+                    }
+                )
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered right after this hook returns. Only the
+        # sync views return them, so the hook costs async views nothing.
+        timing = current_timing.get()
+        started = time.perf_counter()
+
+        def rendered(response):
+            timing.render += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profile one request in ``PROFILING_SAMPLE_RATE`` with cProfile, and every
+    request whose ``X-Profile`` header is ``PROFILING_TOKEN``.
+
+    Each profile is written to ``PROFILING_DIRECTORY/<view name>/`` as a
+    ``.prof`` file for pstats, snakeviz or gprof2dot, and its name is returned
+    in an ``X-Profile-Id`` header.
+    The oldest profiles of a view are deleted beyond ``PROFILING_MAX_FILES``.
+    One request is profiled at a time in each process; requests arriving in
+    the meantime are not. The middleware is left out when neither setting is
+    given.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_SAMPLE_RATE and not settings.PROFILING_TOKEN:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.requests = itertools.count()
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        if not self.should_profile(request) or not self.lock.acquire(blocking=False):
+            return self.get_response(request)
+        try:
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+            response["X-Profile-Id"] = self.save(request, profiler)
+        finally:
+            self.lock.release()
+        return response
+
+    def should_profile(self, request):
+        token = request.headers.get("X-Profile")
+        if token and settings.PROFILING_TOKEN:
+            return hmac.compare_digest(token, settings.PROFILING_TOKEN)
+        rate = settings.PROFILING_SAMPLE_RATE
+        return bool(rate) and next(self.requests) % rate == 0
+
+    def save(self, request, profiler):
+        """
+        Write the profile of ``request`` and rotate the profiles of its view.
+        Return the name of the written file, without extension.
+        """
+        match = request.resolver_match
+        view = "unresolved"
+        if match is not None:
+            view = getattr(match.func, "view_class", match.func).__name__
+        directory = Path(settings.PROFILING_DIRECTORY) / view
+        directory.mkdir(parents=True, exist_ok=True)
+        name = f"{time.time_ns()}-{os.getpid()}"
+        profiler.dump_stats(directory / f"{name}.prof")
+
+        # Names start with the time, so they sort oldest first.
+        profiles = sorted(directory.glob("*.prof"))
+        for path in profiles[: max(0, len(profiles) - settings.PROFILING_MAX_FILES)]:
+            path.unlink(missing_ok=True)
+        return f"{view}/{name}"
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Return the coding of ``CONTENT_CODINGS`` preferred by an
+    ``Accept-Encoding`` header, or None when it accepts none of them.
+    """
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.strip().lower()] = quality
+    default = qualities.get("*", 0.0)
+    # max() keeps the first of equally preferred codings.
+    coding = max(CONTENT_CODINGS, key=lambda coding: qualities.get(coding, default))
+    return coding if qualities.get(coding, default) > 0 else None
+
+
+def compressor(coding):
+    return zlib.compressobj(
+        settings.COMPRESSION_LEVEL, zlib.DEFLATED, CONTENT_CODINGS[coding]
+    )
+
+
+def compress_chunks(chunks, coding):
+    """
+    Compress an iterable of bytes, yielding compressed data at least every
+    ``STREAM_FLUSH_SIZE`` uncompressed bytes.
+    """
+    stream = compressor(coding)
+    pending = 0
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_SIZE:
+            data += stream.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield stream.flush()
+
+
+async def acompress_chunks(chunks, coding):
+    stream = compressor(coding)
+    pending = 0
+    async for chunk in chunks:
+        data = stream.compress(chunk)
+        pending += len(chunk)
+        if pending >= STREAM_FLUSH_SIZE:
+            data += stream.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if data:
+            yield data
+    yield stream.flush()
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with gzip or deflate, as negotiated with the
+    ``Accept-Encoding`` header of the request, at ``COMPRESSION_LEVEL``.
+
+    Bodies shorter than ``COMPRESSION_MIN_SIZE`` bytes, responses that already
+    have a ``Content-Encoding`` and those marked ``no-transform`` are sent as
+    they are. Streaming responses, such as the exports, are compressed chunk by
+    chunk without buffering the body. Strong ``ETag`` headers are weakened, as
+    the compressed body is a different sequence of bytes; ``etag_matches``
+    compares them weakly. The middleware runs natively in both sync and async
+    chains.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if response.has_header("Content-Encoding") or "no-transform" in response.get(
+            "Cache-Control", ""
+        ):
+            return response
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+
+        patch_vary_headers(response, ["Accept-Encoding"])
+        coding = negotiate_encoding(request.headers.get("Accept-Encoding", ""))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = acompress_chunks(
+                    response.streaming_content, coding
+                )
+            else:
+                response.streaming_content = compress_chunks(
+                    response.streaming_content, coding
+                )
+            del response["Content-Length"]
+        else:
+            stream = compressor(coding)
+            content = stream.compress(response.content) + stream.flush()
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response["Content-Length"] = str(len(content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = f"W/{etag}"
+        response["Content-Encoding"] = coding
+        return response
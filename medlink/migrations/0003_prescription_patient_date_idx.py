@@ -0,0 +1,22 @@
+# Generated by Django 5.1.4 on 2026-10-17 03:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medlink", "0002_alter_patient_medical_history"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="prescription",
+            index=models.Index(
+                fields=["patient", "date_prescribed"],
+                name="prescription_patient_date_idx",
+            ),
+        ),
+    ]
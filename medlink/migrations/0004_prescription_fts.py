@@ -0,0 +1,65 @@
+from django.db import migrations
+
+# Full-text index over the medication and instructions of prescriptions, kept
+# in sync by triggers so that bulk_create() and raw SQL writes are indexed too.
+# FTS5 is SQLite specific; other databases fall back to LIKE searches.
+CREATE_FTS = [
+    """
+    CREATE VIRTUAL TABLE medlink_prescription_fts USING fts5(
+        medication, instructions, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO medlink_prescription_fts (rowid, medication, instructions)
+    SELECT id, medication, instructions FROM medlink_prescription
+    """,
+    """
+    CREATE TRIGGER medlink_prescription_fts_insert
+    AFTER INSERT ON medlink_prescription BEGIN
+        INSERT INTO medlink_prescription_fts (rowid, medication, instructions)
+        VALUES (new.id, new.medication, new.instructions);
+    END
+    """,
+    """
+    CREATE TRIGGER medlink_prescription_fts_update
+    AFTER UPDATE OF medication, instructions ON medlink_prescription BEGIN
+        UPDATE medlink_prescription_fts
+        SET medication = new.medication, instructions = new.instructions
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER medlink_prescription_fts_delete
+    AFTER DELETE ON medlink_prescription BEGIN
+        DELETE FROM medlink_prescription_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+DROP_FTS = [
+    "DROP TRIGGER IF EXISTS medlink_prescription_fts_insert",
+    "DROP TRIGGER IF EXISTS medlink_prescription_fts_update",
+    "DROP TRIGGER IF EXISTS medlink_prescription_fts_delete",
+    "DROP TABLE IF EXISTS medlink_prescription_fts",
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medlink", "0003_prescription_patient_date_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(run_statements(CREATE_FTS), run_statements(DROP_FTS)),
+    ]
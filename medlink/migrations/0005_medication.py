@@ -0,0 +1,220 @@
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+BATCH_SIZE = 1000
+
+# Rebuilding medlink_prescription to swap the medication column drops the
+# triggers of 0004_prescription_fts. They are recreated afterwards reading the
+# name from medlink_medication.
+DROP_TRIGGERS = [
+    "DROP TRIGGER IF EXISTS medlink_prescription_fts_insert",
+    "DROP TRIGGER IF EXISTS medlink_prescription_fts_update",
+    "DROP TRIGGER IF EXISTS medlink_prescription_fts_delete",
+]
+
+CREATE_TEXT_TRIGGERS = [
+    """
+    CREATE TRIGGER medlink_prescription_fts_insert
+    AFTER INSERT ON medlink_prescription BEGIN
+        INSERT INTO medlink_prescription_fts (rowid, medication, instructions)
+        VALUES (new.id, new.medication, new.instructions);
+    END
+    """,
+    """
+    CREATE TRIGGER medlink_prescription_fts_update
+    AFTER UPDATE OF medication, instructions ON medlink_prescription BEGIN
+        UPDATE medlink_prescription_fts
+        SET medication = new.medication, instructions = new.instructions
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER medlink_prescription_fts_delete
+    AFTER DELETE ON medlink_prescription BEGIN
+        DELETE FROM medlink_prescription_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+CREATE_MEDICATION_TRIGGERS = [
+    "DELETE FROM medlink_prescription_fts",
+    """
+    INSERT INTO medlink_prescription_fts (rowid, medication, instructions)
+    SELECT p.id, m.name, p.instructions
+    FROM medlink_prescription p JOIN medlink_medication m ON m.id = p.medication_id
+    """,
+    """
+    CREATE TRIGGER medlink_prescription_fts_insert
+    AFTER INSERT ON medlink_prescription BEGIN
+        INSERT INTO medlink_prescription_fts (rowid, medication, instructions)
+        VALUES (
+            new.id,
+            (SELECT name FROM medlink_medication WHERE id = new.medication_id),
+            new.instructions
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER medlink_prescription_fts_update
+    AFTER UPDATE OF medication_id, instructions ON medlink_prescription BEGIN
+        UPDATE medlink_prescription_fts
+        SET medication = (
+                SELECT name FROM medlink_medication WHERE id = new.medication_id
+            ),
+            instructions = new.instructions
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER medlink_prescription_fts_delete
+    AFTER DELETE ON medlink_prescription BEGIN
+        DELETE FROM medlink_prescription_fts WHERE rowid = old.id;
+    END
+    """,
+]
+
+
+def run_statements(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+def normalize(name):
+    return " ".join(name.split()).casefold()
+
+
+def intern_medications(apps, schema_editor):
+    """
+    Create one medication per normalized name and point the prescriptions at
+    it, going through the distinct spellings ``BATCH_SIZE`` at a time. A
+    medication is named after its most used spelling within the batch.
+    """
+    Medication = apps.get_model("medlink", "Medication")
+    Prescription = apps.get_model("medlink", "Prescription")
+    spellings = (
+        Prescription.objects.values_list("medication")
+        .annotate(count=Count("id"))
+        .order_by("medication")
+    )
+    last = None
+    while True:
+        batch = list(
+            spellings[:BATCH_SIZE]
+            if last is None
+            else spellings.filter(medication__gt=last)[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        last = batch[-1][0]
+
+        names = defaultdict(list)
+        for spelling, count in sorted(batch, key=lambda row: -row[1]):
+            names[normalize(spelling)].append(spelling)
+        existing = Medication.objects.in_bulk(list(names), field_name="normalized_name")
+        Medication.objects.bulk_create(
+            Medication(name=" ".join(variants[0].split()), normalized_name=key)
+            for key, variants in names.items()
+            if key not in existing
+        )
+        medications = Medication.objects.in_bulk(
+            list(names), field_name="normalized_name"
+        )
+        for key, variants in names.items():
+            Prescription.objects.filter(medication__in=variants).update(
+                medication_ref=medications[key]
+            )
+
+
+def restore_medication_names(apps, schema_editor):
+    Medication = apps.get_model("medlink", "Medication")
+    Prescription = apps.get_model("medlink", "Prescription")
+    for medication in Medication.objects.iterator(chunk_size=BATCH_SIZE):
+        Prescription.objects.filter(medication_ref=medication).update(
+            medication=medication.name
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medlink", "0004_prescription_fts"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements(DROP_TRIGGERS), run_statements(CREATE_TEXT_TRIGGERS)
+        ),
+        migrations.CreateModel(
+            name="Medication",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=255)),
+                ("normalized_name", models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name="prescription",
+            name="medication_ref",
+            field=models.ForeignKey(
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                to="medlink.medication",
+            ),
+        ),
+        # Nullable while it is copied, so migrating backwards can add it back
+        # before restoring its values.
+        migrations.AlterField(
+            model_name="prescription",
+            name="medication",
+            field=models.CharField(max_length=255, null=True),
+        ),
+        # Temporary index, so each medication's prescriptions are updated
+        # without scanning the table.
+        migrations.AddIndex(
+            model_name="prescription",
+            index=models.Index(
+                fields=["medication"], name="prescription_medication_tmp"
+            ),
+        ),
+        migrations.RunPython(intern_medications, restore_medication_names),
+        migrations.RemoveIndex(
+            model_name="prescription",
+            name="prescription_medication_tmp",
+        ),
+        migrations.RemoveField(
+            model_name="prescription",
+            name="medication",
+        ),
+        migrations.RenameField(
+            model_name="prescription",
+            old_name="medication_ref",
+            new_name="medication",
+        ),
+        migrations.AlterField(
+            model_name="prescription",
+            name="medication",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT,
+                to="medlink.medication",
+            ),
+        ),
+        migrations.RunPython(
+            run_statements(CREATE_MEDICATION_TRIGGERS), run_statements(DROP_TRIGGERS)
+        ),
+    ]
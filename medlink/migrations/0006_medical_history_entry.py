@@ -0,0 +1,105 @@
+# Generated by Django 5.1.4 on 2026-10-17 04:51
+
+import itertools
+from operator import itemgetter
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 1000
+# MEDICAL_HISTORY_CHUNK_SIZE when the entries were introduced.
+CHUNK_SIZE = 4000
+
+
+def split_medical_history(apps, schema_editor):
+    """
+    Move each patient's medical history to entries of at most ``CHUNK_SIZE``
+    characters, created now as the time it was written is unknown.
+    """
+    Patient = apps.get_model("medlink", "Patient")
+    MedicalHistoryEntry = apps.get_model("medlink", "MedicalHistoryEntry")
+    db_alias = schema_editor.connection.alias
+    created = timezone.now()
+    histories = (
+        Patient.objects.using(db_alias)
+        .exclude(medical_history=None)
+        .exclude(medical_history="")
+        .values_list("id", "medical_history")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    entries = (
+        MedicalHistoryEntry(
+            patient_id=patient_id,
+            text=history[start : start + CHUNK_SIZE],
+            created=created,
+        )
+        for patient_id, history in histories
+        for start in range(0, len(history), CHUNK_SIZE)
+    )
+    while batch := list(itertools.islice(entries, BATCH_SIZE)):
+        MedicalHistoryEntry.objects.using(db_alias).bulk_create(batch)
+
+
+def join_medical_history(apps, schema_editor):
+    Patient = apps.get_model("medlink", "Patient")
+    MedicalHistoryEntry = apps.get_model("medlink", "MedicalHistoryEntry")
+    db_alias = schema_editor.connection.alias
+    entries = (
+        MedicalHistoryEntry.objects.using(db_alias)
+        .order_by("patient_id", "created", "id")
+        .values_list("patient_id", "text")
+        .iterator(chunk_size=BATCH_SIZE)
+    )
+    for patient_id, chunks in itertools.groupby(entries, key=itemgetter(0)):
+        Patient.objects.using(db_alias).filter(id=patient_id).update(
+            medical_history="".join(text for _, text in chunks)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("medlink", "0005_medication"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MedicalHistoryEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("text", models.TextField()),
+                ("created", models.DateTimeField(default=django.utils.timezone.now)),
+                (
+                    "patient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="history_entries",
+                        to="medlink.patient",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["patient", "created"],
+                        name="history_patient_created_idx",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(split_medical_history, join_medical_history),
+        migrations.RemoveField(
+            model_name="patient",
+            name="medical_history",
+        ),
+    ]
@@ -0,0 +1,98 @@
+from collections import defaultdict
+from importlib import import_module
+
+from django.db import migrations
+from django.db.models import Count
+
+medication = import_module("medlink.migrations.0005_medication")
+
+BATCH_SIZE = medication.BATCH_SIZE
+normalize = medication.normalize
+
+
+def intern_medications(apps, schema_editor):
+    """
+    ``intern_medications`` of 0005_medication, reading and writing the
+    database being migrated rather than the one picked by the routers.
+    """
+    Medication = apps.get_model("medlink", "Medication")
+    Prescription = apps.get_model("medlink", "Prescription")
+    db_alias = schema_editor.connection.alias
+    spellings = (
+        Prescription.objects.using(db_alias)
+        .values_list("medication")
+        .annotate(count=Count("id"))
+        .order_by("medication")
+    )
+    last = None
+    while True:
+        batch = list(
+            spellings[:BATCH_SIZE]
+            if last is None
+            else spellings.filter(medication__gt=last)[:BATCH_SIZE]
+        )
+        if not batch:
+            return
+        last = batch[-1][0]
+
+        names = defaultdict(list)
+        for spelling, count in sorted(batch, key=lambda row: -row[1]):
+            names[normalize(spelling)].append(spelling)
+        existing = Medication.objects.using(db_alias).in_bulk(
+            list(names), field_name="normalized_name"
+        )
+        Medication.objects.using(db_alias).bulk_create(
+            Medication(name=" ".join(variants[0].split()), normalized_name=key)
+            for key, variants in names.items()
+            if key not in existing
+        )
+        medications = Medication.objects.using(db_alias).in_bulk(
+            list(names), field_name="normalized_name"
+        )
+        for key, variants in names.items():
+            Prescription.objects.using(db_alias).filter(medication__in=variants).update(
+                medication_ref=medications[key]
+            )
+
+
+def restore_medication_names(apps, schema_editor):
+    Medication = apps.get_model("medlink", "Medication")
+    Prescription = apps.get_model("medlink", "Prescription")
+    db_alias = schema_editor.connection.alias
+    for medication in Medication.objects.using(db_alias).iterator(
+        chunk_size=BATCH_SIZE
+    ):
+        Prescription.objects.using(db_alias).filter(medication_ref=medication).update(
+            medication=medication.name
+        )
+
+
+def replace_data_migration(operation):
+    if (
+        isinstance(operation, migrations.RunPython)
+        and operation.code is medication.intern_medications
+    ):
+        return migrations.RunPython(intern_medications, restore_medication_names)
+    return operation
+
+
+class Migration(migrations.Migration):
+    """
+    0005_medication with its data migration made to use the database being
+    migrated.
+
+    It replaces 0005_medication rather than editing it, so that databases which
+    already applied 0005 count this migration as applied and are left as they
+    are, while the others run this one in its place.
+    """
+
+    replaces = [("medlink", "0005_medication")]
+
+    dependencies = [
+        ("medlink", "0004_prescription_fts"),
+    ]
+
+    operations = [
+        replace_data_migration(operation)
+        for operation in medication.Migration.operations
+    ]
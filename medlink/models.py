@@ -1,5 +1,9 @@
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
+
+# Medical history is stored in entries of at most this many characters.
+MEDICAL_HISTORY_CHUNK_SIZE = 4000
 
 
 class Role(models.Model):
@@ -16,13 +20,136 @@ class Role(models.Model):
     role = models.CharField(max_length=7, choices=ROLE_CHOICES, default="patient")
 
 
+class PatientManager(models.Manager):
+    def create(self, medical_history=None, **kwargs):
+        """
+        Create a patient, storing ``medical_history`` as its first history
+        entries.
+        """
+        with transaction.atomic(using=self.db):
+            patient = super().create(**kwargs)
+            if medical_history:
+                MedicalHistoryEntry.objects.append(patient, medical_history)
+        return patient
+
+
 class Patient(models.Model):
     """
     Model to store the patient information.
     """
 
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    medical_history = models.TextField(null=True)
+
+    objects = PatientManager()
+
+    @property
+    def medical_history(self):
+        """
+        The whole medical history, read from its entries when accessed, or
+        None when the patient has none.
+        """
+        chunks = self.history_entries.order_by("created", "id").values_list(
+            "text", flat=True
+        )
+        return "".join(chunks) or None
+
+
+def history_chunks(text):
+    """
+    Split ``text`` into the chunks of at most ``MEDICAL_HISTORY_CHUNK_SIZE``
+    characters it is stored in.
+    """
+    return [
+        text[start : start + MEDICAL_HISTORY_CHUNK_SIZE]
+        for start in range(0, len(text), MEDICAL_HISTORY_CHUNK_SIZE)
+    ]
+
+
+class MedicalHistoryEntryManager(models.Manager):
+    def append(self, patient, text):
+        """
+        Append ``text`` to the medical history of ``patient``, as one entry per
+        chunk, all created at the same time.
+        """
+        created = timezone.now()
+        return self.bulk_create(
+            MedicalHistoryEntry(patient=patient, text=chunk, created=created)
+            for chunk in history_chunks(text)
+        )
+
+
+class MedicalHistoryEntry(models.Model):
+    """
+    Model to store the medical history of a patient, in entries that are only
+    ever appended. Entries of the same ``created`` time are read in ``id``
+    order.
+    """
+
+    patient = models.ForeignKey(
+        Patient, on_delete=models.CASCADE, related_name="history_entries"
+    )
+    text = models.TextField()
+    created = models.DateTimeField(default=timezone.now)
+
+    objects = MedicalHistoryEntryManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["patient", "created"],
+                name="history_patient_created_idx",
+            ),
+        ]
+
+
+def normalize_medication(name):
+    """
+    Return the key a medication name is stored under: case-folded, with runs of
+    whitespace collapsed, so "Paracetamol" and " paracetamol" are one drug.
+    """
+    return " ".join(name.split()).casefold()
+
+
+class MedicationManager(models.Manager):
+    def intern(self, names):
+        """
+        Return a dict mapping each of ``names`` to its ``Medication``, creating
+        the missing ones. Takes at most three queries whatever the number of
+        names.
+        """
+        keys = {name: normalize_medication(name) for name in names}
+        medications = self.in_bulk(set(keys.values()), field_name="normalized_name")
+        missing = {}
+        for name, key in keys.items():
+            if key not in medications:
+                missing.setdefault(key, name)
+        if missing:
+            # Another request may create the same medications concurrently.
+            self.bulk_create(
+                [
+                    Medication(name=" ".join(name.split()), normalized_name=key)
+                    for key, name in missing.items()
+                ],
+                ignore_conflicts=True,
+            )
+            medications.update(
+                self.in_bulk(list(missing), field_name="normalized_name")
+            )
+        return {name: medications[key] for name, key in keys.items()}
+
+    def get_for_name(self, name):
+        return self.intern([name])[name]
+
+
+class Medication(models.Model):
+    """
+    Model to store each distinct medication once, referenced by prescriptions.
+    """
+
+    name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, unique=True)
+
+    objects = MedicationManager()
 
 
 class Prescription(models.Model):
@@ -32,7 +159,15 @@ class Prescription(models.Model):
 
     patient = models.ForeignKey(Patient, on_delete=models.CASCADE)
     doctor = models.ForeignKey(User, on_delete=models.CASCADE)
-    medication = models.CharField(max_length=255)
+    medication = models.ForeignKey(Medication, on_delete=models.PROTECT)
     dosage = models.CharField(max_length=255)
     instructions = models.TextField()
     date_prescribed = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["patient", "date_prescribed"],
+                name="prescription_patient_date_idx",
+            ),
+        ]
@@ -0,0 +1,102 @@
+from django.conf import settings
+
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+from rest_framework.request import Request
+
+
+class PatientCursorPagination(CursorPagination):
+    """
+    Keyset pagination over ``Patient.id``.
+
+    Every page is fetched with ``WHERE id > <cursor>`` on the primary key, so the
+    cost of a page does not grow with how deep the client has paged.
+    """
+
+    ordering = "id"
+    page_size = settings.PATIENT_LIST_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.PATIENT_LIST_MAX_PAGE_SIZE
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async counterpart of ``paginate_queryset`` for plain Django async views.
+
+        ``request`` is a Django ``HttpRequest``. The page is fetched with the
+        async ORM and the cursors are the same as those of the sync endpoint.
+        """
+        request = Request(request)
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, None)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        # The ordering is the ascending primary key, so a cursor position is
+        # a lower bound going forward and an upper bound going backward.
+        if current_position is not None:
+            if reverse:
+                queryset = queryset.filter(id__lt=current_position)
+            else:
+                queryset = queryset.filter(id__gt=current_position)
+
+        # One extra row tells whether a page follows this one.
+        results = [
+            patient async for patient in queryset[offset : offset + self.page_size + 1]
+        ]
+        self.page = results[: self.page_size]
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        return self.page
+
+    def get_paginated_data(self, data):
+        return {
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        }
+
+
+class MedicalHistoryCursorPagination(CursorPagination):
+    """
+    Pagination of a patient's medical history, oldest entries first, served by
+    the (patient, created) index.
+    """
+
+    ordering = ("created", "id")
+    page_size = settings.MEDICAL_HISTORY_PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = settings.MEDICAL_HISTORY_MAX_PAGE_SIZE
@@ -0,0 +1,18 @@
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+from . import columnar
+
+
+class ColumnarParser(BaseParser):
+    """
+    Parses request bodies in the compact binary format of ``medlink.columnar``.
+    """
+
+    media_type = columnar.MEDIA_TYPE
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return columnar.loads(stream.read())
+        except ValueError as exc:
+            raise ParseError(f"Columnar parse error - {exc}")
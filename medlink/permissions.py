@@ -0,0 +1,21 @@
+import hmac
+
+from django.conf import settings
+
+from rest_framework.permissions import BasePermission
+
+
+class HasMetricsToken(BasePermission):
+    """
+    Allow the requests sending ``METRICS_TOKEN`` as a bearer token, the way
+    Prometheus sends its ``authorization`` credentials. Without a token
+    configured, every request is denied.
+    """
+
+    message = "A valid metrics token is required."
+
+    def has_permission(self, request, view):
+        scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+        if scheme.lower() != "bearer" or not token or not settings.METRICS_TOKEN:
+            return False
+        return hmac.compare_digest(token, settings.METRICS_TOKEN)
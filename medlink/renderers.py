@@ -0,0 +1,93 @@
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils import encoders
+
+from . import columnar
+from .parsers import ColumnarParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    ``JSONRenderer`` encoding with orjson when ``ORJSON_RENDERING`` is on and
+    orjson is installed.
+
+    The output is then the same as ``JSONRenderer``'s with the default
+    settings, with compact separators, UTF-8 rather than ASCII escapes, U+2028
+    and U+2029 escaped, and datetimes, decimals and other non-JSON types
+    converted by DRF's encoder, except for floats. orjson writes ``1e16`` and
+    ``1.5e-7`` where ``json`` writes ``1e+16`` and ``1.5e-07``, and NaN and
+    infinite floats as null where DRF rejects them. Finding such floats would
+    mean walking the whole payload in Python, which takes as long as
+    ``JSONRenderer``, so the setting is off by default. Turn it on for APIs
+    whose clients parse the JSON rather than compare its bytes.
+
+    Indented output, ASCII-only settings and data orjson cannot encode, such
+    as non-string keys, always fall back to ``JSONRenderer``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or not settings.ORJSON_RENDERING
+            or data is None
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME,
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like JSONRenderer, escape the line and paragraph separators, which
+        # are valid in JSON strings but not in JavaScript ones.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+
+class ColumnarRenderer(BaseRenderer):
+    """
+    Renders data in the compact binary format of ``medlink.columnar``.
+    """
+
+    media_type = columnar.MEDIA_TYPE
+    format = "columnar"
+    charset = None
+    render_style = "binary"
+    encoder_class = encoders.JSONEncoder
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return columnar.dumps(data, default=self.encoder_class().default)
+
+
+class ColumnarNegotiationMixin:
+    """
+    View mixin accepting request bodies in the columnar format and rendering
+    responses in it when the ``Accept`` header asks for it, JSON remaining the
+    default. Responses vary on ``Accept``.
+    """
+
+    def get_renderers(self):
+        return [*super().get_renderers(), ColumnarRenderer()]
+
+    def get_parsers(self):
+        return [*super().get_parsers(), ColumnarParser()]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        patch_vary_headers(response, ["Accept"])
+        return response
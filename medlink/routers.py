@@ -0,0 +1,101 @@
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA_DATABASE = "replica"
+
+# Whether reads of the current request may go to the replica, and whether the
+# request has written to the primary since, after which its reads stay there.
+_replica_reads = ContextVar("replica_reads", default=False)
+_primary_pinned = ContextVar("primary_pinned", default=False)
+
+
+@contextmanager
+def replica_reads():
+    """
+    Send the reads made inside the block to the replica, until the first write.
+    """
+    reads = _replica_reads.set(True)
+    pinned = _primary_pinned.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(reads)
+        _primary_pinned.reset(pinned)
+
+
+def reading_replica():
+    """
+    Return whether the reads made now go to the replica.
+    """
+    return (
+        _replica_reads.get()
+        and not _primary_pinned.get()
+        and REPLICA_DATABASE in connections
+        and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+    )
+
+
+def replica_generation():
+    """
+    Return the number of the replica copy read by the current request, which
+    sync_replica stores in its ``user_version``, or None when reads go to the
+    primary.
+
+    Responses cached from replica reads are keyed by it, so that each copy
+    starts with fresh entries in every process, whatever the cache backend.
+    """
+    if not reading_replica():
+        return None
+    with connections[REPLICA_DATABASE].cursor() as cursor:
+        cursor.execute("PRAGMA user_version")
+        return cursor.fetchone()[0]
+
+
+class ReplicaReadMixin:
+    """
+    View mixin serving the reads of a request from the read replica.
+
+    Authentication, permission and throttling checks read the primary, so that
+    users registered, deactivated or given another role since the last
+    sync_replica are authorized by their current row. Only the handler and the
+    response finalization read the replica.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as self.replica_reads:
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.replica_reads.enter_context(replica_reads())
+
+
+class PrimaryReplicaRouter:
+    """
+    Route reads to the "replica" database inside ``replica_reads()`` and
+    everything else to the primary.
+
+    Reads stay on the primary once the request has written, and inside
+    transactions, so a request always sees its own writes. The replica is a
+    copy of the primary made by the sync_replica command, so it is never
+    migrated.
+    """
+
+    def db_for_read(self, model, **hints):
+        if reading_replica():
+            return REPLICA_DATABASE
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _primary_pinned.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_DATABASE:
+            return False
+        return None
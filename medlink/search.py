@@ -0,0 +1,61 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Prescription
+
+FTS_TABLE = "medlink_prescription_fts"
+
+# bm25() weights of the medication and instructions columns; a match on the
+# medication name ranks above one in the free-text instructions.
+MEDICATION_WEIGHT = 10.0
+INSTRUCTIONS_WEIGHT = 1.0
+
+
+def search_terms(query):
+    """
+    Split a user query into words, dropping FTS5 operators and punctuation.
+    """
+    return re.findall(r"\w+", query)
+
+
+def fts_query(terms):
+    """
+    Build an FTS5 MATCH expression requiring every term as a word prefix.
+    """
+    return " ".join(f'"{term}"*' for term in terms)
+
+
+def search_prescription_ids(terms, limit, offset=0):
+    """
+    Return the ids of the prescriptions matching every term, best match first.
+
+    Uses the FTS5 index on SQLite and a LIKE scan on other databases.
+    """
+    if connection.vendor != "sqlite":
+        return like_search_prescription_ids(terms, limit, offset)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, %s, %s) LIMIT %s OFFSET %s",
+            [fts_query(terms), MEDICATION_WEIGHT, INSTRUCTIONS_WEIGHT, limit, offset],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def like_search_prescription_ids(terms, limit, offset=0):
+    """
+    Return the ids of the prescriptions whose medication or instructions
+    contain every term, newest first, with an ``icontains`` scan.
+    """
+    prescriptions = Prescription.objects.all()
+    for term in terms:
+        prescriptions = prescriptions.filter(
+            Q(medication__name__icontains=term) | Q(instructions__icontains=term)
+        )
+    return list(
+        prescriptions.order_by("-id").values_list("id", flat=True)[
+            offset : offset + limit
+        ]
+    )
@@ -1,8 +1,18 @@
 # healthcare/serializers.py
 
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+
+from .authentication import ROLE_CLAIM
+from .middleware import serializing
+from .models import MedicalHistoryEntry, Patient, Prescription, Role
 
-from .models import Patient, Prescription
+PRESCRIPTION_DATE_FORMAT = "%d-%m-%Y"
 
 
 class UserRegistrationSerializer(serializers.Serializer):
@@ -17,6 +27,23 @@ class UserRegistrationSerializer(serializers.Serializer):
         return data
 
 
+class RoleTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Issues token pairs that carry the user's role and username as claims, so that
+    permission checks can be made from the validated token alone.
+    """
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token["username"] = user.username
+        try:
+            token[ROLE_CLAIM] = user.role.role
+        except Role.DoesNotExist:
+            pass
+        return token
+
+
 class CreatePatientRequestSerializer(serializers.Serializer):
     patient = serializers.EmailField()
     medical_history = serializers.CharField(allow_null=True, required=False)
@@ -33,9 +60,19 @@ class PatientListResponseSerializer(serializers.ModelSerializer):
         fields = ["id", "patient_email"]
 
 
+class MedicalHistoryRequestSerializer(serializers.Serializer):
+    patient_username = serializers.EmailField()
+
+
+class MedicalHistoryEntrySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MedicalHistoryEntry
+        fields = ["id", "text", "created"]
+
+
 class PrescriptionRequestSerializer(serializers.Serializer):
     patient_username = serializers.EmailField()
-    medication = serializers.CharField()
+    medication = serializers.CharField(max_length=255)
     dosage = serializers.CharField()
     instruction = serializers.CharField()
 
@@ -45,7 +82,7 @@ class PrescriptionSerializer(serializers.ModelSerializer):
         method_name="get_patient_email"
     )
     doctor_username = serializers.SerializerMethodField(method_name="get_doctor_email")
-    date_prescribed = serializers.DateTimeField(format="%d-%m-%Y")
+    date_prescribed = serializers.DateTimeField(format=PRESCRIPTION_DATE_FORMAT)
 
     def get_patient_email(self, obj):
         return obj.patient.user.username
@@ -64,15 +101,55 @@ class PrescriptionSerializer(serializers.ModelSerializer):
 
 
 class PrescriptionListRequestSerializer(serializers.Serializer):
+    ORDERING_CHOICES = ["date_prescribed", "-date_prescribed"]
+
     patient_username = serializers.EmailField()
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    ordering = serializers.ChoiceField(
+        choices=ORDERING_CHOICES, default="-date_prescribed"
+    )
+
+    def get_fields(self):
+        # "from" and "to" are Python keywords, so they are declared under other
+        # names and exposed with the query parameter names here.
+        fields = super().get_fields()
+        fields["from"] = fields.pop("date_from")
+        fields["to"] = fields.pop("date_to")
+        return fields
+
+    def validate(self, data):
+        if data.get("from") and data.get("to") and data["from"] > data["to"]:
+            raise serializers.ValidationError({"to": "Must not be before from"})
+        return data
+
+
+class MedicationAutocompleteRequestSerializer(serializers.Serializer):
+    q = serializers.CharField()
+    limit = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.AUTOCOMPLETE_MAX_LIMIT,
+        default=settings.AUTOCOMPLETE_LIMIT,
+    )
+
+
+class PrescriptionSearchRequestSerializer(serializers.Serializer):
+    q = serializers.CharField()
+    page = serializers.IntegerField(min_value=1, default=1)
+    page_size = serializers.IntegerField(
+        min_value=1,
+        max_value=settings.SEARCH_MAX_PAGE_SIZE,
+        default=settings.SEARCH_PAGE_SIZE,
+    )
 
 
 class PrescriptionInfoSerializer(serializers.ModelSerializer):
+    medication = serializers.CharField(source="medication.name")
     patient_username = serializers.SerializerMethodField(
         method_name="get_patient_email"
     )
     doctor_username = serializers.SerializerMethodField(method_name="get_doctor_email")
-    date_prescribed = serializers.DateTimeField(format="%d-%m-%Y")
+    date_prescribed = serializers.DateTimeField(format=PRESCRIPTION_DATE_FORMAT)
 
     def get_patient_email(self, obj):
         return obj.patient.user.username
@@ -91,3 +168,107 @@ class PrescriptionInfoSerializer(serializers.ModelSerializer):
             "instructions",
             "date_prescribed",
         ]
+
+
+def datetime_format(output_format):
+    """
+    Return a function formatting a datetime in the current time zone like
+    ``serializers.DateTimeField(format=output_format)``.
+    """
+
+    def format_datetime(value):
+        if value is None:
+            return None
+        return timezone.localtime(value).strftime(output_format)
+
+    return format_datetime
+
+
+class ValuesSerializer:
+    """
+    Fast, read-only counterpart of a ModelSerializer for long lists.
+
+    Rows are fetched with ``.values()`` rather than as model instances and are
+    turned into dicts by an accessor compiled once per class, skipping DRF's
+    per-field machinery. ``fields`` lists the ``(name, lookup)`` pairs of the
+    output in order, and ``formats`` maps names to functions formatting their
+    value.
+    """
+
+    fields = []
+    formats = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.names = [name for name, _ in cls.fields]
+        cls.lookups = [lookup for _, lookup in cls.fields]
+        if len(cls.lookups) == 1:
+            # itemgetter returns the value itself, not a tuple, for one item.
+            lookup = cls.lookups[0]
+            cls.getter = lambda row: (row[lookup],)
+        else:
+            cls.getter = itemgetter(*cls.lookups)
+        cls.formatters = [
+            (index, cls.formats[name])
+            for index, name in enumerate(cls.names)
+            if name in cls.formats
+        ]
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values(*cls.lookups)
+
+    @classmethod
+    def serialize(cls, rows):
+        names = cls.names
+        getter = cls.getter
+        formatters = cls.formatters
+        data = []
+        with serializing():
+            for row in rows:
+                values = getter(row)
+                if formatters:
+                    values = list(values)
+                    for index, format_value in formatters:
+                        values[index] = format_value(values[index])
+                data.append(dict(zip(names, values)))
+        return data
+
+
+class PatientListValuesSerializer(ValuesSerializer):
+    """
+    Fast path of ``PatientListResponseSerializer``.
+    """
+
+    fields = [("id", "id"), ("patient_email", "user__email")]
+
+
+class PrescriptionValuesSerializer(ValuesSerializer):
+    """
+    Fast path of ``PrescriptionSerializer``.
+    """
+
+    fields = [
+        ("id", "id"),
+        ("patient_username", "patient__user__username"),
+        ("doctor_username", "doctor__username"),
+        ("date_prescribed", "date_prescribed"),
+    ]
+    formats = {"date_prescribed": datetime_format(PRESCRIPTION_DATE_FORMAT)}
+
+
+class PrescriptionInfoValuesSerializer(ValuesSerializer):
+    """
+    Fast path of ``PrescriptionInfoSerializer``.
+    """
+
+    fields = [
+        ("id", "id"),
+        ("patient_username", "patient__user__username"),
+        ("doctor_username", "doctor__username"),
+        ("medication", "medication__name"),
+        ("dosage", "dosage"),
+        ("instructions", "instructions"),
+        ("date_prescribed", "date_prescribed"),
+    ]
+    formats = {"date_prescribed": datetime_format(PRESCRIPTION_DATE_FORMAT)}
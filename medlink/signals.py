@@ -0,0 +1,99 @@
+from functools import partial
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import user_cache
+from .autocomplete import medication_index
+from .cache import bump_prescription_version
+from .middleware import install_query_timer
+from .models import Medication, Patient, Prescription, Role
+
+
+@receiver(connection_created)
+def time_connection_queries(sender, connection, **kwargs):
+    """
+    Let ``RequestTimingMiddleware`` time the queries of every new connection,
+    whichever thread opens it.
+    """
+    install_query_timer(connection)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def evict_cached_user(sender, instance, **kwargs):
+    """
+    Drop a changed, deactivated or deleted user from the authentication cache.
+    """
+    user_cache.delete(instance.pk)
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+def evict_cached_user_role(sender, instance, **kwargs):
+    """
+    Drop a user whose role changed from the authentication cache.
+    """
+    user_cache.delete(instance.user_id)
+
+
+@receiver(post_save, sender=Prescription)
+@receiver(post_delete, sender=Prescription)
+def invalidate_prescription_cache(sender, instance, using, **kwargs):
+    """
+    Bump the patient's prescription version once the change is committed, so
+    no cached list or detail response built before it is served again.
+    """
+    if Prescription.patient.is_cached(instance) and Patient.user.is_cached(
+        instance.patient
+    ):
+        username = instance.patient.user.username
+    else:
+        username = (
+            get_user_model()
+            .objects.using(using)
+            .filter(patient__id=instance.patient_id)
+            .values_list("username", flat=True)
+            .first()
+        )
+    if username is not None:
+        transaction.on_commit(lambda: bump_prescription_version(username), using=using)
+
+
+def medication_name(prescription, using):
+    if Prescription.medication.is_cached(prescription):
+        return prescription.medication.name
+    return (
+        Medication.objects.using(using)
+        .filter(id=prescription.medication_id)
+        .values_list("name", flat=True)
+        .first()
+    )
+
+
+@receiver(post_save, sender=Prescription)
+def index_prescribed_medication(sender, instance, created, using, **kwargs):
+    """
+    Count the medication of a new prescription in the autocomplete index once
+    it is committed.
+    """
+    if created:
+        transaction.on_commit(
+            partial(medication_index.add, medication_name(instance, using)),
+            using=using,
+        )
+
+
+@receiver(post_delete, sender=Prescription)
+def unindex_prescribed_medication(sender, instance, using, **kwargs):
+    """
+    Count the medication of a deleted prescription out of the autocomplete
+    index once the deletion is committed.
+    """
+    name = medication_name(instance, using)
+    if name is not None:
+        transaction.on_commit(partial(medication_index.remove, name), using=using)
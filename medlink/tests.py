@@ -1,15 +1,90 @@
+import gzip
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
 from unittest.mock import patch
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, is_password_usable
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 
+from asgiref.sync import sync_to_async
 from rest_framework import status
+from rest_framework.exceptions import ParseError
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTStatelessUserAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
 
-from .models import Patient, Prescription, Role
+from . import columnar, metrics, urls as medlink_urls
+from .authentication import CachedJWTAuthentication, user_cache
+from .autocomplete import PrefixIndex, medication_index
+from .cache import (
+    LRUCache,
+    bump_prescription_version,
+    get_prescription_version,
+    prescription_detail_cache_key,
+)
+from .hashing import hash_passwords
+from .middleware import negotiate_encoding
+from .models import (
+    MEDICAL_HISTORY_CHUNK_SIZE,
+    MedicalHistoryEntry,
+    Medication,
+    Patient,
+    Prescription,
+    Role,
+)
+from .parsers import ColumnarParser
+from .renderers import ColumnarRenderer, FastJSONRenderer
+from .routers import PrimaryReplicaRouter, ReplicaReadMixin, replica_reads
+from .serializers import (
+    PatientListResponseSerializer,
+    PatientListValuesSerializer,
+    PrescriptionInfoSerializer,
+    PrescriptionInfoValuesSerializer,
+    PrescriptionSerializer,
+    PrescriptionValuesSerializer,
+    ValuesSerializer,
+)
+from .views import ListPatientsView, ListPrescriptionsView, PrescriptionsDetailView
 
 
-class RegisterUserViewTest(APITestCase):
+class MedlinkAPITestCase(APITestCase):
+    """
+    Clears the response and authentication caches and the autocomplete index,
+    which outlive the rolled back database of each test, and silences the
+    per-request timing lines.
+    """
+
+    def setUp(self):
+        cache.clear()
+        user_cache.clear()
+        medication_index.reset()
+        request_logger = logging.getLogger("medlink.requests")
+        self.addCleanup(request_logger.setLevel, request_logger.level)
+        request_logger.setLevel(logging.WARNING)
+
+
+class RegisterUserViewTest(MedlinkAPITestCase):
     def test_register_user_success(self):
         data = {
             "email": "testuser@example.com",
@@ -44,7 +119,93 @@ class RegisterUserViewTest(APITestCase):
         self.assertIn("email", response.data)
 
 
-class CreatePatientViewTest(APITestCase):
+class BulkRegisterUsersViewTest(MedlinkAPITestCase):
+    url = "/medlink/user-registration/bulk/"
+
+    def test_bulk_register_success(self):
+        data = [
+            {"email": "doctor1@example.com", "password": "secret1", "role": "doctor"},
+            {"email": "patient1@example.com", "password": "secret2", "role": "patient"},
+        ]
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["count"], 2)
+        user = (
+            get_user_model()
+            .objects.select_related("role")
+            .get(username="patient1@example.com")
+        )
+        self.assertEqual(user.role.role, "patient")
+        self.assertTrue(user.check_password("secret2"))
+
+    def test_bulk_register_reports_existing_and_duplicate_emails(self):
+        get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        data = [
+            {"email": "doctor1@example.com", "password": "secret", "role": "doctor"},
+            {"email": "patient1@example.com", "password": "secret", "role": "patient"},
+            {"email": "patient1@example.com", "password": "secret", "role": "patient"},
+        ]
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("User already exist", response.data[0]["email"][0])
+        self.assertEqual(response.data[1], {})
+        self.assertIn("User already exist", response.data[2]["email"][0])
+        self.assertEqual(get_user_model().objects.count(), 1)
+
+    def test_bulk_register_invalid_role(self):
+        data = [{"email": "user1@example.com", "password": "secret", "role": "admin"}]
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("error", response.data[0])
+
+    def test_passwords_are_hashed_outside_the_transaction(self):
+        outer_blocks = len(connection.atomic_blocks)
+        hashed_in_blocks = []
+
+        def hash_passwords_spy(passwords, parallel=True):
+            hashed_in_blocks.append(len(connection.atomic_blocks))
+            return hash_passwords(passwords, parallel=False)
+
+        data = [
+            {"email": "doctor1@example.com", "password": "secret", "role": "doctor"}
+        ]
+        with patch("medlink.bulk.hash_passwords", hash_passwords_spy):
+            response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(hashed_in_blocks, [outer_blocks])
+
+    @override_settings(USER_BULK_THROTTLE_RATE="2/hour")
+    def test_bulk_register_is_throttled(self):
+        statuses = [
+            self.client.post(
+                self.url,
+                [{"email": "user1@example.com", "password": "s", "role": "admin"}],
+                format="json",
+            ).status_code
+            for _ in range(3)
+        ]
+        self.assertEqual(
+            statuses,
+            [
+                status.HTTP_400_BAD_REQUEST,
+                status.HTTP_400_BAD_REQUEST,
+                status.HTTP_429_TOO_MANY_REQUESTS,
+            ],
+        )
+
+    @override_settings(PASSWORD_HASHING_WORKERS=2)
+    def test_passwords_are_hashed_in_worker_processes(self):
+        hashes = hash_passwords(["secret1", None, "secret2"])
+        self.assertTrue(check_password("secret1", hashes[0]))
+        self.assertFalse(is_password_usable(hashes[1]))
+        self.assertTrue(check_password("secret2", hashes[2]))
+
+
+class CreatePatientViewTest(MedlinkAPITestCase):
     @patch("medlink.views.get_user_model")
     def test_create_patient_success(self, mock_user_model):
         # Mock doctor user
@@ -109,7 +270,7 @@ class CreatePatientViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
 
 
-class ListPatientsViewTest(APITestCase):
+class ListPatientsViewTest(MedlinkAPITestCase):
     def test_list_patients_success(self):
         doctor_user = get_user_model().objects.create_user(
             username="doctor1@example.com",
@@ -130,7 +291,35 @@ class ListPatientsViewTest(APITestCase):
 
         response = self.client.get("/medlink/patients/list/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["next"])
+
+    def test_list_patients_cursor_pagination(self):
+        doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        doctor_role = Role.objects.create(user=doctor_user, role="doctor")
+        self.client.force_authenticate(user=doctor_user)
+
+        for index in range(5):
+            patient_user = get_user_model().objects.create_user(
+                username=f"patient{index}@example.com",
+                email=f"patient{index}@example.com",
+                password="password123",
+            )
+            Patient.objects.create(user=patient_user)
+
+        emails = []
+        url = "/medlink/patients/list/?page_size=2"
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data["results"]), 2)
+            emails.extend(item["patient_email"] for item in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(emails, [f"patient{index}@example.com" for index in range(5)])
 
     def test_list_patients_not_doctor(self):
         patient_user = get_user_model().objects.create_user(
@@ -145,7 +334,80 @@ class ListPatientsViewTest(APITestCase):
         self.assertEqual(response.data["error"], "Only doctors can see patients")
 
 
-class CreatePrescriptionViewTest(APITestCase):
+class MedicalHistoryViewTest(MedlinkAPITestCase):
+    url = "/medlink/patient/history/"
+
+    def setUp(self):
+        super().setUp()
+        self.doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com", email="doctor1@example.com"
+        )
+        Role.objects.create(user=self.doctor_user, role="doctor")
+        self.client.force_authenticate(user=self.doctor_user)
+        self.patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com", email="patient1@example.com"
+        )
+        Role.objects.create(user=self.patient_user, role="patient")
+
+    def test_create_patient_stores_history_in_chunks(self):
+        history = "Asthma." * 1000
+        response = self.client.post(
+            "/medlink/patients/create/",
+            {"patient": "patient1@example.com", "medical_history": history},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        patient = Patient.objects.get(user=self.patient_user)
+        self.assertEqual(
+            [len(entry.text) for entry in patient.history_entries.order_by("id")],
+            [MEDICAL_HISTORY_CHUNK_SIZE, len(history) - MEDICAL_HISTORY_CHUNK_SIZE],
+        )
+        self.assertEqual(patient.medical_history, history)
+
+        # Patients are loaded without their history.
+        with CaptureQueriesContext(connection) as queries:
+            Patient.objects.get(user=self.patient_user)
+        self.assertNotIn("history", queries.captured_queries[0]["sql"])
+
+    def test_history_pages(self):
+        patient = Patient.objects.create(user=self.patient_user)
+        self.assertIsNone(patient.medical_history)
+        for text in ("Asthma", "Appendectomy", "Penicillin allergy"):
+            MedicalHistoryEntry.objects.append(patient, text)
+
+        response = self.client.get(
+            self.url, {"patient_username": "patient1@example.com", "page_size": 2}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        texts = [entry["text"] for entry in response.data["results"]]
+        self.assertIsNone(response.data["previous"])
+        response = self.client.get(response.data["next"])
+        texts += [entry["text"] for entry in response.data["results"]]
+        self.assertIsNone(response.data["next"])
+        self.assertEqual(texts, ["Asthma", "Appendectomy", "Penicillin allergy"])
+        self.assertEqual(set(response.data["results"][0]), {"id", "text", "created"})
+
+    def test_patient_sees_own_history_only(self):
+        other_user = get_user_model().objects.create_user(username="patient2")
+        MedicalHistoryEntry.objects.append(
+            Patient.objects.create(user=other_user), "Diabetes"
+        )
+        Patient.objects.create(user=self.patient_user, medical_history="Asthma")
+        self.client.force_authenticate(user=self.patient_user)
+        response = self.client.get(self.url, {"patient_username": "patient2"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [entry["text"] for entry in response.data["results"]], ["Asthma"]
+        )
+
+    def test_unknown_patient(self):
+        response = self.client.get(self.url, {"patient_username": "nobody@example.com"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CreatePrescriptionViewTest(MedlinkAPITestCase):
     def test_create_prescription_success(self):
         doctor_user = get_user_model().objects.create_user(
             username="doctor1@example.com",
@@ -224,7 +486,7 @@ class CreatePrescriptionViewTest(APITestCase):
         )
 
 
-class ListPrescriptionsViewTest(APITestCase):
+class ListPrescriptionsViewTest(MedlinkAPITestCase):
     def test_list_prescriptions_success(self):
         doctor_user = get_user_model().objects.create_user(
             username="doctor1@example.com",
@@ -246,7 +508,7 @@ class ListPrescriptionsViewTest(APITestCase):
         prescription = Prescription.objects.create(
             patient=patient,
             doctor=doctor_user,
-            medication="Paracetamol",
+            medication=Medication.objects.get_for_name("Paracetamol"),
             dosage="500mg",
             instructions="Take twice a day",
         )
@@ -256,6 +518,130 @@ class ListPrescriptionsViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(len(response.data), 1)
 
+    def test_list_prescriptions_query_count_is_constant(self):
+        doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        doctor_role = Role.objects.create(user=doctor_user, role="doctor")
+        self.client.force_authenticate(user=doctor_user)
+
+        patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com",
+            email="patient1@example.com",
+            password="password123",
+        )
+        patient = Patient.objects.create(
+            user=patient_user, medical_history="No significant history"
+        )
+        Prescription.objects.bulk_create(
+            Prescription(
+                patient=patient,
+                doctor=doctor_user,
+                medication=Medication.objects.get_for_name(f"Medicine {index}"),
+                dosage="500mg",
+                instructions="Take twice a day",
+            )
+            for index in range(25)
+        )
+
+        # The doctor's role is already cached on the authenticated user, so the
+        # prescriptions with their patient and doctor are the only query.
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 25)
+        self.assertEqual(response.data[0]["patient_username"], "patient1@example.com")
+        self.assertEqual(response.data[0]["doctor_username"], "doctor1@example.com")
+
+    def test_list_prescriptions_empty_for_existing_patient(self):
+        doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        doctor_role = Role.objects.create(user=doctor_user, role="doctor")
+        self.client.force_authenticate(user=doctor_user)
+
+        patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com",
+            email="patient1@example.com",
+            password="password123",
+        )
+        Patient.objects.create(user=patient_user)
+
+        response = self.client.get(
+            "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, [])
+
+    def test_list_prescriptions_date_range_and_ordering(self):
+        doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        doctor_role = Role.objects.create(user=doctor_user, role="doctor")
+        self.client.force_authenticate(user=doctor_user)
+
+        patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com",
+            email="patient1@example.com",
+            password="password123",
+        )
+        patient = Patient.objects.create(user=patient_user)
+        for day in (1, 15, 28):
+            prescription = Prescription.objects.create(
+                patient=patient,
+                doctor=doctor_user,
+                medication=Medication.objects.get_for_name("Paracetamol"),
+                dosage="500mg",
+                instructions="Take twice a day",
+            )
+            Prescription.objects.filter(id=prescription.id).update(
+                date_prescribed=datetime(2025, 1, day, 23, 30, tzinfo=dt_timezone.utc)
+            )
+
+        url = (
+            "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com"
+        )
+        response = self.client.get(f"{url}&from=2025-01-15&to=2025-01-28")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["date_prescribed"] for item in response.data],
+            ["28-01-2025", "15-01-2025"],
+        )
+
+        response = self.client.get(f"{url}&ordering=date_prescribed")
+        self.assertEqual(
+            [item["date_prescribed"] for item in response.data],
+            ["01-01-2025", "15-01-2025", "28-01-2025"],
+        )
+
+    def test_list_prescriptions_invalid_filters(self):
+        doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        doctor_role = Role.objects.create(user=doctor_user, role="doctor")
+        self.client.force_authenticate(user=doctor_user)
+
+        url = (
+            "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com"
+        )
+        response = self.client.get(f"{url}&from=2025-02-01&to=2025-01-01")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("to", response.data)
+
+        response = self.client.get(f"{url}&ordering=medication")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("ordering", response.data)
+
     def test_list_prescriptions_patient_not_found(self):
         doctor_user = get_user_model().objects.create_user(
             username="doctor1@example.com",
@@ -275,7 +661,7 @@ class ListPrescriptionsViewTest(APITestCase):
         )
 
 
-class PrescriptionsDetailViewTest(APITestCase):
+class PrescriptionsDetailViewTest(MedlinkAPITestCase):
     def test_prescription_detail_success(self):
         doctor_user = get_user_model().objects.create_user(
             username="doctor1@example.com",
@@ -297,7 +683,7 @@ class PrescriptionsDetailViewTest(APITestCase):
         prescription = Prescription.objects.create(
             patient=patient,
             doctor=doctor_user,
-            medication="Paracetamol",
+            medication=Medication.objects.get_for_name("Paracetamol"),
             dosage="500mg",
             instructions="Take twice a day",
         )
@@ -315,3 +701,1802 @@ class PrescriptionsDetailViewTest(APITestCase):
         self.assertEqual(
             response.data["error"], "Prescription does not exist with id 9999"
         )
+
+
+class TokenRoleClaimTest(MedlinkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        Role.objects.create(user=self.doctor_user, role="doctor")
+        self.patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com",
+            email="patient1@example.com",
+            password="password123",
+        )
+        Role.objects.create(user=self.patient_user, role="patient")
+        patient = Patient.objects.create(user=self.patient_user)
+        Prescription.objects.create(
+            patient=patient,
+            doctor=self.doctor_user,
+            medication=Medication.objects.get_for_name("Paracetamol"),
+            dosage="500mg",
+            instructions="Take twice a day",
+        )
+
+    def obtain_access_token(self, username):
+        response = self.client.post(
+            "/api/token/",
+            {"username": username, "password": "password123"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["access"]
+
+    def test_token_carries_role_and_username(self):
+        token = AccessToken(self.obtain_access_token("doctor1@example.com"))
+        self.assertEqual(token["role"], "doctor")
+        self.assertEqual(token["username"], "doctor1@example.com")
+
+    def test_role_is_loaded_with_the_user(self):
+        access = self.obtain_access_token("doctor1@example.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/medlink/patients/list/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        role_queries = [
+            query["sql"]
+            for query in queries.captured_queries
+            if "medlink_role" in query["sql"]
+        ]
+        self.assertEqual(len(role_queries), 1)
+        self.assertIn("JOIN", role_queries[0])
+
+    def test_role_changes_apply_to_issued_tokens(self):
+        access = self.obtain_access_token("doctor1@example.com")
+        Role.objects.filter(user=self.doctor_user).update(role="patient")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        response = self.client.get("/medlink/patients/list/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def assert_unknown_role_is_forbidden(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        for url in (
+            "/medlink/patients/list/",
+            "/medlink/patient/history/?patient_username=patient1@example.com",
+            "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com",
+            "/medlink/patient/prescriptions/export/",
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_user_without_role_is_forbidden(self):
+        Role.objects.filter(user=self.doctor_user).delete()
+        self.assert_unknown_role_is_forbidden(AccessToken.for_user(self.doctor_user))
+
+    @patch.object(APIView, "authentication_classes", [JWTStatelessUserAuthentication])
+    def test_stateless_token_without_role_claim_is_forbidden(self):
+        self.assert_unknown_role_is_forbidden(AccessToken.for_user(self.doctor_user))
+
+    @patch.object(
+        ListPrescriptionsView,
+        "authentication_classes",
+        [JWTStatelessUserAuthentication],
+    )
+    def test_stateless_authentication_skips_user_and_role_queries(self):
+        access = self.obtain_access_token("patient1@example.com")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        with self.assertNumQueries(1):
+            response = self.client.get("/medlink/patient/prescriptions/list/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["patient_username"], "patient1@example.com")
+
+
+class LRUCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), 1)
+        self.assertEqual(cache.get("c"), 3)
+        self.assertEqual(cache.stats()["hits"], 3)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    @patch("medlink.cache.time.monotonic")
+    def test_entries_expire_after_ttl(self, mock_monotonic):
+        cache = LRUCache(maxsize=2, ttl=60)
+        mock_monotonic.return_value = 100
+        cache.set("a", 1)
+        mock_monotonic.return_value = 159
+        self.assertEqual(cache.get("a"), 1)
+        mock_monotonic.return_value = 161
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+
+@patch.object(ListPatientsView, "authentication_classes", [CachedJWTAuthentication])
+class CachedJWTAuthenticationTest(MedlinkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        Role.objects.create(user=self.doctor_user, role="doctor")
+        response = self.client.post(
+            "/api/token/",
+            {"username": "doctor1@example.com", "password": "password123"},
+            format="json",
+        )
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+
+    def test_user_is_loaded_once(self):
+        response = self.client.get("/medlink/patients/list/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Only the patient page is queried once the user is cached.
+        with self.assertNumQueries(1):
+            response = self.client.get("/medlink/patients/list/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(user_cache.stats()["hits"], 1)
+        self.assertEqual(user_cache.stats()["misses"], 1)
+
+    def test_deactivated_user_is_evicted(self):
+        response = self.client.get("/medlink/patients/list/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.doctor_user.is_active = False
+        self.doctor_user.save()
+
+        response = self.client.get("/medlink/patients/list/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_role_change_evicts_user(self):
+        self.client.get("/medlink/patients/list/")
+        self.assertEqual(user_cache.stats()["size"], 1)
+        Role.objects.filter(user=self.doctor_user).get().save()
+        self.assertEqual(user_cache.stats()["size"], 0)
+
+
+class PrescriptionResponseCacheTest(MedlinkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        Role.objects.create(user=self.doctor_user, role="doctor")
+        self.client.force_authenticate(user=self.doctor_user)
+        patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com",
+            email="patient1@example.com",
+            password="password123",
+        )
+        self.patient = Patient.objects.create(user=patient_user)
+        self.prescription = Prescription.objects.create(
+            patient=self.patient,
+            doctor=self.doctor_user,
+            medication=Medication.objects.get_for_name("Paracetamol"),
+            dosage="500mg",
+            instructions="Take twice a day",
+        )
+
+    def create_prescription(self, medication):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/medlink/patient/prescriptions/create/",
+                {
+                    "patient_username": "patient1@example.com",
+                    "medication": medication,
+                    "dosage": "5mg",
+                    "instruction": "Once a day",
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_list_is_served_from_cache_until_prescriptions_change(self):
+        url = (
+            "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com"
+        )
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(len(response.data), 1)
+
+        self.create_prescription("Warfarin")
+        response = self.client.get(url)
+        self.assertEqual(len(response.data), 2)
+        self.assertEqual(response.data[0]["id"], self.prescription.id + 1)
+
+    def test_detail_is_served_from_cache_until_prescriptions_change(self):
+        url = f"/medlink/patient/prescriptions/{self.prescription.id}/"
+        response = self.client.get(url)
+        self.assertEqual(response.data["medication"], "Paracetamol")
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data["medication"], "Paracetamol")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.prescription.medication = Medication.objects.get_for_name("Ibuprofen")
+            self.prescription.save()
+        response = self.client.get(url)
+        self.assertEqual(response.data["medication"], "Ibuprofen")
+
+    def test_detail_written_during_a_miss_is_not_cached_as_current(self):
+        url = f"/medlink/patient/prescriptions/{self.prescription.id}/"
+        get_version = get_prescription_version
+
+        def write_then_get_version(username):
+            # The dosage change commits while the view builds the response.
+            Prescription.objects.filter(id=self.prescription.id).update(dosage="250mg")
+            bump_prescription_version(username)
+            return get_version(username)
+
+        with patch(
+            "medlink.views.get_prescription_version",
+            side_effect=write_then_get_version,
+        ):
+            self.client.get(url)
+        response = self.client.get(url)
+        self.assertEqual(response.data["dosage"], "250mg")
+
+    def test_list_conditional_get(self):
+        url = (
+            "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com"
+        )
+        response = self.client.get(url)
+        etag = response.headers["ETag"]
+
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response.headers["ETag"], etag)
+
+        self.create_prescription("Warfarin")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(len(response.data), 2)
+
+    def test_detail_conditional_get(self):
+        url = f"/medlink/patient/prescriptions/{self.prescription.id}/"
+        etag = self.client.get(url).headers["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=f"W/{etag}")
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # The validator is also checked on a cache miss.
+        cache.delete(prescription_detail_cache_key(self.prescription.id))
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Other prescriptions of the patient leave this one unchanged.
+        self.create_prescription("Warfarin")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.prescription.dosage = "250mg"
+            self.prescription.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_etag_changes_with_writes_that_skip_the_version(self):
+        url = (
+            "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com"
+        )
+        etag = self.client.get(url).headers["ETag"]
+        # Like a write made by another worker, or a bulk_create() outside the
+        # views, then the cached response expiring.
+        Prescription.objects.bulk_create(
+            [
+                Prescription(
+                    patient=self.patient,
+                    doctor=self.doctor_user,
+                    medication=self.prescription.medication,
+                    dosage="5mg",
+                    instructions="Once a day",
+                )
+            ]
+        )
+        cache.clear()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response.headers["ETag"], etag)
+        self.assertEqual(len(response.data), 2)
+
+
+class BulkCreatePrescriptionViewTest(MedlinkAPITestCase):
+    url = "/medlink/patient/prescriptions/bulk-create/"
+
+    def setUp(self):
+        super().setUp()
+        self.doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        Role.objects.create(user=self.doctor_user, role="doctor")
+        self.client.force_authenticate(user=self.doctor_user)
+        for username in ("patient1@example.com", "patient2@example.com"):
+            patient_user = get_user_model().objects.create_user(
+                username=username, email=username, password="password123"
+            )
+            Patient.objects.create(user=patient_user)
+
+    def prescription(self, patient_username, medication="Paracetamol"):
+        return {
+            "patient_username": patient_username,
+            "medication": medication,
+            "dosage": "500mg",
+            "instruction": "Take twice a day",
+        }
+
+    def test_bulk_create_success(self):
+        data = [
+            self.prescription("patient1@example.com", f"Medicine {index}")
+            for index in range(20)
+        ] + [self.prescription("patient2@example.com")]
+        # Patient lookup, then the transaction around the medication lookup,
+        # the INSERT and re-read of the new medications, and one INSERT.
+        with self.assertNumQueries(7):
+            response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["ids"]), 21)
+        self.assertEqual(
+            Prescription.objects.filter(
+                patient__user__username="patient1@example.com"
+            ).count(),
+            20,
+        )
+        self.assertEqual(Medication.objects.count(), 21)
+
+        # Known medications are resolved by the lookup alone.
+        with self.assertNumQueries(5):
+            response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Medication.objects.count(), 21)
+
+    def test_bulk_create_reports_per_item_errors(self):
+        data = [
+            self.prescription("patient1@example.com"),
+            self.prescription("nonexistent_patient@example.com"),
+            {"patient_username": "patient2@example.com", "medication": "Aspirin"},
+        ]
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("dosage", response.data[2])
+
+        response = self.client.post(self.url, data[:2], format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertEqual(
+            response.data[1]["patient_username"],
+            ["Patient does not exist with username nonexistent_patient@example.com"],
+        )
+        self.assertFalse(Prescription.objects.exists())
+
+    def test_bulk_create_rejects_oversized_batch(self):
+        data = [self.prescription("patient1@example.com")] * 101
+        response = self.client.post(self.url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_create_not_doctor(self):
+        patient_user = get_user_model().objects.get(username="patient1@example.com")
+        Role.objects.create(user=patient_user, role="patient")
+        self.client.force_authenticate(user=patient_user)
+        response = self.client.post(
+            self.url, [self.prescription("patient1@example.com")], format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class ImportPatientsCommandTest(MedlinkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def test_import_csv(self):
+        path = self.directory / "patients.csv"
+        path.write_text(
+            "email,medical_history\n"
+            "patient1@example.com,Asthma\n"
+            "not-an-email,\n"
+            "patient2@example.com,\n"
+            "patient1@example.com,Duplicate\n"
+        )
+        out = StringIO()
+        call_command("import_patients", str(path), "--chunk-size=2", stdout=out)
+
+        self.assertEqual(Patient.objects.count(), 2)
+        patient = Patient.objects.select_related("user__role").get(
+            user__username="patient1@example.com"
+        )
+        self.assertEqual(patient.medical_history, "Asthma")
+        self.assertEqual(patient.user.role.role, "patient")
+        self.assertFalse(patient.user.has_usable_password())
+        self.assertIn("4 rows read, 2 created, 1 skipped, 1 invalid", out.getvalue())
+        self.assertEqual((self.directory / "patients.csv.checkpoint").read_text(), "4")
+
+    def test_import_jsonl_resumes_from_checkpoint(self):
+        path = self.directory / "patients.jsonl"
+        path.write_text(
+            "\n".join(
+                json.dumps({"email": f"patient{index}@example.com"})
+                for index in range(5)
+            )
+        )
+        (self.directory / "patients.jsonl.checkpoint").write_text("3")
+        call_command(
+            "import_patients",
+            str(path),
+            "--resume",
+            "--chunk-size=2",
+            stdout=StringIO(),
+        )
+        self.assertEqual(
+            sorted(Patient.objects.values_list("user__username", flat=True)),
+            ["patient3@example.com", "patient4@example.com"],
+        )
+
+        # Running again skips the users that already exist.
+        call_command("import_patients", str(path), stdout=StringIO())
+        self.assertEqual(Patient.objects.count(), 5)
+
+
+class AsyncReadViewsTest(MedlinkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        Role.objects.create(user=doctor_user, role="doctor")
+        for index in range(3):
+            patient_user = get_user_model().objects.create_user(
+                username=f"patient{index}@example.com",
+                email=f"patient{index}@example.com",
+                password="password123",
+            )
+            Role.objects.create(user=patient_user, role="patient")
+            patient = Patient.objects.create(user=patient_user)
+        self.prescription = Prescription.objects.create(
+            patient=patient,
+            doctor=doctor_user,
+            medication=Medication.objects.get_for_name("Paracetamol"),
+            dosage="500mg",
+            instructions="Take twice a day",
+        )
+
+    def authorization(self, username):
+        response = self.client.post(
+            "/api/token/",
+            {"username": username, "password": "password123"},
+            format="json",
+        )
+        return {"Authorization": f"Bearer {response.data['access']}"}
+
+    async def test_async_views_are_timed(self):
+        headers = await sync_to_async(self.authorization)("doctor1@example.com")
+        with self.assertLogs("medlink.requests", "DEBUG") as logs:
+            response = await self.async_client.get(
+                "/medlink/async/patients/list/", headers=headers
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["view"], "AsyncListPatientsView")
+        self.assertGreater(line["queries"], 0)
+        self.assertIn(f'desc="{line["queries"]} queries"', response["Server-Timing"])
+
+    async def test_list_patients_pages_with_cursor(self):
+        headers = await sync_to_async(self.authorization)("doctor1@example.com")
+        emails = []
+        url = "/medlink/async/patients/list/?page_size=2"
+        while url:
+            response = await self.async_client.get(url, headers=headers)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            data = response.json()
+            emails.extend(item["patient_email"] for item in data["results"])
+            url = data["next"]
+        self.assertEqual(emails, [f"patient{index}@example.com" for index in range(3)])
+
+    async def test_list_prescriptions_of_patient(self):
+        headers = await sync_to_async(self.authorization)("patient2@example.com")
+        response = await self.async_client.get(
+            "/medlink/async/patient/prescriptions/list/", headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()[0]["patient_username"], "patient2@example.com")
+
+        response = await self.async_client.get(
+            "/medlink/async/patient/prescriptions/list/",
+            headers={**headers, "If-None-Match": response["ETag"]},
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    async def test_prescription_detail(self):
+        headers = await sync_to_async(self.authorization)("doctor1@example.com")
+        response = await self.async_client.get(
+            f"/medlink/async/patient/prescriptions/{self.prescription.id}/",
+            headers=headers,
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["medication"], "Paracetamol")
+
+        response = await self.async_client.get(
+            "/medlink/async/patient/prescriptions/9999/", headers=headers
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    async def deactivate_after_one_request(self):
+        headers = await sync_to_async(self.authorization)("doctor1@example.com")
+        url = "/medlink/async/patients/list/"
+        response = await self.async_client.get(url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Like a deactivation made by another worker, which the signal handlers
+        # of this process do not see.
+        await get_user_model().objects.filter(username="doctor1@example.com").aupdate(
+            is_active=False
+        )
+        return await self.async_client.get(url, headers=headers)
+
+    async def test_database_mode_loads_the_user_on_every_request(self):
+        response = await self.deactivate_after_one_request()
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(JWT_AUTHENTICATION_MODE="cached")
+    async def test_cached_mode_resolves_users_through_the_cache(self):
+        response = await self.deactivate_after_one_request()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get("/medlink/async/patients/list/")
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = await self.async_client.get(
+            "/medlink/async/patients/list/",
+            headers={"Authorization": "Bearer invalid"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ExportPrescriptionsTest(MedlinkAPITestCase):
+    url = "/medlink/patient/prescriptions/export/"
+
+    def setUp(self):
+        super().setUp()
+        self.doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        Role.objects.create(user=self.doctor_user, role="doctor")
+        self.client.force_authenticate(user=self.doctor_user)
+        patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com",
+            email="patient1@example.com",
+            password="password123",
+        )
+        patient = Patient.objects.create(user=patient_user)
+        for medication in ("Paracetamol", "Warfarin, 5mg"):
+            Prescription.objects.create(
+                patient=patient,
+                doctor=self.doctor_user,
+                medication=Medication.objects.get_for_name(medication),
+                dosage="500mg",
+                instructions="Take twice a day",
+            )
+
+    def test_export_csv(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            lines[0],
+            "id,patient_username,doctor_username,medication,dosage,instructions,"
+            "date_prescribed",
+        )
+        self.assertEqual(len(lines), 3)
+        self.assertIn('"Warfarin, 5mg"', lines[2])
+
+    def test_export_jsonl(self):
+        response = self.client.get(f"{self.url}?export_format=jsonl")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        records = [
+            json.loads(line)
+            for line in b"".join(response.streaming_content).decode().splitlines()
+        ]
+        self.assertEqual(len(records), 2)
+        self.assertEqual(records[0]["patient_username"], "patient1@example.com")
+        self.assertEqual(records[1]["medication"], "Warfarin, 5mg")
+
+    @override_settings(EXPORT_CHUNK_SIZE=1)
+    async def test_export_streams_asynchronously_under_asgi(self):
+        response = await sync_to_async(self.client.post)(
+            "/api/token/",
+            {"username": "doctor1@example.com", "password": "password123"},
+            format="json",
+        )
+        response = await self.async_client.get(
+            f"{self.url}?export_format=jsonl",
+            headers={"Authorization": f"Bearer {response.data['access']}"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # A sync iterator would be read whole before the first chunk is sent.
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # One chunk of EXPORT_CHUNK_SIZE rows at a time.
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(json.loads(chunks[1])["medication"], "Warfarin, 5mg")
+
+    def test_export_invalid_format(self):
+        response = self.client.get(f"{self.url}?export_format=xml")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_export_not_doctor(self):
+        patient_user = get_user_model().objects.get(username="patient1@example.com")
+        Role.objects.create(user=patient_user, role="patient")
+        self.client.force_authenticate(user=patient_user)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_export_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "prescriptions.jsonl"
+            call_command(
+                "export_prescriptions",
+                "--format=jsonl",
+                f"--output={path}",
+                "--chunk-size=1",
+                stdout=StringIO(),
+            )
+            self.assertEqual(len(path.read_text().splitlines()), 2)
+
+
+class SearchPrescriptionsViewTest(MedlinkAPITestCase):
+    url = "/medlink/patient/prescriptions/search/"
+
+    def setUp(self):
+        super().setUp()
+        self.doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        Role.objects.create(user=self.doctor_user, role="doctor")
+        self.client.force_authenticate(user=self.doctor_user)
+        patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com",
+            email="patient1@example.com",
+            password="password123",
+        )
+        self.patient = Patient.objects.create(user=patient_user)
+        self.by_instructions = self.create_prescription(
+            "Ibuprofen", "Take with paracetamol if the pain persists"
+        )
+        self.by_medication = self.create_prescription("Paracetamol", "Take twice a day")
+
+    def create_prescription(self, medication, instructions):
+        return Prescription.objects.create(
+            patient=self.patient,
+            doctor=self.doctor_user,
+            medication=Medication.objects.get_for_name(medication),
+            dosage="500mg",
+            instructions=instructions,
+        )
+
+    def search(self, query, **params):
+        return self.client.get(self.url, {"q": query, **params})
+
+    def result_ids(self, response):
+        return [result["id"] for result in response.data["results"]]
+
+    def test_medication_match_ranks_first(self):
+        response = self.search("paracetamol")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            self.result_ids(response), [self.by_medication.id, self.by_instructions.id]
+        )
+        self.assertEqual(
+            response.data["results"][0]["patient_username"], "patient1@example.com"
+        )
+
+    def test_prefix_and_every_term(self):
+        response = self.search("parac twice")
+        self.assertEqual(self.result_ids(response), [self.by_medication.id])
+
+    def test_operators_are_not_interpreted(self):
+        response = self.search('ibuprofen" paracetamol*')
+        self.assertEqual(self.result_ids(response), [self.by_instructions.id])
+
+    def test_pagination(self):
+        response = self.search("paracetamol", page_size=1)
+        self.assertEqual(self.result_ids(response), [self.by_medication.id])
+        self.assertIsNone(response.data["previous"])
+        response = self.client.get(response.data["next"])
+        self.assertEqual(self.result_ids(response), [self.by_instructions.id])
+        self.assertIsNone(response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.by_medication.medication = Medication.objects.get_for_name("Cetirizine")
+        self.by_medication.save()
+        self.assertEqual(
+            self.result_ids(self.search("cetirizine")), [self.by_medication.id]
+        )
+        self.assertEqual(
+            self.result_ids(self.search("paracetamol")), [self.by_instructions.id]
+        )
+        self.by_instructions.delete()
+        self.assertEqual(self.result_ids(self.search("paracetamol")), [])
+
+    def test_empty_query(self):
+        self.assertEqual(self.search("").status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.search("*?").status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_not_doctor(self):
+        self.client.force_authenticate(user=self.patient.user)
+        Role.objects.create(user=self.patient.user, role="patient")
+        response = self.search("paracetamol")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class MedicationModelTest(MedlinkAPITestCase):
+    def test_intern_dedups_normalized_names(self):
+        medications = Medication.objects.intern(
+            ["Paracetamol", " paracetamol", "PARACETAMOL  500", "Ibuprofen"]
+        )
+        self.assertEqual(Medication.objects.count(), 3)
+        self.assertEqual(medications["Paracetamol"], medications[" paracetamol"])
+        self.assertEqual(medications["Paracetamol"].name, "Paracetamol")
+        self.assertEqual(
+            medications["PARACETAMOL  500"].normalized_name, "paracetamol 500"
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                Medication.objects.get_for_name("ibuprofen"), medications["Ibuprofen"]
+            )
+
+
+class PrefixIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.medications = [("Paracetamol", 2), ("Pantoprazole", 5), ("Ibuprofen", 1)]
+        self.load = lambda: list(self.medications)
+        self.index = PrefixIndex(lambda: self.load(), ttl=60)
+
+    def test_suggest_ranks_by_frequency(self):
+        self.assertEqual(self.index.suggest("pa", 10), ["Pantoprazole", "Paracetamol"])
+        self.assertEqual(self.index.suggest("PARA", 10), ["Paracetamol"])
+        self.assertEqual(self.index.suggest("pa", 1), ["Pantoprazole"])
+        self.assertEqual(self.index.suggest("x", 10), [])
+
+    def test_add_and_remove(self):
+        self.index.suggest("", 10)
+        self.index.add("Paracetamol", "paracetamol", "Parafon  Forte")
+        self.assertEqual(
+            self.index.suggest("pa", 10),
+            ["Pantoprazole", "Paracetamol", "Parafon Forte"],
+        )
+        self.index.remove("Pantoprazole", "Pantoprazole", "Unknown")
+        self.assertEqual(
+            self.index.suggest("pa", 10),
+            ["Paracetamol", "Pantoprazole", "Parafon Forte"],
+        )
+        self.index.remove("Parafon Forte")
+        self.assertEqual(self.index.suggest("paraf", 10), [])
+        self.assertEqual(len(self.index), 3)
+
+    def test_add_before_load_is_ignored(self):
+        self.index.add("Paracetamol")
+        self.assertEqual(self.index.suggest("parac", 10), ["Paracetamol"])
+        self.assertEqual(self.index.suggest("pa", 10), ["Pantoprazole", "Paracetamol"])
+
+    def wait_for_reload(self):
+        reloader = self.index._reloader
+        if reloader is not None:
+            reloader.join()
+
+    @patch("medlink.autocomplete.time.monotonic")
+    def test_reload_after_ttl(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        self.assertEqual(self.index.suggest("pa", 10), ["Pantoprazole", "Paracetamol"])
+        self.medications = [("Paracetamol", 9), ("Pantoprazole", 5)]
+        mock_monotonic.return_value = 159
+        self.assertEqual(self.index.suggest("pa", 10), ["Pantoprazole", "Paracetamol"])
+        self.assertIsNone(self.index._reloader)
+        mock_monotonic.return_value = 161
+        self.index.suggest("pa", 10)
+        self.wait_for_reload()
+        self.assertEqual(self.index.suggest("pa", 10), ["Paracetamol", "Pantoprazole"])
+        self.assertEqual(self.index.suggest("ibu", 10), [])
+
+    @patch("medlink.autocomplete.time.monotonic")
+    def test_reload_does_not_block_lookups_or_lose_changes(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        self.index.suggest("", 10)
+        loading = threading.Event()
+        loaded = threading.Event()
+
+        def load():
+            loading.set()
+            loaded.wait(5)
+            return [("Paracetamol", 9), ("Pantoprazole", 5)]
+
+        self.load = load
+        mock_monotonic.return_value = 161
+        # Answered from the current index while the reload waits on the loader.
+        self.assertEqual(self.index.suggest("pa", 10), ["Pantoprazole", "Paracetamol"])
+        self.assertTrue(loading.wait(5))
+        self.index.add("Ibuprofen")
+        self.index.remove("Pantoprazole")
+        loaded.set()
+        self.wait_for_reload()
+        self.assertEqual(
+            self.index.suggest("", 10), ["Paracetamol", "Pantoprazole", "Ibuprofen"]
+        )
+        self.assertEqual(self.index.suggest("ibu", 10), ["Ibuprofen"])
+        self.assertEqual(len(self.index), 3)
+
+    @patch("medlink.autocomplete.time.monotonic")
+    def test_failed_reload_keeps_the_index(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        self.index.suggest("", 10)
+        self.medications = None
+        mock_monotonic.return_value = 161
+        with self.assertLogs("medlink.autocomplete", "ERROR"):
+            self.assertEqual(
+                self.index.suggest("pa", 10), ["Pantoprazole", "Paracetamol"]
+            )
+            self.wait_for_reload()
+        self.medications = [("Paracetamol", 9), ("Pantoprazole", 5)]
+        mock_monotonic.return_value = 220
+        self.index.suggest("pa", 10)
+        self.assertIsNone(self.index._reloader)
+        mock_monotonic.return_value = 222
+        self.index.suggest("pa", 10)
+        self.wait_for_reload()
+        self.assertEqual(self.index.suggest("pa", 10), ["Paracetamol", "Pantoprazole"])
+
+
+class MedicationAutocompleteViewTest(MedlinkAPITestCase):
+    url = "/medlink/patient/prescriptions/medications/autocomplete/"
+
+    def setUp(self):
+        super().setUp()
+        self.doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com",
+            email="doctor1@example.com",
+            password="password123",
+        )
+        Role.objects.create(user=self.doctor_user, role="doctor")
+        self.client.force_authenticate(user=self.doctor_user)
+        patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com",
+            email="patient1@example.com",
+            password="password123",
+        )
+        self.patient = Patient.objects.create(user=patient_user)
+        for medication in ("Paracetamol", "Pantoprazole", "Pantoprazole"):
+            Prescription.objects.create(
+                patient=self.patient,
+                doctor=self.doctor_user,
+                medication=Medication.objects.get_for_name(medication),
+                dosage="500mg",
+                instructions="Take twice a day",
+            )
+
+    def prescribe(self, url, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(url, data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_autocomplete(self):
+        response = self.client.get(self.url, {"q": "pa"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, ["Pantoprazole", "Paracetamol"])
+        response = self.client.get(self.url, {"q": "pa", "limit": 1})
+        self.assertEqual(response.data, ["Pantoprazole"])
+
+    def test_lookups_skip_the_database(self):
+        self.client.get(self.url, {"q": "pa"})
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, {"q": "para"})
+        self.assertEqual(response.data, ["Paracetamol"])
+
+    def test_index_follows_new_prescriptions(self):
+        self.client.get(self.url, {"q": "pa"})
+        item = {
+            "patient_username": "patient1@example.com",
+            "medication": "Paracetamol",
+            "dosage": "500mg",
+            "instruction": "Take twice a day",
+        }
+        self.prescribe("/medlink/patient/prescriptions/create/", item)
+        self.prescribe(
+            "/medlink/patient/prescriptions/bulk-create/",
+            [item, {**item, "medication": "Paroxetine"}],
+        )
+        response = self.client.get(self.url, {"q": "pa"})
+        self.assertEqual(response.data, ["Paracetamol", "Pantoprazole", "Paroxetine"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Prescription.objects.get(medication__name="Paroxetine").delete()
+        response = self.client.get(self.url, {"q": "paro"})
+        self.assertEqual(response.data, [])
+
+    def test_autocomplete_invalid_limit(self):
+        response = self.client.get(self.url, {"q": "pa", "limit": 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete_not_doctor(self):
+        Role.objects.create(user=self.patient.user, role="patient")
+        self.client.force_authenticate(user=self.patient.user)
+        response = self.client.get(self.url, {"q": "pa"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class DatabaseProfileTest(SimpleTestCase):
+    def test_production_profile_pragmas(self):
+        options = settings.DATABASE_PROFILES["production"]["OPTIONS"]
+        self.assertIn("PRAGMA journal_mode = wal", options["init_command"])
+        self.assertIn("PRAGMA busy_timeout = 5000", options["init_command"])
+        self.assertEqual(options["transaction_mode"], "IMMEDIATE")
+
+    def test_concurrent_writers_are_not_locked_out(self):
+        # The benchmark opens threaded connections to a scratch database, which
+        # test cases do not allow, so it runs in its own process.
+        result = subprocess.run(
+            [
+                sys.executable,
+                str(settings.BASE_DIR / "manage.py"),
+                "benchmark_database_profiles",
+                "--profile",
+                "production",
+                "--threads",
+                "4",
+                "--writes",
+                "25",
+            ],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        self.assertIn("0 locked errors  (100 written", result.stdout)
+
+
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        replica = patch.dict(connections.settings, {"replica": {}})
+        replica.start()
+        self.addCleanup(replica.stop)
+
+    def test_reads_go_to_replica_inside_replica_reads(self):
+        self.assertEqual(self.router.db_for_read(Patient), "default")
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Patient), "replica")
+        self.assertEqual(self.router.db_for_read(Patient), "default")
+
+    def test_reads_after_a_write_stay_on_primary(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(Prescription), "default")
+            self.assertEqual(self.router.db_for_read(Prescription), "default")
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Prescription), "replica")
+
+    def test_reads_in_transactions_stay_on_primary(self):
+        with replica_reads(), patch.object(
+            connections["default"], "in_atomic_block", True
+        ):
+            self.assertEqual(self.router.db_for_read(Patient), "default")
+
+    def test_without_replica(self):
+        del connections.settings["replica"]
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Patient), "default")
+
+    def test_replica_is_not_migrated(self):
+        self.assertIs(self.router.allow_migrate("replica", "medlink"), False)
+        self.assertIsNone(self.router.allow_migrate("default", "medlink"))
+
+    def test_read_views_use_replica(self):
+        for view in (ListPatientsView, ListPrescriptionsView, PrescriptionsDetailView):
+            self.assertTrue(issubclass(view, ReplicaReadMixin))
+
+
+class ReplicaSyncTest(SimpleTestCase):
+    """
+    Runs the API against a primary and a replica SQLite file, in other
+    processes as test cases cannot open further databases.
+    """
+
+    def manage(self, *args):
+        return subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / "manage.py"), *args],
+            env=self.env,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+
+    def list_patients(self):
+        return self.manage(
+            "shell",
+            "-c",
+            "from django.contrib.auth.models import User\n"
+            "from rest_framework.test import APIClient\n"
+            "client = APIClient()\n"
+            "client.force_authenticate(User.objects.get(username='doctor'))\n"
+            "print(len(client.get('/medlink/patients/list/').data['results']))",
+        ).strip()
+
+    def test_list_reads_replica_until_synced(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.env = {
+                **os.environ,
+                "DATABASE_NAME": str(Path(directory) / "primary.sqlite3"),
+                "DATABASE_REPLICA_NAME": str(Path(directory) / "replica.sqlite3"),
+            }
+            self.manage("migrate")
+            self.manage(
+                "shell",
+                "-c",
+                "from django.contrib.auth.models import User\n"
+                "from medlink.models import Patient, Role\n"
+                "doctor = User.objects.create_user(username='doctor')\n"
+                "Role.objects.create(user=doctor, role='doctor')\n"
+                "Patient.objects.create(user=doctor)",
+            )
+            self.assertIn("Copied", self.manage("sync_replica"))
+            self.assertEqual(self.list_patients(), "1")
+
+            self.manage(
+                "shell",
+                "-c",
+                "from django.contrib.auth.models import User\n"
+                "from medlink.models import Patient\n"
+                "Patient.objects.create(user=User.objects.create_user('patient'))",
+            )
+            self.assertEqual(self.list_patients(), "1")
+            self.manage("sync_replica")
+            self.assertEqual(self.list_patients(), "2")
+
+    def test_cached_list_is_refreshed_by_each_copy(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.env = {
+                **os.environ,
+                "DATABASE_NAME": str(Path(directory) / "primary.sqlite3"),
+                "DATABASE_REPLICA_NAME": str(Path(directory) / "replica.sqlite3"),
+            }
+            self.manage("migrate")
+            # One API process, and so one local-memory cache, throughout, with
+            # the replica copied by another process.
+            output = self.manage(
+                "shell",
+                "-c",
+                "import subprocess, sys\n"
+                "from django.conf import settings\n"
+                "from django.contrib.auth.models import User\n"
+                "from django.core.management import call_command\n"
+                "from rest_framework.test import APIClient\n"
+                "from medlink.models import Medication, Patient, Prescription, Role\n"
+                "doctor = User.objects.create_user(username='doctor@example.com')\n"
+                "Role.objects.create(user=doctor, role='doctor')\n"
+                "patient = Patient.objects.create(user=doctor)\n"
+                "call_command('sync_replica')\n"
+                "client = APIClient()\n"
+                "client.force_authenticate(doctor)\n"
+                "url = '/medlink/patient/prescriptions/list/'"
+                " '?patient_username=doctor@example.com'\n"
+                "print(len(client.get(url).data))\n"
+                "Prescription.objects.bulk_create([Prescription(patient=patient,"
+                " doctor=doctor, medication=Medication.objects.get_for_name('A'),"
+                " dosage='1mg', instructions='Daily')])\n"
+                "print(len(client.get(url).data))\n"
+                "subprocess.run([sys.executable, settings.BASE_DIR / 'manage.py',"
+                " 'sync_replica'], check=True)\n"
+                "print(len(client.get(url).data))",
+            )
+            counts = [line for line in output.splitlines() if line.isdigit()]
+            self.assertEqual(counts, ["0", "0", "1"])
+
+    def test_authentication_reads_primary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.env = {
+                **os.environ,
+                "DATABASE_NAME": str(Path(directory) / "primary.sqlite3"),
+                "DATABASE_REPLICA_NAME": str(Path(directory) / "replica.sqlite3"),
+            }
+            self.manage("migrate")
+            output = self.manage(
+                "shell",
+                "-c",
+                "from django.contrib.auth.models import User\n"
+                "from django.core.management import call_command\n"
+                "from rest_framework.test import APIClient\n"
+                "from rest_framework_simplejwt.tokens import AccessToken\n"
+                "from medlink.models import Medication, Patient, Prescription, Role\n"
+                "doctor = User.objects.create_user(username='doctor@example.com')\n"
+                "Role.objects.create(user=doctor, role='doctor')\n"
+                "prescription = Prescription.objects.create("
+                "patient=Patient.objects.create(user=doctor), doctor=doctor,"
+                " medication=Medication.objects.get_for_name('A'), dosage='1mg',"
+                " instructions='Daily')\n"
+                "call_command('sync_replica')\n"
+                "new_doctor = User.objects.create_user(username='new@example.com')\n"
+                "Role.objects.create(user=new_doctor, role='doctor')\n"
+                "User.objects.filter(pk=doctor.pk).update(is_active=False)\n"
+                "urls = ['/medlink/patients/list/',"
+                " f'/medlink/patient/prescriptions/{prescription.id}/']\n"
+                "for user in (new_doctor, doctor):\n"
+                "    client = APIClient()\n"
+                "    client.credentials(HTTP_AUTHORIZATION="
+                "f'Bearer {AccessToken.for_user(user)}')\n"
+                "    for url in urls:\n"
+                "        print(client.get(url).status_code)",
+            )
+            codes = [line for line in output.splitlines() if line.isdigit()]
+            # The new doctor is not in the replica yet, the old one is still
+            # active there.
+            self.assertEqual(codes, ["200", "200", "401", "401"])
+
+
+class RequestTimingMiddlewareTest(MedlinkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        doctor = get_user_model().objects.create_user(username="doctor1@example.com")
+        Role.objects.create(user=doctor, role="doctor")
+        Patient.objects.create(user=doctor)
+        self.client.force_authenticate(user=doctor)
+
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/medlink/patients/list/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        timing = response["Server-Timing"]
+        self.assertIn(f'desc="{len(queries.captured_queries)} queries"', timing)
+        for metric in (
+            "db;dur=",
+            "serialize;dur=",
+            "render;dur=",
+            "app;dur=",
+            "total;dur=",
+        ):
+            self.assertIn(metric, timing)
+
+    def test_serializer_time_excludes_its_queries(self):
+        with patch.object(
+            PatientListValuesSerializer,
+            "getter",
+            side_effect=lambda row: time.sleep(0.02) or (row["id"], row["user__email"]),
+        ):
+            with self.assertLogs("medlink.requests", "DEBUG") as logs:
+                self.client.get("/medlink/patients/list/")
+        line = json.loads(logs.records[0].getMessage())
+        self.assertGreaterEqual(line["serialize_ms"], 20)
+        self.assertGreaterEqual(
+            line["total_ms"], line["db_ms"] + line["serialize_ms"] + line["render_ms"]
+        )
+
+    def test_requests_are_not_logged_at_info_level(self):
+        with self.assertNoLogs("medlink.requests", "INFO"):
+            self.client.get("/medlink/patients/list/")
+
+    def test_logs_one_json_line_per_request(self):
+        with self.assertLogs("medlink.requests", "DEBUG") as logs:
+            self.client.get("/medlink/patients/list/")
+        self.assertEqual(len(logs.records), 1)
+        line = json.loads(logs.records[0].getMessage())
+        self.assertEqual(line["view"], "ListPatientsView")
+        self.assertEqual(line["path"], "/medlink/patients/list/")
+        self.assertEqual(line["status"], 200)
+        self.assertGreater(line["queries"], 0)
+        self.assertGreaterEqual(line["total_ms"], line["db_ms"])
+
+    @patch.object(ListPatientsView, "slow_query_threshold_ms", 0, create=True)
+    def test_logs_queries_slower_than_view_threshold(self):
+        with self.assertLogs("medlink.queries", "WARNING") as logs:
+            self.client.get("/medlink/patients/list/")
+        self.assertIn("Slow query in ListPatientsView on default", logs.output[0])
+        self.assertTrue(any("medlink_patient" in line for line in logs.output))
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow_query_log_leaves_out_params(self):
+        with self.assertLogs("medlink.queries", "WARNING") as logs:
+            self.client.get(
+                "/medlink/patient/prescriptions/list/"
+                "?patient_username=doctor1@example.com"
+            )
+        self.assertTrue(any("medlink_prescription" in line for line in logs.output))
+        self.assertFalse(any("doctor1@example.com" in line for line in logs.output))
+
+    @patch.object(ListPatientsView, "slow_query_threshold_ms", None, create=True)
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_view_can_disable_slow_query_log(self):
+        with self.assertNoLogs("medlink.queries", "WARNING"):
+            self.client.get("/medlink/patients/list/")
+
+
+class ProfilingMiddlewareTest(MedlinkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        doctor = get_user_model().objects.create_user(username="doctor1@example.com")
+        Role.objects.create(user=doctor, role="doctor")
+        self.client.force_authenticate(user=doctor)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+
+    def list_patients(self, **headers):
+        return self.client.get("/medlink/patients/list/", headers=headers)
+
+    def test_profiles_one_request_in_sample_rate(self):
+        with self.settings(
+            PROFILING_SAMPLE_RATE=2, PROFILING_DIRECTORY=str(self.directory)
+        ):
+            responses = [self.list_patients() for _ in range(4)]
+        self.assertEqual(
+            ["X-Profile-Id" in response for response in responses],
+            [True, False, True, False],
+        )
+        profiles = list((self.directory / "ListPatientsView").glob("*.prof"))
+        self.assertEqual(len(profiles), 2)
+
+    def test_profiles_requests_with_token_and_rotates(self):
+        with self.settings(
+            PROFILING_TOKEN="secret",
+            PROFILING_DIRECTORY=str(self.directory),
+            PROFILING_MAX_FILES=2,
+        ):
+            self.assertNotIn("X-Profile-Id", self.list_patients())
+            self.assertNotIn("X-Profile-Id", self.list_patients(X_Profile="wrong"))
+            ids = [
+                self.list_patients(X_Profile="secret")["X-Profile-Id"] for _ in range(3)
+            ]
+        kept = sorted(
+            f"ListPatientsView/{path.stem}"
+            for path in (self.directory / "ListPatientsView").glob("*.prof")
+        )
+        self.assertEqual(kept, ids[1:])
+
+    def test_profile_report_aggregates_profiles(self):
+        with self.settings(
+            PROFILING_SAMPLE_RATE=1, PROFILING_DIRECTORY=str(self.directory)
+        ):
+            for _ in range(3):
+                self.list_patients()
+        stdout = StringIO()
+        call_command(
+            "profile_report",
+            directory=str(self.directory),
+            sort="cumulative",
+            stdout=stdout,
+        )
+        self.assertIn("ListPatientsView: 3 profiles", stdout.getvalue())
+        self.assertIn("function calls", stdout.getvalue())
+        self.assertIn("medlink/views.py", stdout.getvalue())
+
+
+class MetricsTest(MedlinkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        override = self.settings(
+            METRICS_DIRECTORY=self.directory, METRICS_TOKEN="metrics-token"
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def scrape(self):
+        response = self.client.get(
+            "/metrics", HTTP_AUTHORIZATION="Bearer metrics-token"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response["Content-Type"].startswith("text/plain"))
+        return response.content.decode()
+
+    def test_requires_the_metrics_token(self):
+        for authorization in ("", "Bearer wrong", "Basic metrics-token"):
+            with self.subTest(authorization=authorization):
+                response = self.client.get("/metrics", HTTP_AUTHORIZATION=authorization)
+                self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with self.settings(METRICS_TOKEN=""):
+            response = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer ")
+            self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_requests_are_counted_per_view(self):
+        doctor = get_user_model().objects.create_user(username="doctor1@example.com")
+        Role.objects.create(user=doctor, role="doctor")
+        patient = Patient.objects.create(user=doctor)
+        prescription = Prescription.objects.create(
+            patient=patient,
+            doctor=doctor,
+            medication=Medication.objects.get_for_name("Paracetamol"),
+            dosage="500mg",
+            instructions="Take twice a day",
+        )
+        self.client.force_authenticate(user=doctor)
+        for _ in range(2):
+            self.client.get(f"/medlink/patient/prescriptions/{prescription.id}/")
+
+        metrics = self.scrape()
+        self.assertIn(
+            'medlink_requests_total{method="GET",status="200",'
+            'view="PrescriptionsDetailView"} 2',
+            metrics,
+        )
+        self.assertIn(
+            'medlink_request_duration_seconds_count{view="PrescriptionsDetailView"} 2',
+            metrics,
+        )
+        self.assertIn(
+            'medlink_request_duration_seconds_bucket{view="PrescriptionsDetailView",'
+            'le="+Inf"} 2',
+            metrics,
+        )
+        self.assertIn(
+            'medlink_request_queries_count{view="PrescriptionsDetailView"} 2', metrics
+        )
+        self.assertIn(
+            'medlink_cache_requests_total{cache="prescription_detail",result="hit"} 1',
+            metrics,
+        )
+        self.assertIn(
+            'medlink_cache_requests_total{cache="prescription_detail",result="miss"} 1',
+            metrics,
+        )
+
+    def test_named_lru_cache_counts_lookups(self):
+        lru = LRUCache(maxsize=2, ttl=60, name="test")
+        lru.set("a", 1)
+        lru.get("a")
+        lru.get("b")
+        metrics = self.scrape()
+        self.assertIn(
+            'medlink_cache_requests_total{cache="test",result="hit"} 1', metrics
+        )
+        self.assertIn(
+            'medlink_cache_requests_total{cache="test",result="miss"} 1', metrics
+        )
+
+    def test_threads_share_the_process_values(self):
+        def count():
+            for _ in range(1000):
+                metrics.requests_total.inc(view="Threaded", method="GET", status=200)
+
+        threads = [threading.Thread(target=count) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn(
+            'medlink_requests_total{method="GET",status="200",view="Threaded"} 4000',
+            self.scrape(),
+        )
+
+    def test_requests_from_new_threads_keep_one_store(self):
+        stores = set()
+
+        def request():
+            self.client_class().get(
+                "/metrics", HTTP_AUTHORIZATION="Bearer metrics-token"
+            )
+            stores.add(id(metrics.registry.process_values()))
+
+        for _ in range(50):
+            thread = threading.Thread(target=request)
+            thread.start()
+            thread.join()
+        self.assertEqual(len(stores), 1)
+        self.assertEqual(len(list(Path(self.directory).glob("*.db"))), 1)
+        self.assertIn(
+            'medlink_requests_total{method="GET",status="200",view="MetricsView"} 50',
+            self.scrape(),
+        )
+
+    def test_sums_the_values_of_every_process(self):
+        for _ in range(2):
+            subprocess.run(
+                [
+                    sys.executable,
+                    str(settings.BASE_DIR / "manage.py"),
+                    "shell",
+                    "-c",
+                    "from medlink import metrics\n"
+                    "for index in range(2000):\n"
+                    "    metrics.requests_total.inc("
+                    "view=f'View{index}', method='GET', status=200)",
+                ],
+                env={**os.environ, "METRICS_DIRECTORY": self.directory},
+                check=True,
+            )
+        metrics_text = self.scrape()
+        self.assertIn(
+            'medlink_requests_total{method="GET",status="200",view="View0"} 2',
+            metrics_text,
+        )
+        self.assertIn(
+            'medlink_requests_total{method="GET",status="200",view="View1999"} 2',
+            metrics_text,
+        )
+
+
+class FastPathSerializerTest(MedlinkAPITestCase):
+    def setUp(self):
+        super().setUp()
+        doctor = get_user_model().objects.create_user(
+            username="doctor1@example.com", email="doctor1@example.com"
+        )
+        for index in range(3):
+            user = get_user_model().objects.create_user(
+                username=f"patient{index}@example.com",
+                email=f"patient{index}@example.com",
+            )
+            Prescription.objects.create(
+                patient=Patient.objects.create(user=user),
+                doctor=doctor,
+                medication=Medication.objects.get_for_name("Paracétamol"),
+                dosage="500mg",
+                instructions="Take twice a day\u2028after meals",
+            )
+        # A patient without an email, rendered as an empty string.
+        Patient.objects.create(
+            user=get_user_model().objects.create_user(username="patient3")
+        )
+
+    def assertSameOutput(self, values_serializer, serializer, queryset):
+        queryset = queryset.order_by("id")
+        expected = serializer(queryset, many=True).data
+        data = values_serializer.serialize(values_serializer.values(queryset))
+        self.assertEqual(data, expected)
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(expected)
+        )
+
+    def test_patient_list(self):
+        self.assertSameOutput(
+            PatientListValuesSerializer,
+            PatientListResponseSerializer,
+            Patient.objects.all(),
+        )
+
+    @override_settings(TIME_ZONE="Asia/Kolkata")
+    def test_prescription_lists(self):
+        # Dates are formatted in the current time zone, as DRF does.
+        Prescription.objects.update(
+            date_prescribed=datetime(2024, 1, 1, 20, 0, tzinfo=dt_timezone.utc)
+        )
+        self.assertSameOutput(
+            PrescriptionValuesSerializer,
+            PrescriptionSerializer,
+            Prescription.objects.all(),
+        )
+        self.assertSameOutput(
+            PrescriptionInfoValuesSerializer,
+            PrescriptionInfoSerializer,
+            Prescription.objects.all(),
+        )
+        data = PrescriptionValuesSerializer.serialize(
+            PrescriptionValuesSerializer.values(Prescription.objects.all())
+        )
+        self.assertEqual(data[0]["date_prescribed"], "02-01-2024")
+
+    @override_settings(ORJSON_RENDERING=True)
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            "text": '\u2028\u2029 ünïcode \U0001f48a "quoted"\n',
+            "when": datetime(2024, 1, 1, 12, 30, 15, 123456, tzinfo=dt_timezone.utc),
+            "amount": Decimal("1.50"),
+            "nested": [None, True, 1.5, {"id": 1}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        # orjson rejects non-string keys, which fall back to JSONRenderer.
+        self.assertEqual(
+            FastJSONRenderer().render({1: "one"}), JSONRenderer().render({1: "one"})
+        )
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_renderer_is_byte_compatible_by_default(self):
+        data = {"large": 1e16, "small": 1.5e-7}
+        self.assertEqual(
+            FastJSONRenderer().render(data), b'{"large":1e+16,"small":1.5e-07}'
+        )
+        with self.assertRaises(ValueError):
+            FastJSONRenderer().render({"nan": float("nan")})
+
+    @override_settings(ORJSON_RENDERING=True)
+    def test_orjson_floats_with_exponents_decode_the_same(self):
+        data = {"large": 1e16, "small": 1.5e-7}
+        self.assertEqual(
+            json.loads(FastJSONRenderer().render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+
+    def test_single_field_values_serializer(self):
+        class EmailValuesSerializer(ValuesSerializer):
+            fields = [("email", "user__email")]
+
+        self.assertEqual(
+            EmailValuesSerializer.serialize([{"user__email": "a@example.com"}]),
+            [{"email": "a@example.com"}],
+        )
+
+    def test_list_response(self):
+        doctor = get_user_model().objects.get(username="doctor1@example.com")
+        Role.objects.create(user=doctor, role="doctor")
+        self.client.force_authenticate(user=doctor)
+        response = self.client.get("/medlink/patients/list/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(
+            {"id": Patient.objects.latest("id").id, "patient_email": ""},
+            json.loads(response.content)["results"],
+        )
+
+
+class ColumnarFormatTest(MedlinkAPITestCase):
+    list_url = (
+        "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com"
+    )
+
+    def setUp(self):
+        super().setUp()
+        self.doctor_user = get_user_model().objects.create_user(
+            username="doctor1@example.com", email="doctor1@example.com"
+        )
+        Role.objects.create(user=self.doctor_user, role="doctor")
+        self.client.force_authenticate(user=self.doctor_user)
+        patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com", email="patient1@example.com"
+        )
+        patient = Patient.objects.create(user=patient_user)
+        for medication in ("Paracetamol", "Ibuprofène"):
+            Prescription.objects.create(
+                patient=patient,
+                doctor=self.doctor_user,
+                medication=Medication.objects.get_for_name(medication),
+                dosage="500mg",
+                instructions="Take twice a day",
+            )
+
+    def test_round_trip(self):
+        data = {
+            "next": None,
+            "results": [
+                {"id": 1, "email": "a@example.com", "note": None},
+                {"id": -(2**63), "email": "ünïcode \U0001f48a", "note": "a"},
+            ],
+            "mixed": [{"id": 1}, {"id": 2.5}, {"other": True}, {}, [], False],
+        }
+        self.assertEqual(columnar.loads(columnar.dumps(data)), data)
+        self.assertEqual(
+            columnar.loads(ColumnarRenderer().render({"amount": Decimal("1.50")})),
+            {"amount": 1.5},
+        )
+        with self.assertRaises(ValueError):
+            columnar.dumps(2**63)
+
+    def test_malformed_documents(self):
+        document = columnar.dumps([{"id": 1, "email": "a@example.com"}])
+        for malformed in (b"", b"MLC1", document[:-1], document + b"\0", b"{}"):
+            with self.subTest(document=malformed), self.assertRaises(ValueError):
+                columnar.loads(malformed)
+
+    def test_list_negotiation(self):
+        expected = self.client.get(self.list_url)
+        self.assertEqual(expected["Content-Type"], "application/json")
+        self.assertIn("Accept", expected["Vary"])
+
+        response = self.client.get(self.list_url, HTTP_ACCEPT=columnar.MEDIA_TYPE)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], columnar.MEDIA_TYPE)
+        self.assertIn("Accept", response["Vary"])
+        self.assertEqual(columnar.loads(response.content), expected.json())
+        self.assertLess(len(response.content), len(expected.content))
+        # Each representation has its own entity tag.
+        self.assertNotEqual(response["ETag"], expected["ETag"])
+        response = self.client.get(
+            self.list_url,
+            HTTP_ACCEPT=columnar.MEDIA_TYPE,
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(
+            "/medlink/patients/list/", HTTP_ACCEPT=columnar.MEDIA_TYPE
+        )
+        self.assertEqual(
+            columnar.loads(response.content),
+            self.client.get("/medlink/patients/list/").json(),
+        )
+
+    def test_bulk_create_parses_columnar_body(self):
+        items = [
+            {
+                "patient_username": "patient1@example.com",
+                "medication": medication,
+                "dosage": "500mg",
+                "instruction": "Take twice a day",
+            }
+            for medication in ("Aspirin", "Paracetamol")
+        ]
+        response = self.client.post(
+            "/medlink/patient/prescriptions/bulk-create/",
+            columnar.dumps(items),
+            content_type=columnar.MEDIA_TYPE,
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["ids"]), 2)
+        with self.assertRaises(ParseError):
+            ColumnarParser().parse(BytesIO(b"MLC1\xff"))
+
+
+class CompressionMiddlewareTest(MedlinkAPITestCase):
+    list_url = (
+        "/medlink/patient/prescriptions/list/?patient_username=patient1@example.com"
+    )
+    export_url = "/medlink/patient/prescriptions/export/"
+
+    def setUp(self):
+        super().setUp()
+        doctor = get_user_model().objects.create_user(
+            username="doctor1@example.com", email="doctor1@example.com"
+        )
+        Role.objects.create(user=doctor, role="doctor")
+        self.client.force_authenticate(user=doctor)
+        patient_user = get_user_model().objects.create_user(
+            username="patient1@example.com", email="patient1@example.com"
+        )
+        patient = Patient.objects.create(user=patient_user)
+        medication = Medication.objects.get_for_name("Paracetamol")
+        Prescription.objects.bulk_create(
+            Prescription(
+                patient=patient,
+                doctor=doctor,
+                medication=medication,
+                dosage="500mg",
+                instructions="Take twice a day",
+            )
+            for _ in range(30)
+        )
+
+    @override_settings(DEBUG=True)
+    def test_asgi_middleware_chain_is_not_adapted_to_sync(self):
+        # In debug, Django logs every middleware it has to run in a thread.
+        logger = logging.getLogger("django.request")
+        with self.assertLogs(logger, "DEBUG") as logs:
+            logger.debug("Loading the middleware.")
+            ASGIHandler().load_middleware(is_async=True)
+        # ProfilingMiddleware is adapted before it raises MiddlewareNotUsed.
+        adapted = [
+            line
+            for line in logs.output
+            if "adapted" in line and "ProfilingMiddleware" not in line
+        ]
+        self.assertEqual(adapted, [])
+
+    def test_negotiate_encoding(self):
+        for header, expected in [
+            ("gzip, deflate, br", "gzip"),
+            ("deflate", "deflate"),
+            ("GZIP", "gzip"),
+            ("gzip;q=0.2, deflate;q=0.8", "deflate"),
+            ("gzip;q=0, deflate", "deflate"),
+            ("br, *;q=0.1", "gzip"),
+            ("*;q=0", None),
+            ("identity", None),
+            ("", None),
+        ]:
+            with self.subTest(header=header):
+                self.assertEqual(negotiate_encoding(header), expected)
+
+    def test_compresses_large_responses(self):
+        plain = self.client.get(self.list_url)
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertIn("Accept-Encoding", plain["Vary"])
+        self.assertGreater(len(plain.content), settings.COMPRESSION_MIN_SIZE)
+
+        response = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+        self.assertEqual(response["Content-Length"], str(len(response.content)))
+        self.assertEqual(response["ETag"], f"W/{plain['ETag']}")
+        response = self.client.get(
+            self.list_url,
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=response["ETag"],
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        response = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING="deflate")
+        self.assertEqual(response["Content-Encoding"], "deflate")
+        self.assertEqual(zlib.decompress(response.content), plain.content)
+
+    @override_settings(COMPRESSION_MIN_SIZE=100_000)
+    def test_small_responses_are_not_compressed(self):
+        response = self.client.get(self.list_url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertNotIn("Content-Encoding", response)
+        self.assertEqual(len(response.json()), 30)
+
+    def test_compresses_streaming_responses(self):
+        plain = b"".join(self.client.get(self.export_url).streaming_content)
+        # Flush after every chunk, so each one can be decoded as it arrives.
+        with patch("medlink.middleware.STREAM_FLUSH_SIZE", 1):
+            response = self.client.get(self.export_url, HTTP_ACCEPT_ENCODING="gzip")
+            self.assertEqual(response["Content-Encoding"], "gzip")
+            self.assertFalse(response.has_header("Content-Length"))
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            chunks = [
+                decompressor.decompress(chunk) for chunk in response.streaming_content
+            ]
+        self.assertEqual(len(chunks), 32)
+        self.assertEqual(chunks[0], plain.splitlines(keepends=True)[0])
+        self.assertEqual(b"".join(chunks), plain)
+
+
+class EndpointBenchmarkTest(SimpleTestCase):
+    def test_report_covers_every_route(self):
+        # The benchmark sends requests from several threads to a scratch
+        # database, which test cases do not allow, so it runs in its own process.
+        with tempfile.TemporaryDirectory() as directory:
+            output = Path(directory) / "report.json"
+            subprocess.run(
+                [
+                    sys.executable,
+                    str(settings.BASE_DIR / "manage.py"),
+                    "benchmark_endpoints",
+                    "--patients",
+                    "5",
+                    "--prescriptions-per-patient",
+                    "2",
+                    "--requests",
+                    "3",
+                    "--warmup",
+                    "0",
+                    "--concurrency",
+                    "2",
+                    "--bulk-size",
+                    "1",
+                    "--output",
+                    str(output),
+                ],
+                env={**os.environ, "DATABASE_PROFILE": "production"},
+                capture_output=True,
+                check=True,
+            )
+            report = json.loads(output.read_text())
+
+        self.assertEqual(report["meta"]["concurrency"], 2)
+        names = {pattern.name for pattern in medlink_urls.urlpatterns}
+        self.assertEqual(
+            set(report["routes"]), names | {"token_obtain_pair", "token_refresh"}
+        )
+        for name, route in report["routes"].items():
+            with self.subTest(route=name):
+                self.assertEqual(route["requests"], 3)
+                self.assertEqual(route["errors"], 0)
+                self.assertLessEqual(route["p50_ms"], route["p95_ms"])
+                self.assertLessEqual(route["p95_ms"], route["p99_ms"])
+                self.assertGreater(route["requests_per_second"], 0)
+                self.assertGreaterEqual(route["queries_per_request"], 0)
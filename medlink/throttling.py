@@ -0,0 +1,21 @@
+from django.conf import settings
+
+from rest_framework.throttling import UserRateThrottle
+
+
+class BulkRegistrationThrottle(UserRateThrottle):
+    """
+    Limit each user, or each client address for anonymous requests, to
+    ``USER_BULK_THROTTLE_RATE`` bulk registrations, as every request hashes up
+    to ``USER_BULK_MAX_ITEMS`` passwords. ``None`` disables the limit.
+
+    Counts are kept in the default cache, so they are per worker unless the
+    cache backend is shared.
+    """
+
+    scope = "bulk_registration"
+
+    def get_rate(self):
+        # Read on every request, unlike DRF's DEFAULT_THROTTLE_RATES, so that
+        # the rate can be overridden in tests and benchmarks.
+        return settings.USER_BULK_THROTTLE_RATE
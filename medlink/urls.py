@@ -1,31 +1,83 @@
 from django.urls import path
 
+from medlink.async_views import (
+    AsyncListPatientsView,
+    AsyncListPrescriptionsView,
+    AsyncPrescriptionsDetailView,
+)
 from medlink.views import (
+    BulkCreatePrescriptionView,
+    BulkRegisterUsersView,
     CreatePatientView,
     CreatePrescriptionView,
+    ExportPrescriptionsView,
     ListPatientsView,
     ListPrescriptionsView,
+    MedicalHistoryView,
+    MedicationAutocompleteView,
     PrescriptionsDetailView,
     RegisterUserView,
+    SearchPrescriptionsView,
 )
 
 urlpatterns = [
     path("user-registration/", RegisterUserView.as_view(), name="register_user"),
+    path(
+        "user-registration/bulk/",
+        BulkRegisterUsersView.as_view(),
+        name="bulk_register_users",
+    ),
     path("patients/create/", CreatePatientView.as_view(), name="create_patient"),
     path("patients/list/", ListPatientsView.as_view(), name="list_patients"),
+    path("patient/history/", MedicalHistoryView.as_view(), name="medical_history"),
     path(
         "patient/prescriptions/create/",
         CreatePrescriptionView.as_view(),
         name="create_prescription",
     ),
+    path(
+        "patient/prescriptions/bulk-create/",
+        BulkCreatePrescriptionView.as_view(),
+        name="bulk_create_prescriptions",
+    ),
     path(
         "patient/prescriptions/list/",
         ListPrescriptionsView.as_view(),
         name="list_prescriptions",
     ),
+    path(
+        "patient/prescriptions/export/",
+        ExportPrescriptionsView.as_view(),
+        name="export_prescriptions",
+    ),
+    path(
+        "patient/prescriptions/medications/autocomplete/",
+        MedicationAutocompleteView.as_view(),
+        name="medication_autocomplete",
+    ),
+    path(
+        "patient/prescriptions/search/",
+        SearchPrescriptionsView.as_view(),
+        name="search_prescriptions",
+    ),
     path(
         "patient/prescriptions/<int:prescription_id>/",
         PrescriptionsDetailView.as_view(),
         name="prescription_detail",
     ),
+    path(
+        "async/patients/list/",
+        AsyncListPatientsView.as_view(),
+        name="async_list_patients",
+    ),
+    path(
+        "async/patient/prescriptions/list/",
+        AsyncListPrescriptionsView.as_view(),
+        name="async_list_prescriptions",
+    ),
+    path(
+        "async/patient/prescriptions/<int:prescription_id>/",
+        AsyncPrescriptionsDetailView.as_view(),
+        name="async_prescription_detail",
+    ),
 ]
@@ -1,22 +1,106 @@
+from datetime import datetime, time, timedelta
+from functools import partial
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.models import User
-from django.db import IntegrityError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 
 from rest_framework import status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.views import APIView
 
-from .models import Patient, Prescription, Role
+from .authentication import get_user_role
+from .autocomplete import medication_index
+from .bulk import create_users, hash_accounts
+from .cache import (
+    bump_prescription_version,
+    etag_matches,
+    get_cached_prescription_detail,
+    get_cached_prescription_list,
+    get_prescription_version,
+    prescription_etag,
+    prescription_list_cache_key,
+    set_cached_prescription_detail,
+    set_cached_prescription_list,
+)
+from .export import EXPORT_FORMATS, aexport_lines, export_lines
+from .metrics import PROMETHEUS_CONTENT_TYPE, registry
+from .middleware import serializing
+from .models import MedicalHistoryEntry, Medication, Patient, Prescription, Role
+from .pagination import MedicalHistoryCursorPagination, PatientCursorPagination
+from .permissions import HasMetricsToken
+from .renderers import ColumnarNegotiationMixin
+from .routers import ReplicaReadMixin, replica_generation
+from .search import search_prescription_ids, search_terms
 from .serializers import (
     CreatePatientRequestSerializer,
-    PatientListResponseSerializer,
+    MedicalHistoryEntrySerializer,
+    MedicalHistoryRequestSerializer,
+    MedicationAutocompleteRequestSerializer,
+    PatientListValuesSerializer,
     PrescriptionInfoSerializer,
+    PrescriptionInfoValuesSerializer,
     PrescriptionListRequestSerializer,
     PrescriptionRequestSerializer,
-    PrescriptionSerializer,
+    PrescriptionSearchRequestSerializer,
+    PrescriptionValuesSerializer,
     UserRegistrationSerializer,
 )
+from .throttling import BulkRegistrationThrottle
+
+
+def start_of_day(day):
+    """
+    Return the first instant of ``day`` in the current time zone.
+    """
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def prescription_list_params(request, username):
+    """
+    Collect the input of ``PrescriptionListRequestSerializer`` from the query
+    string of a prescription list request.
+    """
+    params = {"patient_username": username}
+    for param in ("from", "to", "ordering"):
+        if param in request.GET:
+            params[param] = request.GET[param]
+    return params
+
+
+def prescription_list_queryset(username, filters):
+    """
+    Return the prescriptions of a patient matching the validated ``filters`` of
+    ``PrescriptionListRequestSerializer``.
+    """
+    prescriptions = Prescription.objects.filter(patient__user__username=username)
+
+    # Date bounds are compared as datetimes so the (patient, date_prescribed)
+    # index can serve the range scan.
+    if filters.get("from"):
+        prescriptions = prescriptions.filter(
+            date_prescribed__gte=start_of_day(filters["from"])
+        )
+    if filters.get("to"):
+        prescriptions = prescriptions.filter(
+            date_prescribed__lt=start_of_day(filters["to"] + timedelta(days=1))
+        )
+    ordering = filters["ordering"]
+    id_ordering = "-id" if ordering.startswith("-") else "id"
+    return prescriptions.order_by(ordering, id_ordering)
+
+
+def not_modified(etag):
+    """
+    Return an empty ``304 Not Modified`` response for a matching ``etag``.
+    """
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
 
 
 class RegisterUserView(APIView):
@@ -61,6 +145,66 @@ class RegisterUserView(APIView):
             )
 
 
+class BulkRegisterUsersView(ColumnarNegotiationMixin, APIView):
+    """
+    This class is created for registering a batch of users at once. Passwords are
+    hashed in parallel and the users are inserted in bulk.
+    """
+
+    throttle_classes = [BulkRegistrationThrottle]
+
+    def post(self, request):
+        try:
+            serializer = UserRegistrationSerializer(
+                data=request.data,
+                many=True,
+                allow_empty=False,
+                max_length=settings.USER_BULK_MAX_ITEMS,
+            )
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            items = serializer.validated_data
+
+            emails = [item["email"] for item in items]
+            existing = set(
+                get_user_model()
+                .objects.filter(username__in=emails)
+                .values_list("username", flat=True)
+            )
+            errors = []
+            seen = set()
+            for email in emails:
+                if email in existing or email in seen:
+                    errors.append({"email": [f"User already exist with email {email}"]})
+                else:
+                    errors.append({})
+                seen.add(email)
+            if any(errors):
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            # Hashed before the transaction, which holds the write lock.
+            accounts = hash_accounts(
+                [(item["email"], item["password"], item["role"]) for item in items]
+            )
+            with transaction.atomic():
+                create_users(accounts)
+
+            return Response(
+                {"message": "Users created successfully", "count": len(items)},
+                status=status.HTTP_201_CREATED,
+            )
+        except IntegrityError:
+            return Response(
+                {"message": "Some of the users already exist"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        except Exception:
+            return Response(
+                {"message": "Something Went Wrong"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
 class CreatePatientView(APIView):
     """
     This class contains business logic to register the patients by doctors only.
@@ -70,7 +214,7 @@ class CreatePatientView(APIView):
 
     def post(self, request):
         try:
-            if self.request.user.role.role != "doctor":
+            if get_user_role(request) != "doctor":
                 return Response(
                     {"error": "Only doctors can create patients"},
                     status=status.HTTP_403_FORBIDDEN,
@@ -111,26 +255,76 @@ class CreatePatientView(APIView):
             )
 
 
-class ListPatientsView(APIView):
+class ListPatientsView(ColumnarNegotiationMixin, ReplicaReadMixin, APIView):
     """
-    This class contains business logic to fetch the list of patients.
+    This class contains business logic to fetch the list of patients, one cursor
+    page at a time.
     """
 
     permission_classes = [IsAuthenticated]
+    pagination_class = PatientCursorPagination
 
     def get(self, request):
-        user = self.request.user
-
         # Check if the user is a doctor
-        if user.role.role != "doctor":
+        if get_user_role(request) != "doctor":
             return Response(
                 {"error": "Only doctors can see patients"},
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        patients = Patient.objects.all().select_related("user")
-        serializer = PatientListResponseSerializer(patients, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        patients = PatientListValuesSerializer.values(Patient.objects.all())
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(patients, request, view=self)
+        return paginator.get_paginated_response(
+            PatientListValuesSerializer.serialize(page)
+        )
+
+
+class MedicalHistoryView(ReplicaReadMixin, APIView):
+    """
+    This class contains business logic to fetch the medical history of a
+    patient, oldest entries first, one cursor page at a time.
+    """
+
+    permission_classes = [IsAuthenticated]
+    pagination_class = MedicalHistoryCursorPagination
+
+    def get(self, request):
+        username = request.GET.get("patient_username")
+
+        role = get_user_role(request)
+        if role is None:
+            return Response(
+                {"error": "User has no role"}, status=status.HTTP_403_FORBIDDEN
+            )
+        # Patients can only see their own history.
+        if role == "patient":
+            username = request.user.username
+        serializer = MedicalHistoryRequestSerializer(
+            data={"patient_username": username}
+        )
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        patient_id = (
+            Patient.objects.filter(user__username=username)
+            .values_list("id", flat=True)
+            .first()
+        )
+        if patient_id is None:
+            return Response(
+                {"error": f"Patient does not exist with username {username}"},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(
+            MedicalHistoryEntry.objects.filter(patient_id=patient_id),
+            request,
+            view=self,
+        )
+        with serializing():
+            data = MedicalHistoryEntrySerializer(page, many=True).data
+        return paginator.get_paginated_response(data)
 
 
 class CreatePrescriptionView(APIView):
@@ -142,7 +336,7 @@ class CreatePrescriptionView(APIView):
 
     def post(self, request):
         try:
-            if request.user.role.role != "doctor":
+            if get_user_role(request) != "doctor":
                 return Response(
                     {"error": "Only doctors can prescribe medications"},
                     status=status.HTTP_403_FORBIDDEN,
@@ -151,7 +345,7 @@ class CreatePrescriptionView(APIView):
             if not serializer.is_valid():
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
             try:
-                patient = Patient.objects.get(
+                patient = Patient.objects.select_related("user").get(
                     user__username=serializer.data.get("patient_username")
                 )
             except Patient.DoesNotExist:
@@ -163,8 +357,10 @@ class CreatePrescriptionView(APIView):
                 )
             prescription = Prescription.objects.create(
                 patient=patient,
-                doctor=request.user,
-                medication=serializer.data.get("medication"),
+                doctor_id=request.user.id,
+                medication=Medication.objects.get_for_name(
+                    serializer.data.get("medication")
+                ),
                 dosage=serializer.data.get("dosage"),
                 instructions=serializer.data.get("instruction"),
             )
@@ -180,7 +376,97 @@ class CreatePrescriptionView(APIView):
             )
 
 
-class ListPrescriptionsView(APIView):
+class BulkCreatePrescriptionView(ColumnarNegotiationMixin, APIView):
+    """
+    This class contains business logic to create a batch of prescriptions by the
+    doctors in a single transaction.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            if get_user_role(request) != "doctor":
+                return Response(
+                    {"error": "Only doctors can prescribe medications"},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            serializer = PrescriptionRequestSerializer(
+                data=request.data,
+                many=True,
+                allow_empty=False,
+                max_length=settings.PRESCRIPTION_BULK_MAX_ITEMS,
+            )
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            items = serializer.validated_data
+
+            # Resolve every patient of the batch with one query.
+            usernames = {item["patient_username"] for item in items}
+            patient_ids = dict(
+                Patient.objects.filter(user__username__in=usernames).values_list(
+                    "user__username", "id"
+                )
+            )
+            errors = [
+                (
+                    {}
+                    if item["patient_username"] in patient_ids
+                    else {
+                        "patient_username": [
+                            f"Patient does not exist with username {item['patient_username']}"
+                        ]
+                    }
+                )
+                for item in items
+            ]
+            if any(errors):
+                return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+            with transaction.atomic():
+                medications = Medication.objects.intern(
+                    item["medication"] for item in items
+                )
+                prescriptions = Prescription.objects.bulk_create(
+                    Prescription(
+                        patient_id=patient_ids[item["patient_username"]],
+                        doctor_id=request.user.id,
+                        medication=medications[item["medication"]],
+                        dosage=item["dosage"],
+                        instructions=item["instruction"],
+                    )
+                    for item in items
+                )
+                # bulk_create() sends no post_save signal, so the cached
+                # responses of the patients are invalidated and the medications
+                # indexed here.
+                for username in usernames:
+                    transaction.on_commit(partial(bump_prescription_version, username))
+                transaction.on_commit(
+                    partial(
+                        medication_index.add,
+                        *(
+                            prescription.medication.name
+                            for prescription in prescriptions
+                        ),
+                    )
+                )
+
+            return Response(
+                {
+                    "message": "Prescriptions created successfully",
+                    "ids": [prescription.id for prescription in prescriptions],
+                },
+                status=status.HTTP_201_CREATED,
+            )
+        except Exception:
+            return Response(
+                {"message": "Something Went Wrong"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class ListPrescriptionsView(ColumnarNegotiationMixin, ReplicaReadMixin, APIView):
     """
     This class contains business logic to fetch the list od prescription for individual patient.
     """
@@ -191,18 +477,41 @@ class ListPrescriptionsView(APIView):
         try:
             username = request.GET.get("patient_username")
 
+            role = get_user_role(request)
+            if role is None:
+                return Response(
+                    {"error": "User has no role"}, status=status.HTTP_403_FORBIDDEN
+                )
             # Check if the user is a patient, he can see own prescription only.
-            if request.user.role.role == "patient":
+            if role == "patient":
                 username = request.user.username
             serializer = PrescriptionListRequestSerializer(
-                data={"patient_username": username}
+                data=prescription_list_params(request, username)
             )
             if not serializer.is_valid():
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            patient = Patient.objects.get(user__username=username)
-            prescriptions = Prescription.objects.filter(patient=patient)
-            serializer = PrescriptionSerializer(prescriptions, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            cache_key = prescription_list_cache_key(
+                username, serializer.validated_data, replica_generation()
+            )
+            entry = get_cached_prescription_list(cache_key)
+            if entry is None:
+                data = PrescriptionValuesSerializer.serialize(
+                    PrescriptionValuesSerializer.values(
+                        prescription_list_queryset(username, serializer.validated_data)
+                    )
+                )
+                if (
+                    not data
+                    and not Patient.objects.filter(user__username=username).exists()
+                ):
+                    raise Patient.DoesNotExist
+                entry = set_cached_prescription_list(cache_key, data)
+            etag = prescription_etag(entry, request.accepted_renderer.format)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            return Response(
+                entry["data"], status=status.HTTP_200_OK, headers={"ETag": etag}
+            )
         except Patient.DoesNotExist:
             return Response(
                 {"error": f"Patient does not exist with username {username}"},
@@ -215,7 +524,137 @@ class ListPrescriptionsView(APIView):
             )
 
 
-class PrescriptionsDetailView(APIView):
+class ExportPrescriptionsView(APIView):
+    """
+    This class contains business logic to stream every prescription as a CSV or
+    JSONL file for the doctors.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        if get_user_role(request) != "doctor":
+            return Response(
+                {"error": "Only doctors can export prescriptions"},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        # "format" is reserved by DRF's content negotiation.
+        export_format = request.GET.get("export_format", "csv")
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {"export_format": [f"Must be one of {', '.join(EXPORT_FORMATS)}"]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if isinstance(request._request, ASGIRequest):
+            # Django would read a sync iterator whole with sync_to_async(list)
+            # before sending it to an ASGI server.
+            lines = aexport_lines(export_format, settings.EXPORT_CHUNK_SIZE)
+        else:
+            lines = export_lines(export_format, settings.EXPORT_CHUNK_SIZE)
+        return StreamingHttpResponse(
+            lines,
+            content_type=EXPORT_FORMATS[export_format],
+            headers={
+                "Content-Disposition": f'attachment; filename="prescriptions.{export_format}"'
+            },
+        )
+
+
+class MedicationAutocompleteView(APIView):
+    """
+    This class contains business logic to suggest the medications starting with
+    what the doctor has typed so far, most prescribed first.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            if get_user_role(request) != "doctor":
+                return Response(
+                    {"error": "Only doctors can prescribe medications"},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            serializer = MedicationAutocompleteRequestSerializer(data=request.GET)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return Response(
+                medication_index.suggest(
+                    serializer.validated_data["q"], serializer.validated_data["limit"]
+                ),
+                status=status.HTTP_200_OK,
+            )
+        except Exception:
+            return Response(
+                {"message": "Something Went Wrong"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class SearchPrescriptionsView(APIView):
+    """
+    This class contains business logic to search the medication and instructions
+    of prescriptions, best matches first, for the doctors.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            if get_user_role(request) != "doctor":
+                return Response(
+                    {"error": "Only doctors can search prescriptions"},
+                    status=status.HTTP_403_FORBIDDEN,
+                )
+            serializer = PrescriptionSearchRequestSerializer(data=request.GET)
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            terms = search_terms(serializer.validated_data["q"])
+            if not terms:
+                return Response(
+                    {"q": ["Must contain at least one word"]},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            page = serializer.validated_data["page"]
+            page_size = serializer.validated_data["page_size"]
+
+            # One extra id tells whether a page follows this one.
+            ids = search_prescription_ids(
+                terms, limit=page_size + 1, offset=(page - 1) * page_size
+            )
+            rows = {
+                row["id"]: row
+                for row in PrescriptionInfoValuesSerializer.values(
+                    Prescription.objects.filter(id__in=ids[:page_size])
+                )
+            }
+            results = PrescriptionInfoValuesSerializer.serialize(
+                rows[id] for id in ids[:page_size] if id in rows
+            )
+
+            url = request.build_absolute_uri()
+            return Response(
+                {
+                    "next": (
+                        replace_query_param(url, "page", page + 1)
+                        if len(ids) > page_size
+                        else None
+                    ),
+                    "previous": (
+                        replace_query_param(url, "page", page - 1) if page > 1 else None
+                    ),
+                    "results": results,
+                },
+                status=status.HTTP_200_OK,
+            )
+        except Exception:
+            return Response(
+                {"message": "Something Went Wrong"},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+
+
+class PrescriptionsDetailView(ReplicaReadMixin, APIView):
     """
     This class contains business login to fetch detailed information of description.
     """
@@ -224,9 +663,31 @@ class PrescriptionsDetailView(APIView):
 
     def get(self, request, prescription_id):
         try:
-            prescriptions = Prescription.objects.get(id=prescription_id)
-            serializer = PrescriptionInfoSerializer(prescriptions)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            generation = replica_generation()
+            entry = get_cached_prescription_detail(prescription_id, generation)
+            if entry is None:
+                # Read the version before the row, so that a write committing
+                # in between leaves the entry outdated rather than current.
+                username = (
+                    Prescription.objects.filter(id=prescription_id)
+                    .values_list("patient__user__username", flat=True)
+                    .get()
+                )
+                version = get_prescription_version(username)
+                prescriptions = Prescription.objects.select_related(
+                    "patient__user", "doctor", "medication"
+                ).get(id=prescription_id)
+                with serializing():
+                    data = PrescriptionInfoSerializer(prescriptions).data
+                entry = set_cached_prescription_detail(
+                    prescription_id, username, version, data, generation
+                )
+            etag = prescription_etag(entry)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+            return Response(
+                entry["data"], status=status.HTTP_200_OK, headers={"ETag": etag}
+            )
         except Prescription.DoesNotExist:
             return Response(
                 {"error": f"Prescription does not exist with id {prescription_id}"},
@@ -237,3 +698,17 @@ class PrescriptionsDetailView(APIView):
                 {"message": "Something Went Wrong"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR,
             )
+
+
+class MetricsView(APIView):
+    """
+    This class exposes the request, database and cache metrics of the worker
+    processes in the Prometheus text format, to the scrapers sending
+    ``METRICS_TOKEN``.
+    """
+
+    authentication_classes = []
+    permission_classes = [HasMetricsToken]
+
+    def get(self, request):
+        return HttpResponse(registry.render(), content_type=PROMETHEUS_CONTENT_TYPE)